@@ -118,13 +118,13 @@ def search_4_replacement_destination(phrase, source_character, pattern_table):
 def export_pattern_one_table(pattern_table, PATTERN_ONE_TABLE_FILE):
     with open(PATTERN_ONE_TABLE_FILE, mode='w', encoding='utf-8') as write_file:
         for character in pattern_table:
-            order = SS_NORMAL_PRONUNCIATION
             for pinyin in PINYIN_MAPPING_TABLE[character]:
                 if pinyin in list( pattern_table[character]["patterns"].keys() ):
+                    # order は ss の番号に合わせる（パターンの無い読みがあっても番号を詰めない）
+                    order = PINYIN_MAPPING_TABLE[character].index(pinyin) + SS_NORMAL_PRONUNCIATION
                     str_patterns = expand_pattern_list2str( pattern_table[character]["patterns"][pinyin] )
                     line = "{0}, {1}, {2}, [{3}]\n".format(order, character, pinyin, str_patterns)
                     write_file.write(line)
-                    order += 1
 
 # 単語中に含まれる標準的でないピンインの数を返す
 def seek_variational_pronunciation_in_phrase(phrase_instance):
@@ -205,7 +205,7 @@ def add_lookup4pattern_two(lookup_table_dict, phrase_instance):
             lookup_table_dict.update( {lookup_name:{}} )
         # set
         if not (target_character in lookup_table_dict[lookup_name]):
-            lookup_table_dict[lookup_name].update( { target_character : "{0}.ss0{1}".format( target_character, (SS_VARIATIONAL_PRONUNCIATION + priority) ) } )
+            lookup_table_dict[lookup_name].update( { target_character : "{0}.ss{1:02}".format( target_character, (SS_VARIATIONAL_PRONUNCIATION + priority) ) } )
 
 def get_pattern4pattern_two(phrase_instance):
     phrase_value = []
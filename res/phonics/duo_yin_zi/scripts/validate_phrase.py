@@ -84,10 +84,9 @@ def pattern_one(PHRASE_TABLE_FILE):
         print()
 
     # 他のパターン（単語）に影響するパターン（単語）がないか
-    # 対処法
-    # -> 基本的に文字数が小さいパターンに合わせる。 阿谀 と 胶阿谀 なら 阿谀 を消す。
-    #　　 着手: zhuó/shǒu と 背着手: bèi/zhe/shǒu　は両方とも違うので残す
-    # 　　轴子 は zhóu が標準的な読みなので 轴子 のパターンが無くても構わない。
+    # GSUB ではマッチする長さが長いパターンが優先される（src/reading_rule.py）ので、エラーにはせずに確認のために表示する
+    # 　　阿谀 と 胶阿谀 なら 胶阿谀 が優先される。
+    #　　 着手: zhuó/shǒu と 背着手: bèi/zhe/shǒu　なら 背着手 が優先される。
     """
     阿谀: ē/yú
     胶阿谀: jiāo/ē/yú
@@ -97,11 +96,10 @@ def pattern_one(PHRASE_TABLE_FILE):
     """
     duplicate_pattern_of_phrases = get_duplicate_pattern_of_phrase(PHRASE_TABLE_FILE)
     if len(duplicate_pattern_of_phrases) > 0:
-        print("Error:")
-        print("  重複する単語（パターン）を削除してください")
-        print("  There are duplicates that affect other phrases :")
+        print("Warning:")
+        print("  下記の単語は長い単語のパターンが優先されます")
+        print("  There are duplicates that affect other phrases (the longest phrase takes priority) :")
         print(duplicate_pattern_of_phrases)
-        exit()
     else:
         print("success!")
         print("Nothing duplicates that affect other phrase.")
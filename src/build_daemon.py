@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 src/build_daemon.py
+# python3 src/build_daemon.py --send '{"style": "han_serif", "format": "woff2", "pinyin_overrides": {"行": ["háng", "xíng"]}}'
+# python3 src/build_daemon.py --send '{"command": "stats"}'
+
+"""
+常駐するビルドのデーモン
+
+main.py はビルドごとにフォントのダンプ、テンプレートの json、マッピングテーブル、多音字のパターンを読み直す。
+設定 (ピンインの上書き、--prune など) だけが違うフォントを何度も作るときは、このデーモンに依頼する。
+    テンプレートの json : スタイルごとに一度だけダンプする (tmp/daemon/<スタイル>/. 元のフォントが更新されたらダンプし直す)
+    入力の読み込み      : font_sources.CachedSources で全てのビルドが共有する (ファイルが書き換えられたら読み直す)
+    ビルド             : config.BUILD_DAEMON_WORKERS のスレッドで font_builder.FontBuilder を実行する
+
+プロトコル : Unix ソケットに一行の json を送ると、一行の json が返る (同じ接続で続けて送れる)
+    ビルド :
+        {"style": "han_serif", "format": "ttf", "output": "outputs/daemon/variant.ttf",
+         "pinyin_overrides": {"行": ["háng", "xíng"]}, "options": {"prune": true}}
+        -> {"status": "ok", "output": "...", "bytes": 12345678, "queue_wait": 0.01, "build_time": 52.3,
+            "stages": {"load_json": 1.2, "cmap_uvs": 0.1, ...}}
+        style 以外は省略できる. pinyin_overrides はマッピングテーブルの漢字の発音 (先頭が標準の発音) を置き換える
+    状態 :
+        {"command": "stats"}
+        -> {"status": "ok", "queue_depth": 0, "running": 1, "finished": 10, "failed": 0, "cache": {"hits": 30, ...}}
+    エラー :
+        -> {"status": "error", "message": "..."}
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import socketserver
+import concurrent.futures
+import orjson
+import path as p
+import config
+import make_template_jsons
+import retrieve_latin_alphabet
+import font_builder as fb
+import font_sources
+import profiler as pf
+import web_font
+
+DIR_DAEMON_TEMP   = os.path.join(p.DIR_TEMP, "daemon")
+DIR_DAEMON_OUTPUT = os.path.join(p.DIR_OUTPUT, "daemon")
+DAEMON_SOCKET     = os.path.join(p.DIR_TEMP, "build_daemon.sock")
+
+# スタイル : (FONT_TYPE, 漢字のフォント, ピンインのフォント)
+STYLES = {
+    "han_serif":   (config.HAN_SERIF_TYPE, config.HAN_SERIF_MAIN, config.HAN_SERIF_PINYIN),
+    "handwritten": (config.HANDWRITTEN_TYPE, config.HAN_HANDWRITTEN_MAIN, config.HAN_HANDWRITTEN_PINYIN)
+}
+OUTPUT_FORMATS = ["ttf", "woff2"]
+# ジョブの options で指定できる Font の設定
+FONT_OPTIONS = ["auto_reduce", "prune", "bake", "max_reference_depth", "glyph_cache_mb", "deterministic"]
+
+# 多音字の辞書データ (main.py と同じ)
+PATTERN_ONE_TXT        = os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_one.txt")
+PATTERN_TWO_JSON       = os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_two.json")
+EXCEPTION_PATTERN_JSON = os.path.join(p.DIR_OUTPUT, "duoyinzi_exceptional_pattern.json")
+
+def check_job(job):
+    if not isinstance(job, dict):
+        raise Exception("ジョブは json の object にしてください.")
+    if not (job.get("style") in STYLES):
+        raise Exception("style は {} のどれかにしてください.\n  style: {}".format(", ".join(STYLES.keys()), job.get("style")))
+    if not (job.get("format", "ttf") in OUTPUT_FORMATS):
+        raise Exception("format は {} のどれかにしてください.\n  format: {}".format(", ".join(OUTPUT_FORMATS), job.get("format")))
+    unknown_options = [key for key in job.get("options", {}).keys() if not (key in FONT_OPTIONS)]
+    if len(unknown_options) > 0:
+        raise Exception("options に指定できない設定があります.\n  options: {}".format(", ".join(unknown_options)))
+    for (hanzi, pinyins) in job.get("pinyin_overrides", {}).items():
+        if len(hanzi) != 1 or not isinstance(pinyins, list) or len(pinyins) == 0 or not all(isinstance(pinyin, str) for pinyin in pinyins):
+            raise Exception("pinyin_overrides は 漢字: [発音, ...] にしてください.\n  {}: {}".format(hanzi, pinyins))
+
+class BuildDaemon():
+
+    def __init__(self, workers=config.BUILD_DAEMON_WORKERS, sources=None):
+        self.sources = sources if sources != None else font_sources.CachedSources()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        # ダンプはスタイルごとに一つのスレッドだけが行う
+        self.template_locks = { style: threading.Lock() for style in STYLES.keys() }
+        self.job_count = 0
+        self.queue_depth = 0
+        self.running = 0
+        self.finished = 0
+        self.failed = 0
+
+    # スタイルのテンプレートの json のディレクトリ. 無いか、元のフォントより古ければダンプする
+    def get_template_dir(self, style):
+        (_, FONT_FOR_MAIN, FONT_FOR_PINYIN) = STYLES[style]
+        DIR_TEMPLATE = os.path.join(DIR_DAEMON_TEMP, style)
+        with self.template_locks[style]:
+            for (SOURCE_FONT, TEMPLATE_JSON) in [(FONT_FOR_MAIN, make_template_jsons.TAMPLATE_GLYF_JSON),
+                                                 (FONT_FOR_PINYIN, retrieve_latin_alphabet.ALPHABET_FOR_PINYIN_JSON)]:
+                TEMPLATE_JSON = os.path.join(DIR_TEMPLATE, TEMPLATE_JSON)
+                if os.path.exists(TEMPLATE_JSON) and os.path.getmtime(SOURCE_FONT) <= os.path.getmtime(TEMPLATE_JSON):
+                    continue
+                os.makedirs(DIR_TEMPLATE, exist_ok=True)
+                print("  ==> dump {} for {}".format(os.path.basename(SOURCE_FONT), style))
+                if SOURCE_FONT == FONT_FOR_MAIN:
+                    make_template_jsons.make_template(FONT_FOR_MAIN, DIR_TEMPLATE)
+                else:
+                    retrieve_latin_alphabet.make_alphabet_glyf_json(FONT_FOR_PINYIN, DIR_TEMPLATE)
+        return DIR_TEMPLATE
+
+    def get_pinyin_mapping_table(self, pinyin_overrides):
+        pinyin_mapping_table = self.sources.get_pinyin_mapping_table()
+        if len(pinyin_overrides) == 0:
+            return pinyin_mapping_table
+        # キャッシュしたテーブルは書き換えない
+        unknown_hanzi = [hanzi for hanzi in pinyin_overrides.keys() if not (hanzi in pinyin_mapping_table)]
+        if len(unknown_hanzi) > 0:
+            raise Exception("マッピングテーブルに無い漢字の発音は上書きできません.\n  hanzi: {}".format("".join(unknown_hanzi)))
+        pinyin_mapping_table = dict(pinyin_mapping_table)
+        pinyin_mapping_table.update(pinyin_overrides)
+        return pinyin_mapping_table
+
+    def build(self, job, job_id):
+        style = job["style"]
+        output_format = job.get("format", "ttf")
+        OUTPUT_FONT = job.get("output", os.path.join(DIR_DAEMON_OUTPUT, "{}-{}.{}".format(style, job_id, output_format)))
+        DIR_TEMPLATE = self.get_template_dir(style)
+        profiler = pf.BuildProfiler()
+        with fb.FontBuilder( os.path.join(DIR_TEMPLATE, make_template_jsons.TAMPLATE_MAIN_JSON),
+                             os.path.join(DIR_TEMPLATE, make_template_jsons.TAMPLATE_GLYF_JSON),
+                             os.path.join(DIR_TEMPLATE, retrieve_latin_alphabet.ALPHABET_FOR_PINYIN_JSON),
+                             PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON, STYLES[style][0], profiler,
+                             pinyin_mapping_table=self.get_pinyin_mapping_table(job.get("pinyin_overrides", {})),
+                             sources=self.sources, **job.get("options", {}) ) as builder:
+            font_bytes = builder.build()
+            fingerprint = builder.font.fingerprint
+            # 書き終わるまでは別の名前にしておく (読み込み中のアプリが途中のファイルを読まないように)
+            os.makedirs(os.path.dirname(os.path.abspath(OUTPUT_FONT)), exist_ok=True)
+            TEMP_OUTPUT_FONT = OUTPUT_FONT + ".part"
+            if output_format == "woff2":
+                with profiler.stage("woff2"):
+                    TTF = os.path.join(builder.DIR_SCRATCH, "font.ttf")
+                    web_font.convert_ttf2woff2(TTF, TEMP_OUTPUT_FONT)
+            else:
+                with open(TEMP_OUTPUT_FONT, "wb") as f:
+                    f.write(font_bytes)
+            os.replace(TEMP_OUTPUT_FONT, OUTPUT_FONT)
+        return {
+            "output": OUTPUT_FONT,
+            "bytes": os.path.getsize(OUTPUT_FONT),
+            # options の deterministic のときだけ (build_fingerprint.py)
+            "fingerprint": fingerprint,
+            "stages": { stage["name"]: stage["wall_time"] for stage in profiler.get_stages() }
+        }
+
+    def run_job(self, job, job_id, submitted_at):
+        started_at = time.perf_counter()
+        with self.lock:
+            self.queue_depth -= 1
+            self.running += 1
+        try:
+            result = self.build(job, job_id)
+        except Exception:
+            with self.lock:
+                self.failed += 1
+            raise
+        finally:
+            with self.lock:
+                self.running -= 1
+        with self.lock:
+            self.finished += 1
+        result.update( {"queue_wait": round(started_at - submitted_at, 6), "build_time": round(time.perf_counter() - started_at, 6)} )
+        print("  ==> job {} : {} {}, {:.3f}s (queue {:.3f}s) -> {}".format( \
+                job_id, job["style"], job.get("format", "ttf"), result["build_time"], result["queue_wait"], result["output"]))
+        return result
+
+    # ビルドが終わるまで待って結果を返す
+    def submit(self, job):
+        check_job(job)
+        with self.lock:
+            self.job_count += 1
+            job_id = self.job_count
+            self.queue_depth += 1
+        future = self.executor.submit(self.run_job, job, job_id, time.perf_counter())
+        return future.result()
+
+    def get_stats(self):
+        with self.lock:
+            stats = {"queue_depth": self.queue_depth, "running": self.running, "finished": self.finished, "failed": self.failed}
+        stats.update( {"cache": self.sources.get_stats()} )
+        return stats
+
+    def handle_request(self, request):
+        try:
+            if isinstance(request, dict) and request.get("command") == "stats":
+                response = self.get_stats()
+            else:
+                response = self.submit(request)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+        response.update( {"status": "ok"} )
+        return response
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            if line.strip() == b"":
+                continue
+            try:
+                request = orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                response = {"status": "error", "message": "json を読み込めません.\n  {}".format(e)}
+            else:
+                response = self.server.daemon.handle_request(request)
+            self.wfile.write(orjson.dumps(response) + b"\n")
+            self.wfile.flush()
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, SOCKET, daemon):
+        self.daemon = daemon
+        super().__init__(SOCKET, RequestHandler)
+
+# デーモンに一つのリクエストを送り、レスポンスを返す
+def send_request(request, SOCKET=DAEMON_SOCKET):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(SOCKET)
+        client.sendall(orjson.dumps(request) + b"\n")
+        with client.makefile("rb") as read_file:
+            return orjson.loads(read_file.readline())
+
+def serve(SOCKET, workers, preload_styles):
+    daemon = BuildDaemon(workers)
+    for style in preload_styles:
+        daemon.get_template_dir(style)
+    # 前回のデーモンが残したソケットのファイル
+    if os.path.exists(SOCKET):
+        os.remove(SOCKET)
+    server = DaemonServer(SOCKET, daemon)
+    print("  ==> build daemon : {} ({} workers)".format(SOCKET, workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+        if os.path.exists(SOCKET):
+            os.remove(SOCKET)
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Resident font build daemon listening on a Unix socket")
+    parser.add_argument('--socket', default=DAEMON_SOCKET, metavar='SOCKET', help="Path of the Unix socket")
+    parser.add_argument('--workers', type=int, default=config.BUILD_DAEMON_WORKERS, help="Number of builds run at the same time")
+    # 起動時にテンプレートの json をダンプしておく
+    parser.add_argument('--preload', nargs='*', choices=list(STYLES.keys()), default=[], metavar='STYLE',
+                        help="Dump the template json of these styles before accepting jobs")
+    # デーモンは起動せず、起動中のデーモンにリクエストを送る
+    parser.add_argument('--send', default=None, metavar='REQUEST_JSON', help="Send one request to a running daemon and print the response")
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(args)
+    if options.send != None:
+        response = send_request(orjson.loads(options.send), options.socket)
+        print(orjson.dumps(response, option=orjson.OPT_INDENT_2).decode("utf-8"))
+        return 0 if response["status"] == "ok" else 1
+    serve(options.socket, options.workers, options.preload)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
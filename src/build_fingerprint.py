@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import os
+import shutil
+import hashlib
+import tempfile
+import subprocess
+import config
+import path as p
+
+"""
+再現できるビルド (main.py の --deterministic, または環境変数 SOURCE_DATE_EPOCH があるとき)
+
+同じ入力から作ったフォントが同じバイト列になるように
+    head.created, head.modified : SOURCE_DATE_EPOCH (無ければ元のフォントの head.created) にする
+                                  otfccbuild は --keep-modified-time で json の値をそのまま書き出す
+                                  (fontTools で書き直すときも recalcTimestamp=False)
+グリフの並び、lookupOrder、発音の一覧などは名前や入力の順番で決まり、実行ごとに変わらない。
+
+フィンガープリント : otfccbuild に渡す json (template.json)、otfccbuild のバージョン、FINGERPRINT_VERSION の sha256
+    outputs/<フォント名>.fingerprint に書き出す. 前回と同じなら、フォントも前回と同じになる (アップロードなどを省略できる)
+    DIR_BUILD_CACHE に フィンガープリント.ttf を config.BUILD_CACHE_ENTRIES 個まで残し、
+    同じフィンガープリントのフォントがあれば otfccbuild と cmap format 14 の書き直しを省略する
+"""
+
+# otfccbuild の後の処理 (uvs_table.compact_format14 など) を変えたときに上げる
+FINGERPRINT_VERSION = 1
+
+# 1904/01/01 00:00 GMT (head の日時の基準) から 1970/01/01 00:00 GMT までの秒数
+SECONDS_FROM_1904_TO_1970 = 2082844800
+
+DIR_BUILD_CACHE = os.path.join(p.DIR_TEMP, "build_cache")
+
+def is_deterministic_env():
+    return "SOURCE_DATE_EPOCH" in os.environ
+
+# head.created, head.modified に使う日時 (1904/01/01 からの秒数). SOURCE_DATE_EPOCH が無ければ None
+def get_source_date():
+    if not is_deterministic_env():
+        return None
+    try:
+        source_date_epoch = int(os.environ["SOURCE_DATE_EPOCH"])
+    except ValueError:
+        raise Exception("SOURCE_DATE_EPOCH は 1970/01/01 からの秒数にしてください.\n  SOURCE_DATE_EPOCH: {}".format(os.environ["SOURCE_DATE_EPOCH"]))
+    return source_date_epoch + SECONDS_FROM_1904_TO_1970
+
+def get_otfcc_version():
+    completed_process = subprocess.run(["otfccbuild", "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    return completed_process.stdout
+
+def get_fingerprint(TAMPLATE_JSON):
+    sha256 = hashlib.sha256()
+    sha256.update("fingerprint version {}\n".format(FINGERPRINT_VERSION).encode("utf-8"))
+    sha256.update(get_otfcc_version())
+    with open(TAMPLATE_JSON, "rb") as read_file:
+        for chunk in iter(lambda: read_file.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def get_cached_font_path(fingerprint, DIR_CACHE=DIR_BUILD_CACHE):
+    return os.path.join(DIR_CACHE, "{}.ttf".format(fingerprint))
+
+# 同じフィンガープリントのフォントがあれば OUTPUT_FONT に複製して True を返す
+# 同時に動いている別のビルド (build_daemon.py のワーカーなど) が削除したときは、無かったことにする
+def load_cached_font(fingerprint, OUTPUT_FONT, DIR_CACHE=DIR_BUILD_CACHE):
+    CACHED_FONT = get_cached_font_path(fingerprint, DIR_CACHE)
+    try:
+        shutil.copyfile(CACHED_FONT, OUTPUT_FONT)
+    except FileNotFoundError:
+        return False
+    # 最近使ったものを残す
+    try:
+        os.utime(CACHED_FONT)
+    except FileNotFoundError:
+        pass
+    return True
+
+# 削除されたファイルは None
+def get_mtime(FILE):
+    try:
+        return os.path.getmtime(FILE)
+    except FileNotFoundError:
+        return None
+
+# 同時に保存しても壊れないように、別の名前で書いてから置き換える
+def save_cached_font(fingerprint, OUTPUT_FONT, DIR_CACHE=DIR_BUILD_CACHE, max_entries=config.BUILD_CACHE_ENTRIES):
+    os.makedirs(DIR_CACHE, exist_ok=True)
+    (fd, TEMP_FONT) = tempfile.mkstemp(suffix=".part", dir=DIR_CACHE)
+    os.close(fd)
+    shutil.copyfile(OUTPUT_FONT, TEMP_FONT)
+    os.replace(TEMP_FONT, get_cached_font_path(fingerprint, DIR_CACHE))
+    # 古いものから削除する. 同時に保存した別のビルドが先に削除したファイルは、削除済みとして扱う
+    mtimes = { CACHED_FONT: get_mtime(CACHED_FONT) for CACHED_FONT in \
+               [os.path.join(DIR_CACHE, file_name) for file_name in os.listdir(DIR_CACHE) if file_name.endswith(".ttf")] }
+    CACHED_FONTS = [CACHED_FONT for (CACHED_FONT, mtime) in mtimes.items() if mtime != None]
+    CACHED_FONTS.sort(key=lambda CACHED_FONT: mtimes[CACHED_FONT], reverse=True)
+    for CACHED_FONT in CACHED_FONTS[max_entries:]:
+        try:
+            os.remove(CACHED_FONT)
+        except FileNotFoundError:
+            pass
+
+# e.g.: outputs/Mengshen-HanSerif.ttf -> outputs/Mengshen-HanSerif.fingerprint
+def save_fingerprint(fingerprint, OUTPUT_FONT):
+    FINGERPRINT_FILE = os.path.splitext(OUTPUT_FONT)[0] + ".fingerprint"
+    with open(FINGERPRINT_FILE, "w", encoding="utf-8") as f:
+        f.write(fingerprint + "\n")
+    return FINGERPRINT_FILE
@@ -47,3 +47,79 @@ HAN_SERIF_PINYIN = os.path.normpath( os.path.join(path.DIR_FONT_FOR_HAN_SERIF, "
 
 HAN_HANDWRITTEN_MAIN   = os.path.normpath( os.path.join(path.DIR_FONT_FOR_HANDWRITTEN, "XiaolaiMonoSC-without-Hangul-Regular.ttf") )
 HAN_HANDWRITTEN_PINYIN = os.path.normpath( os.path.join(path.DIR_FONT_FOR_HANDWRITTEN, "latin-alpabet-of-SetoFont-SP.ttf") )
+
+
+# --prune, --auto-reduce のときに、対象の漢字以外で残す unicode の範囲
+PRUNE_ALLOWED_UNICODE_RANGES = [
+    (0x0000, 0x024F), # Basic Latin, Latin-1 Supplement, Latin Extended-A/B
+    (0x0300, 0x036F), # Combining Diacritical Marks (m̄, m̀ など)
+    (0x2000, 0x206F), # General Punctuation
+    (0x3000, 0x303F), # CJK Symbols and Punctuation
+    (0x3040, 0x309F), # Hiragana
+    (0x30A0, 0x30FF), # Katakana
+    (0x3100, 0x312F), # Bopomofo
+    (0xFE30, 0xFE4F), # CJK Compatibility Forms
+    (0xFF00, 0xFFEF), # Halfwidth and Fullwidth Forms
+]
+
+
+# --subset block のときの unicode の範囲ごとのサブセット (web_font.py)
+WEB_FONT_SUBSET_BLOCKS = [
+    ("latin", [
+        (0x0000, 0x024F), # Basic Latin, Latin-1 Supplement, Latin Extended-A/B
+        (0x0300, 0x036F), # Combining Diacritical Marks
+    ]),
+    ("symbols", [
+        (0x2000, 0x2BFF), # General Punctuation ~ Miscellaneous Symbols and Arrows
+        (0x3000, 0x303F), # CJK Symbols and Punctuation
+        (0xFE30, 0xFE4F), # CJK Compatibility Forms
+        (0xFF00, 0xFFEF), # Halfwidth and Fullwidth Forms
+    ]),
+    ("kana", [
+        (0x3040, 0x30FF), # Hiragana, Katakana
+        (0x3100, 0x312F), # Bopomofo
+        (0x31F0, 0x31FF), # Katakana Phonetic Extensions
+    ]),
+    ("cjk", [
+        (0x2E80, 0x2FDF), # CJK Radicals
+        (0x3400, 0x4DBF), # CJK Unified Ideographs Extension A
+        (0x4E00, 0x9FFF), # CJK Unified Ideographs
+        (0xF900, 0xFAFF), # CJK Compatibility Ideographs
+        (0x20000, 0x3FFFF), # CJK Unified Ideographs Extension B~
+    ]),
+]
+# 一つのサブセットに入れる文字数の上限 (これを超えるブロックは分割する)
+WEB_FONT_MAX_CHARS_PER_SUBSET = 1500
+# --subset frequency のときの、頻度の高い順の各ティアの文字数 (これ以降の文字は WEB_FONT_MAX_CHARS_PER_SUBSET ずつ)
+WEB_FONT_FREQUENCY_TIERS = [1000, 2500, 3500]
+
+# build_daemon.py で読み込んだ入力 (json, マッピングテーブル, 多音字のルール) を持つ数 (古いものから捨てる)
+BUILD_DAEMON_CACHE_ENTRIES = 16
+# build_daemon.py で同時に実行するビルドの数
+BUILD_DAEMON_WORKERS = 2
+
+# main.py --watch で、発音のデータの変更を調べる間隔 [s]
+WATCH_POLL_INTERVAL = 0.2
+# main.py --watch で、最後の変更からこの時間 [s] 変更が無ければ作り直す (続けて保存されたときにまとめる)
+WATCH_DEBOUNCE = 0.5
+
+# main.py --deterministic で、フィンガープリントごとに残すフォントの数 (tmp/json/build_cache/)
+BUILD_CACHE_ENTRIES = 4
+
+# ivs_annotator.py で一度に読むバイト数
+IVS_ANNOTATOR_CHUNK_SIZE = 1 << 20
+
+# pinyin_lookup.py で、この文字数以上のバッチを workers のプロセスに分ける
+PINYIN_LOOKUP_PARALLEL_CHARS = 100000
+# pinyin_lookup.py で、プロセスに一度に渡す文字列の数
+PINYIN_LOOKUP_BATCH_SIZE = 1024
+
+# pinyin_scraper.py で、ホストごとに同時に送るリクエストの数
+SCRAPE_CONCURRENCY_PER_HOST = 4
+# pinyin_scraper.py で、ホストごとに一秒あたりに送るリクエストの数
+SCRAPE_REQUESTS_PER_SECOND = 4.0
+# pinyin_scraper.py で、失敗したリクエストをやり直す回数と、最初のやり直しまでの秒数 (やり直すたびに倍にする)
+SCRAPE_RETRIES = 3
+SCRAPE_RETRY_BACKOFF = 0.5
+# pinyin_scraper.py のリクエストのタイムアウト [秒]
+SCRAPE_TIMEOUT = 10
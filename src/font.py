@@ -2,7 +2,6 @@
 #!/usr/bin/env python'
 
 import shell
-import orjson
 import os
 import copy
 import pinyin_getter as pg
@@ -12,87 +11,141 @@ import path as p
 import GSUB_table as gt
 import config
 import name_table
+import profiler as pf
+import glyph_dedup
+import glyph_budget
+import glyph_prune
+import glyph_store
+import font_metrics
+import reference_graph
+import glyph_ordering
+import uvs_table
+import font_sources
+import build_fingerprint
 
 class Font():
     def __init__(self, TAMPLATE_MAIN_JSON, TAMPLATE_GLYF_JSON, ALPHABET_FOR_PINYIN_JSON, \
-                        PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON, FONT_TYPE):
+                        PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON, FONT_TYPE, profiler=None, auto_reduce=False, prune=False, bake=False, max_reference_depth=None, glyph_cache_mb=None, \
+                        pinyin_mapping_table=None, DIR_SCRATCH=p.DIR_TEMP, sources=None, deterministic=False):
+        # 各工程の計測 (main.py の --profile)
+        self.profiler = profiler if profiler != None else pf.NullProfiler()
         self.TAMPLATE_MAIN_JSON     = TAMPLATE_MAIN_JSON
         self.TAMPLATE_GLYF_JSON     = TAMPLATE_GLYF_JSON
         self.PATTERN_ONE_TXT        = PATTERN_ONE_TXT
         self.PATTERN_TWO_JSON       = PATTERN_TWO_JSON
         self.EXCEPTION_PATTERN_JSON = EXCEPTION_PATTERN_JSON
         self.FONT_TYPE = FONT_TYPE
-        self.load_json()
-        # utility を使うために設定する
-        utility.cmap_table = self.marged_font["cmap"]
-        self.PINYIN_MAPPING_TABLE = pg.get_pinyin_table_with_mapping_table()
+        # グリフ数が上限を超えるときに、自動でグリフを削減するか (main.py の --auto-reduce)
+        self.auto_reduce = auto_reduce
+        # 到達できないグリフを保存前に削除するか (main.py の --prune)
+        self.prune = prune
+        # ピンインの輪郭を発音のグリフに焼き込むか (main.py の --bake-pinyin)
+        self.bake = bake
+        # 合成グリフの参照の深さの上限 (main.py の --max-reference-depth). None なら展開しない
+        self.max_reference_depth = max_reference_depth
+        # template_glyf.json から読んだ輪郭を持つ LRU の大きさ [MB] (main.py の --glyph-cache-mb). None なら全てのグリフをメモリに読み込む
+        self.glyph_cache_mb = glyph_cache_mb
+        # 同じ入力から同じバイト列のフォントを作るか (main.py の --deterministic, SOURCE_DATE_EPOCH). build_fingerprint.py
+        self.deterministic = deterministic or build_fingerprint.is_deterministic_env()
+        # otfccbuild に渡した json のフィンガープリント (deterministic のときだけ)
+        self.fingerprint = None
+        # 保存する json などの作業用のディレクトリ (font_builder.FontBuilder はビルドごとに別のディレクトリにする)
+        self.DIR_SCRATCH = DIR_SCRATCH
+        # 入力の読み込み (font_sources.py). build_daemon.py は読み込んだものを使い回す CachedSources を渡す
+        self.sources = sources if sources != None else font_sources.FileSources()
+        with self.profiler.stage("load_json"):
+            self.load_json()
+        # ピンインを付ける漢字と cid の索引. GSUBTable などにも渡す
+        if pinyin_mapping_table == None:
+            pinyin_mapping_table = self.sources.get_pinyin_mapping_table()
+        self.PINYIN_MAPPING_TABLE = pinyin_mapping_table
+        self.hanzi_index = utility.HanziIndex(self.marged_font["cmap"], self.PINYIN_MAPPING_TABLE)
 
         # 発音のグリフを作成する
-        pinyin_glyph = py_glyph.PinyinGlyph(TAMPLATE_MAIN_JSON, ALPHABET_FOR_PINYIN_JSON, FONT_TYPE)
-        self.py_alphablet = pinyin_glyph.get_py_alphablet_glyf_table()
-        pinyin_glyph.add_references_of_pronunciation()
-        self.pronunciation = pinyin_glyph.get_pronunciation_glyf_table()
+        with self.profiler.stage("pronunciation_glyphs"):
+            pinyin_glyph = py_glyph.PinyinGlyph(TAMPLATE_MAIN_JSON, ALPHABET_FOR_PINYIN_JSON, FONT_TYPE, bake, self.PINYIN_MAPPING_TABLE, self.sources)
+            self.py_alphablet = pinyin_glyph.get_py_alphablet_glyf_table()
+            pinyin_glyph.add_references_of_pronunciation()
+            if self.bake:
+                pinyin_glyph.bake_pronunciations()
+                # 漢字のグリフは py_alphablet を参照しなくなるので、代わりに焼き込んだ発音のグリフを追加する
+                self.py_alphablet = pinyin_glyph.get_baked_pronunciation_glyf_table()
+            self.pronunciation = pinyin_glyph.get_pronunciation_glyf_table()
         print("発音のグリフを作成完了")
 
-        # 定義が重複している文字に関しては、基本的に同一のグリフが使われているはず
-        # どれかがグリフに発音を追加したら無視する。
-        # ⺎(U+2E8E) 兀(U+5140) 兀(U+FA0C)
-        # 嗀(U+55C0) 嗀(U+FA0D)
-        self.duplicate_definition_of_hanzes = {
-            str(0x2E8E):0, str(0x5140):0, str(0xFA0C):0,
-            str(0x55C0):1, str(0xFA0D):1
-        }
-        self.is_added_glyf = [False, False]
-        # もし、別のグリフが用意されているなら、グリフ数削減のためにも参照を先を統一する。
-        self.integrate_reference_of_wu4()
-        self.integrate_reference_of_hu4()
-
-    # ⺎(U+2E8E) 兀(U+5140) 兀(U+FA0C)
-    def integrate_reference_of_wu4(self):
-        wu4_str_oct_unicodes = [str(0x2E8E), str(0x5140), str(0xFA0C)]
-        self.integrate_reference_of_duplicate_hanzi(wu4_str_oct_unicodes)
-    
-    # 嗀(U+55C0) 嗀(U+FA0D)
-    def integrate_reference_of_hu4(self):
-        hu4_str_oct_unicodes = [str(0x55C0), str(0xFA0D)]
-        self.integrate_reference_of_duplicate_hanzi(hu4_str_oct_unicodes)
-
-    # 重複して定義されている漢字においてグリフが複数あるときには参照するグリフを一つにする
-    def integrate_reference_of_duplicate_hanzi(self, duplicate_hanzi_unicodes):
-        refered_set_glyf_name = set()
-        cmap_table = self.marged_font["cmap"]
-
-        for str_oct_unicode in duplicate_hanzi_unicodes:
-            if str_oct_unicode in cmap_table:
-                refered_set_glyf_name.add(cmap_table[str_oct_unicode])
-        refered_glyf_names = list(refered_set_glyf_name)
-        refered_glyf_names.sort()
-        # 参照先が一つのときは問題ないので抜ける
-        if len(refered_glyf_names) < 2:
+        # 輪郭が同じグリフ（重複して定義されている漢字 e.g.: 兀(U+5140) 兀(U+FA0C)）は、グリフ数削減のためにも参照先を統一する。
+        with self.profiler.stage("dedup"):
+            self.deduplicate_glyf()
+        # 最終的なグリフ数を見積もって、上限を超えるならここで止める
+        with self.profiler.stage("glyph_budget"):
+            self.check_glyf_budget()
+        # 複数の unicode が同じグリフを参照しているときは、最初の漢字だけグリフに発音を追加する
+        # 二度目に追加すると循環参照になる
+        # Exception: otfccbuild : Build : [WARNING] [Stat] Circular glyph reference found in gid 11663 to gid 11664. The reference will be dropped.
+        self.added_cids = set()
+
+    # 重複しているグリフを一つにまとめる
+    def deduplicate_glyf(self):
+        duplicate_glyf = glyph_dedup.find_duplicate_glyf(self.marged_font, self.substance_glyf_table)
+        glyph_dedup.replace_reference_of_duplicate_glyf(self.marged_font, self.substance_glyf_table, duplicate_glyf)
+        for delete_glyf_name in duplicate_glyf.keys():
+            self.delete_glyf(delete_glyf_name)
+        print("  ==> deduplicated glyf num : {}".format(len(duplicate_glyf)))
+
+    def check_glyf_budget(self):
+        budget = glyph_budget.GlyphBudget(self.marged_font, self.substance_glyf_table, self.py_alphablet.keys(), self.hanzi_index)
+        plan = budget.plan()
+        glyph_budget.print_plan(plan)
+        if len(plan["missing_hanzes"]) > 0:
+            raise Exception("グリフが見つかりません.\n  hanzi: {}".format("".join(plan["missing_hanzes"])))
+        if plan["total"] <= glyph_budget.MAX_GLYF_NUM:
             return
 
-        # 最初のものに統一する
-        refered_glyf_name = refered_glyf_names[0]
-        for str_oct_unicode in duplicate_hanzi_unicodes:
-            if str_oct_unicode in cmap_table:
-                if cmap_table[str_oct_unicode] != refered_glyf_name:
-                    # 不要なグリフの削除
-                    delete_glyf_name = cmap_table[str_oct_unicode]
-                    self.delete_glyf(delete_glyf_name)
-                    # 参照するグリフを更新
-                    cmap_table.update( {str_oct_unicode : refered_glyf_name} )
+        reductions = budget.get_reductions()
+        if self.auto_reduce:
+            for reduction in glyph_budget.REDUCTIONS:
+                if reductions[reduction] == 0:
+                    continue
+                delete_glyf_names = budget.reduce(reduction)
+                print("  ==> {} : {} 個のグリフを削除します".format(reduction, len(delete_glyf_names)))
+                self.delete_glyfs(delete_glyf_names)
+                plan = budget.plan()
+                glyph_budget.print_plan(plan)
+                if plan["total"] <= glyph_budget.MAX_GLYF_NUM:
+                    return
+        raise Exception("glyf は {} 個までしか格納できません。\n  estimated: {}\n  reducible: {} (--auto-reduce)".format(glyph_budget.MAX_GLYF_NUM, plan["total"], reductions))
+
+    # 対象の漢字と config.PRUNE_ALLOWED_UNICODE_RANGES 以外から到達できないグリフを削除する
+    def prune_glyf(self):
+        delete_glyf_names = glyph_prune.find_unreachable_glyf(self.marged_font, self.marged_font["glyf"], config.PRUNE_ALLOWED_UNICODE_RANGES, self.hanzi_index)
+        self.delete_glyfs(delete_glyf_names)
+        print("  ==> pruned glyf num : {}".format(len(delete_glyf_names)))
+
+    # 深さが max_reference_depth を超える参照を、参照先の参照で置き換える (reference_graph.py)
+    def flatten_references(self):
+        graph = reference_graph.ReferenceGraph(self.marged_font["glyf"])
+        reference_graph.print_depth_stats(graph.get_depth_stats(), "reference depth (before)")
+        gids = reference_graph.get_glyf_gids(self.marged_font["glyph_order"])
+        for cycle in graph.cycles:
+            print("  ==> circular reference : {}".format(reference_graph.format_cycle(cycle, gids)))
+        flattened_num = graph.flatten(self.max_reference_depth)
+        reference_graph.print_depth_stats(graph.get_depth_stats(), "reference depth (after)")
+        print("  ==> flattened glyf num : {}".format(flattened_num))
 
     def delete_glyf(self, glyf_name):
+        self.delete_glyfs([glyf_name])
+
+    def delete_glyfs(self, glyf_names):
         # 空のグリフのテーブル（管理しやすくするために、glyf table は別オブジェクトになっている）
         template_glyf_table  = self.marged_font["glyf"]
-        glyph_order_list     = self.marged_font["glyph_order"]
-        
-        if glyf_name in template_glyf_table:
-            del template_glyf_table[glyf_name]
-        if glyf_name in self.substance_glyf_table:
-            del self.substance_glyf_table[glyf_name]
-        if glyf_name in glyph_order_list:
-            glyph_order_list.remove(glyf_name)
+        set_glyf_names = set(glyf_names)
+
+        for glyf_name in set_glyf_names:
+            if glyf_name in template_glyf_table:
+                del template_glyf_table[glyf_name]
+            if glyf_name in self.substance_glyf_table:
+                del self.substance_glyf_table[glyf_name]
+        self.marged_font["glyph_order"] = [glyf_name for glyf_name in self.marged_font["glyph_order"] if not (glyf_name in set_glyf_names)]
 
     def get_advance_size_of_hanzi(self):
         # なんでもいいが、とりあえず漢字の「一」でサイズを取得する
@@ -126,18 +179,18 @@ class Font():
         if not ("cmap_uvs" in self.marged_font):
             self.marged_font.update( {"cmap_uvs": {}} )
 
-        for (hanzi, pinyins) in utility.get_has_single_pinyin_hanzi():
+        for (hanzi, pinyins) in self.hanzi_index.get_has_single_pinyin_hanzi():
             str_oct_unicode = str(ord(hanzi))
             if not (str_oct_unicode in self.marged_font["cmap"]):
                 raise Exception("グリフが見つかりません.\n  unicode: {}".format(str_oct_unicode))
-            cid = utility.convert_str_hanzi_2_cid(hanzi)
+            cid = self.hanzi_index.convert_str_hanzi_2_cid(hanzi)
             self.marged_font["cmap_uvs"]["{0} {1}".format(str_oct_unicode, IVS)] = "{}.ss00".format(cid)
         
-        for (hanzi, pinyins) in utility.get_has_multiple_pinyin_hanzi():
+        for (hanzi, pinyins) in self.hanzi_index.get_has_multiple_pinyin_hanzi():
             str_oct_unicode = str(ord(hanzi))
             if not (str_oct_unicode in self.marged_font["cmap"]):
                 raise Exception("グリフが見つかりません.\n  unicode: {}".format(str_oct_unicode))
-            cid = utility.convert_str_hanzi_2_cid(hanzi)
+            cid = self.hanzi_index.convert_str_hanzi_2_cid(hanzi)
             # ss00 は ピンインのないグリフ なので、ピンインのグリフは "ss{:02}".format(len) まで
             for i in range( len(pinyins)+1 ):
                 self.marged_font["cmap_uvs"]["{0} {1}".format(str_oct_unicode, IVS + i)] = "{}.ss{:02}".format(cid, i)
@@ -146,35 +199,55 @@ class Font():
         """
         e.g.: 
         "glyph_order": [
+            (元のフォントのグリフ)
             ...
-            "uni4E0D","uni4E0D.ss00","uni4E0D.ss01","uni4E0D.ss02","uni4E0D.ss03",
+            "py_alphablet_a", ...
+            "uni4E0D.ss00","uni4E0D.ss01","uni4E0D.ss02","uni4E0D.ss03",
             ...
         ]
+        元のフォントのグリフの順番 (gid) は変えずに、追加するグリフを後ろに並べる
+        GSUB を追加したあとに arrange_glyph_order で漢字と異体字を並べ直す
         """
-        # 漢字グリフ追加
-        set_glyph_order = set(self.marged_font["glyph_order"])
-        for (hanzi, pinyins) in utility.get_has_single_pinyin_hanzi():
+        # 漢字 -> 異体字
+        self.hanzi_variants = {}
+        for (hanzi, pinyins) in self.hanzi_index.get_has_single_pinyin_hanzi():
             str_oct_unicode = str(ord(hanzi))
             if not (str_oct_unicode in self.marged_font["cmap"]):
                 raise Exception("グリフが見つかりません.\n  unicode: {:x}".format(int(str_oct_unicode)))
-            cid = utility.convert_str_hanzi_2_cid(hanzi)
-            set_glyph_order.add("{}.ss00".format(cid))
+            cid = self.hanzi_index.convert_str_hanzi_2_cid(hanzi)
+            self.hanzi_variants.setdefault(cid, ["{}.ss00".format(cid)])
 
-        for (hanzi, pinyins) in utility.get_has_multiple_pinyin_hanzi():
+        for (hanzi, pinyins) in self.hanzi_index.get_has_multiple_pinyin_hanzi():
             str_oct_unicode = str(ord(hanzi))
             if not (str_oct_unicode in self.marged_font["cmap"]):
                 raise Exception("グリフが見つかりません.\n  unicode: {:x}".format(int(str_oct_unicode)))
+            cid = self.hanzi_index.convert_str_hanzi_2_cid(hanzi)
             # ss00 は ピンインのないグリフ なので、ピンインのグリフは "ss{:02}".format(len) まで
-            for i in range( len(pinyins)+1 ):
-                cid = utility.convert_str_hanzi_2_cid(hanzi)
-                set_glyph_order.add("{}.ss{:02}".format(cid, i))
-        
+            self.hanzi_variants.setdefault(cid, ["{}.ss{:02}".format(cid, i) for i in range( len(pinyins)+1 )])
+
+        # 重複を除いて、元の順番のまま後ろに追加する
+        new_glyph_order = list(dict.fromkeys(self.marged_font["glyph_order"]))
+        set_glyph_order = set(new_glyph_order)
         # ピンインのグリフを追加
-        set_glyph_order = set_glyph_order | set(self.py_alphablet.keys())
-        new_glyph_order = list(set_glyph_order)
-        new_glyph_order.sort()
+        added_glyf_names = list(self.py_alphablet.keys())
+        # 漢字グリフ追加
+        for variant_names in self.hanzi_variants.values():
+            added_glyf_names += variant_names
+        for glyf_name in added_glyf_names:
+            if not (glyf_name in set_glyph_order):
+                set_glyph_order.add(glyf_name)
+                new_glyph_order.append(glyf_name)
         self.marged_font["glyph_order"] = new_glyph_order
-        # print(self.marged_font["glyph_order"])
+
+    # GSUB の coverage が gid の範囲になるように、漢字と異体字を並べ直す (glyph_ordering.py)
+    def arrange_glyph_order(self):
+        # rebuild_GSUB で並べ直すときは、並べる前の順番から並べる (build と同じ並びにする)
+        self.unarranged_glyph_order = self.marged_font["glyph_order"]
+        coverages = glyph_ordering.get_coverages(self.marged_font["GSUB"])
+        glyph_ordering.print_coverage_ranges(glyph_ordering.count_coverage_ranges(coverages, self.marged_font["glyph_order"]), "coverage (before)")
+        substitution_coverages = glyph_ordering.get_substitution_coverages(self.marged_font["GSUB"])
+        self.marged_font["glyph_order"] = glyph_ordering.arrange_glyph_order(self.marged_font["glyph_order"], self.hanzi_variants, substitution_coverages)
+        glyph_ordering.print_coverage_ranges(glyph_ordering.count_coverage_ranges(coverages, self.marged_font["glyph_order"]), "coverage (after)")
 
     def generate_hanzi_glyf_with_normal_pinyin(self, cid):
         (advance_width, _) = self.get_advance_size_of_hanzi()
@@ -207,21 +280,6 @@ class Font():
         return hanzi_glyf
     
     
-    # unicode 上に定義が重複している漢字があるとエラーになるので判定を入れる
-    # Exception: otfccbuild : Build : [WARNING] [Stat] Circular glyph reference found in gid 11663 to gid 11664. The reference will be dropped.
-    def is_added_glyf_4_duplicate_definition_of_hanzi(self, str_oct_unicode):
-        duplicate_definition_of_hanzes = [str_oct_unicode for str_oct_unicode, _ in self.duplicate_definition_of_hanzes.items()]
-        if str_oct_unicode in duplicate_definition_of_hanzes:
-            idx = self.duplicate_definition_of_hanzes[str_oct_unicode]
-            return self.is_added_glyf[idx]
-        return False
-
-    def update_status_is_added_glyf_4_duplicate_definition_of_hanzi(self, str_oct_unicode):
-        duplicate_definition_of_hanzes = [str_oct_unicode for str_oct_unicode, _ in self.duplicate_definition_of_hanzes.items()]
-        if str_oct_unicode in duplicate_definition_of_hanzes:
-            idx = self.duplicate_definition_of_hanzes[str_oct_unicode]
-            self.is_added_glyf[idx] = True
-                
     def add_glyf(self):
         """
         e.g.: 
@@ -241,13 +299,14 @@ class Font():
         # if "hanzi_glyf" has normal pronunciation only
         # hanzi_glyf -> hanzi_glyf.ss00
         # hanzi_glyf = hanzi_glyf.ss00 + normal pronunciation
-        for (hanzi, pinyins) in utility.get_has_single_pinyin_hanzi():
+        for (hanzi, pinyins) in self.hanzi_index.get_has_single_pinyin_hanzi():
             str_oct_unicode = str(ord(hanzi))
             if not (str_oct_unicode in self.marged_font["cmap"]):
                 raise Exception("グリフが見つかりません.\n  unicode: {}".format(str_oct_unicode))
-            if self.is_added_glyf_4_duplicate_definition_of_hanzi(str_oct_unicode):
+            cid = self.hanzi_index.convert_str_hanzi_2_cid(hanzi)
+            if cid in self.added_cids:
                 continue
-            cid = utility.convert_str_hanzi_2_cid(hanzi)
+            self.added_cids.add(cid)
             glyf_data = self.substance_glyf_table[cid]
             self.substance_glyf_table.update( { "{}.ss00".format(cid) : glyf_data } )
             normal_pronunciation = pinyins[pg.NORMAL_PRONUNCIATION]
@@ -259,13 +318,14 @@ class Font():
         # hanzi_glyf.ss01 = hanzi_glyf.ss00 + normal pronunciation
         # hanzi_glyf = hanzi_glyf.ss01
         # hanzi_glyf.ss02 = hanzi_glyf.ss00 + variational pronunciation
-        for (hanzi, pinyins) in utility.get_has_multiple_pinyin_hanzi():
+        for (hanzi, pinyins) in self.hanzi_index.get_has_multiple_pinyin_hanzi():
             str_oct_unicode = str(ord(hanzi))
             if not (str_oct_unicode in self.marged_font["cmap"]):
                 raise Exception("グリフが見つかりません.\n  unicode: {}".format(str_oct_unicode))
-            if self.is_added_glyf_4_duplicate_definition_of_hanzi(str_oct_unicode):
+            cid = self.hanzi_index.convert_str_hanzi_2_cid(hanzi)
+            if cid in self.added_cids:
                 continue
-            cid = utility.convert_str_hanzi_2_cid(hanzi)
+            self.added_cids.add(cid)
             glyf_data = self.substance_glyf_table[cid]
             # hanzi_glyf -> hanzi_glyf.ss00
             self.substance_glyf_table.update( { "{}.ss00".format(cid) : glyf_data } )
@@ -282,30 +342,33 @@ class Font():
                 variational_pronunciation = pinyins[i]
                 glyf_data = self.generate_hanzi_glyf_with_pinyin(cid, variational_pronunciation)
                 self.substance_glyf_table.update( { "{}.ss{:02}".format(cid, pg.VARIATIONAL_PRONUNCIATION + i) : glyf_data } )
-            self.update_status_is_added_glyf_4_duplicate_definition_of_hanzi(str_oct_unicode)
 
         new_glyf = self.marged_font["glyf"]
         new_glyf.update( self.py_alphablet )
         new_glyf.update( self.substance_glyf_table )
         self.marged_font["glyf"] = new_glyf
         print("  ==> glyf num : {}".format(len(self.marged_font["glyf"])))
-        if len(self.marged_font["glyf"]) > 65536:
-            raise Exception("glyf は 65536 個以上格納できません。")
+        if len(self.marged_font["glyf"]) > glyph_budget.MAX_GLYF_NUM:
+            raise Exception("glyf は {} 個までしか格納できません。".format(glyph_budget.MAX_GLYF_NUM))
 
 
     def add_GSUB(self):
-        GSUB = gt.GSUBTable(self.marged_font["GSUB"], self.PATTERN_ONE_TXT, self.PATTERN_TWO_JSON, self.EXCEPTION_PATTERN_JSON)
+        GSUB = gt.GSUBTable(self.marged_font["GSUB"], self.PATTERN_ONE_TXT, self.PATTERN_TWO_JSON, self.EXCEPTION_PATTERN_JSON, self.hanzi_index, self.sources)
         self.marged_font["GSUB"] = GSUB.get_GSUB_table()
+        # web_font のサブセットの分割で使う
+        self.reading_rule = GSUB.get_reading_rule()
 
     def set_about_size(self):
         (_, advanceAddedPinyinHeight, _) = self.get_advance_size_of_pinyin_glyf()
-        if advanceAddedPinyinHeight > self.marged_font["head"]["yMax"]:
-            # すべてのグリフの輪郭を含む範囲
-            self.marged_font["head"]["yMax"] = advanceAddedPinyinHeight
-        if advanceAddedPinyinHeight > self.marged_font["hhea"]["ascender"]:
-            # 原点からグリフの上端までの距離
-            self.marged_font["hhea"]["ascender"] = advanceAddedPinyinHeight
-            self.marged_font["OS_2"]["usWinAscent"] = advanceAddedPinyinHeight
+        # 合成グリフ (漢字 + ピンイン) を含めた実際の輪郭の範囲で head, hhea, OS_2, vhea を広げる (font_metrics.py)
+        head = self.marged_font["head"]
+        raw_bbox = [head.get("xMin", 0), head.get("yMin", 0), head.get("xMax", 0), head.get("yMax", 0)]
+        (_, bboxes) = font_metrics.get_glyf_bboxes(self.marged_font["glyf"], raw_bbox)
+        font_bbox = font_metrics.get_font_bbox(bboxes)
+        if font_bbox == None:
+            font_bbox = raw_bbox
+        (x_min, y_min, x_max, y_max) = font_metrics.update_vertical_metrics(self.marged_font, font_bbox, advanceAddedPinyinHeight)
+        print("  ==> bbox : ({}, {}, {}, {}), ascender : {}".format(x_min, y_min, x_max, y_max, self.marged_font["hhea"]["ascender"]))
         # 特定の言語のベースライン
         # self.marged_font["BASE"]["hani"]
 
@@ -313,11 +376,20 @@ class Font():
         # フォント製作者によるバージョン
         self.marged_font["head"]["fontRevision"] = name_table.VERSION
         # 作成日(基準日：1904/01/01 00:00 GMT)
-        from datetime import datetime
-        base_date = datetime.strptime("1904/01/01 00:00", "%Y/%m/%d %H:%M")
-        base_time = base_date.timestamp()
-        now_time  = datetime.now().timestamp() 
-        self.marged_font["head"]["created"] = round( now_time - base_time )
+        if self.deterministic:
+            # SOURCE_DATE_EPOCH, 無ければ元のフォントの作成日
+            created = build_fingerprint.get_source_date()
+            if created == None:
+                created = self.marged_font["head"].get("created", build_fingerprint.SECONDS_FROM_1904_TO_1970)
+        else:
+            from datetime import datetime
+            base_date = datetime.strptime("1904/01/01 00:00", "%Y/%m/%d %H:%M")
+            base_time = base_date.timestamp()
+            now_time  = datetime.now().timestamp() 
+            created = round( now_time - base_time )
+        self.marged_font["head"]["created"] = created
+        # otfccbuild は --keep-modified-time で、この値をそのまま使う
+        self.marged_font["head"]["modified"] = created
         # フォント名等を設定
         if self.FONT_TYPE == config.HAN_SERIF_TYPE:
             self.marged_font["name"] = name_table.HAN_SERIF
@@ -328,32 +400,91 @@ class Font():
 
 
     def load_json(self):
-        with open(self.TAMPLATE_MAIN_JSON, "rb") as read_file:
-            self.marged_font = orjson.loads(read_file.read())
-        with open(self.TAMPLATE_GLYF_JSON, "rb") as read_file:
-            self.substance_glyf_table = orjson.loads(read_file.read())
+        self.marged_font = self.sources.load_json(self.TAMPLATE_MAIN_JSON)
+        # 参照を持たないグリフは decode せずに glyph_store.RawGlyf のまま持つ
+        # --glyph-cache-mb のときはバイト列もメモリに持たずに、template_glyf.json から読む (glyph_store.DiskRawGlyf)
+        cache_bytes = None
+        if self.glyph_cache_mb != None:
+            cache_bytes = self.glyph_cache_mb * 1024 * 1024
+        self.substance_glyf_table = self.sources.load_glyf_table(self.TAMPLATE_GLYF_JSON, cache_bytes)
+        # DiskRawGlyf が読むファイル. close で閉じる (閉じた後は marged_font を書き出せない)
+        self.glyf_file = glyph_store.get_glyf_file(self.substance_glyf_table)
+
+    def close(self):
+        if self.glyf_file != None:
+            self.glyf_file.close()
+            self.glyf_file = None
 
     def save_as_json(self, TAMPLATE_MARGED_JSON):
-        with open(TAMPLATE_MARGED_JSON, "wb") as f:
-            serialized_glyf = orjson.dumps(self.marged_font, option=orjson.OPT_INDENT_2)
-            f.write(serialized_glyf)
+        # 一グリフずつ書き込む (フォント全体のバイト列は作らない)
+        glyph_store.save_font(self.marged_font, TAMPLATE_MARGED_JSON)
     
     def convert_json2otf(self, TAMPLATE_JSON, OUTPUT_FONT):
-        cmd = "otfccbuild {} -o {}".format(TAMPLATE_JSON, OUTPUT_FONT)
+        cmd = "otfccbuild {} -o {} --keep-modified-time".format(TAMPLATE_JSON, OUTPUT_FONT)
         print(cmd)
         shell.process(cmd)
 
     def build(self, OUTPUT_FONT):
-        self.add_cmap_uvs()
+        with self.profiler.stage("cmap_uvs"):
+            self.add_cmap_uvs()
         print("cmap_uvs table を追加完了")
-        self.add_glyph_order()
+        with self.profiler.stage("glyph_order"):
+            self.add_glyph_order()
         print("glyph_order table を追加完了")
-        self.add_glyf()
+        with self.profiler.stage("glyf"):
+            self.add_glyf()
         print("glyf table を追加完了")
-        self.add_GSUB()
+        with self.profiler.stage("GSUB"):
+            self.add_GSUB()
+        print("GSUB table を追加完了")
+        with self.profiler.stage("arrange_glyph_order"):
+            self.arrange_glyph_order()
+        if self.max_reference_depth != None:
+            with self.profiler.stage("flatten_references"):
+                self.flatten_references()
+        if self.prune:
+            with self.profiler.stage("prune"):
+                self.prune_glyf()
+        with self.profiler.stage("metrics"):
+            self.set_about_size()
+        # otfccbuild は循環参照を警告して捨てるだけなので、その前に止める
+        with self.profiler.stage("reference_check"):
+            reference_graph.check_circular_references(self.marged_font["glyf"], self.marged_font["glyph_order"])
+        self.write_font(OUTPUT_FONT)
+
+    # 多音字のパターンだけが変わったときに、GSUB だけを作り直す (main.py の --watch)
+    # グリフ (glyf, cmap_uvs) は build で作ったものをそのまま使う. build の後に呼ぶこと
+    def rebuild_GSUB(self, OUTPUT_FONT):
+        with self.profiler.stage("GSUB"):
+            self.add_GSUB()
         print("GSUB table を追加完了")
-        self.set_about_size()
+        with self.profiler.stage("arrange_glyph_order"):
+            # build で削除したグリフ (--prune など) は除く
+            set_glyph_order = set(self.marged_font["glyph_order"])
+            self.marged_font["glyph_order"] = [glyf_name for glyf_name in self.unarranged_glyph_order if glyf_name in set_glyph_order]
+            self.arrange_glyph_order()
+        self.write_font(OUTPUT_FONT)
+
+    # json に保存して otfccbuild で OUTPUT_FONT に変換する
+    def write_font(self, OUTPUT_FONT):
         self.set_copyright()
-        TAMPLATE_MARGED_JSON = os.path.join(p.DIR_TEMP, "template.json")
-        self.save_as_json(TAMPLATE_MARGED_JSON)
-        self.convert_json2otf(TAMPLATE_MARGED_JSON, OUTPUT_FONT)
\ No newline at end of file
+        TAMPLATE_MARGED_JSON = os.path.join(self.DIR_SCRATCH, "template.json")
+        with self.profiler.stage("save"):
+            self.save_as_json(TAMPLATE_MARGED_JSON)
+        # 前に同じ json から作ったフォントがあれば、それを使う
+        if self.deterministic:
+            with self.profiler.stage("fingerprint"):
+                self.fingerprint = build_fingerprint.get_fingerprint(TAMPLATE_MARGED_JSON)
+            print("  ==> fingerprint : {}".format(self.fingerprint))
+            if build_fingerprint.load_cached_font(self.fingerprint, OUTPUT_FONT):
+                print("  ==> 同じ json から作ったフォントがあるので otfccbuild を省略しました")
+                return
+        with self.profiler.stage("otfccbuild"):
+            self.convert_json2otf(TAMPLATE_MARGED_JSON, OUTPUT_FONT)
+        # otfccbuild は異体字を全て Non-Default UVS で書き出すので、通常のグリフと同じ組を Default UVS に書き直す
+        with self.profiler.stage("cmap_format14"):
+            uvs_table.print_uvs_stats(uvs_table.compact_format14(self.marged_font, OUTPUT_FONT))
+        if self.deterministic:
+            build_fingerprint.save_cached_font(self.fingerprint, OUTPUT_FONT)
+        if self.glyph_cache_mb != None:
+            print("  ==> peak rss : {:.1f}MB (glyph cache {}MB)".format(pf.get_peak_rss() / (1024 * 1024), self.glyph_cache_mb))
\ No newline at end of file
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import font as ft
+import profiler as pf
+
+"""
+一つのフォントのビルド (同じプロセスで、複数のビルドを同時に実行できる)
+
+ビルドに必要な状態は全てこのオブジェクト (とその Font) が持つ
+    漢字と cid の索引 : utility.HanziIndex (Font.hanzi_index)
+    各工程の計測     : profiler (指定しなければ NullProfiler)
+    作業用のディレクトリ : ビルドごとに tempfile.mkdtemp で作り、with を抜けると削除する
+入力の json (make_template_jsons, retrieve_latin_alphabet の出力) とマッピングテーブルは読むだけなので、
+同じ入力から複数のスレッドで別々の設定のフォントを作れる。
+
+e.g.:
+    with FontBuilder(TAMPLATE_MAIN_JSON, TAMPLATE_GLYF_JSON, ALPHABET_FOR_PINYIN_JSON,
+                     PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON, config.HAN_SERIF_TYPE, prune=True) as builder:
+        font_bytes = builder.build()
+"""
+
+class FontBuilder():
+
+    # font_options : Font の auto_reduce, prune, bake, max_reference_depth, glyph_cache_mb, pinyin_mapping_table
+    def __init__(self, TAMPLATE_MAIN_JSON, TAMPLATE_GLYF_JSON, ALPHABET_FOR_PINYIN_JSON, \
+                        PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON, FONT_TYPE, profiler=None, **font_options):
+        self.inputs = (TAMPLATE_MAIN_JSON, TAMPLATE_GLYF_JSON, ALPHABET_FOR_PINYIN_JSON, \
+                        PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON, FONT_TYPE)
+        self.profiler = profiler if profiler != None else pf.NullProfiler()
+        self.font_options = font_options
+        self.DIR_SCRATCH = None
+        # ビルドした Font (web_font のサブセットなどで marged_font, reading_rule を使う)
+        self.font = None
+
+    def __enter__(self):
+        self.DIR_SCRATCH = tempfile.mkdtemp(prefix="mengshen-")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.font != None:
+            self.font.close()
+            self.font = None
+        if self.DIR_SCRATCH != None and os.path.exists(self.DIR_SCRATCH):
+            shutil.rmtree(self.DIR_SCRATCH)
+        self.DIR_SCRATCH = None
+
+    # ビルドしたフォント (ttf) のバイト列を返す
+    def build(self, font_file_name="font.ttf"):
+        if self.DIR_SCRATCH == None:
+            raise Exception("FontBuilder は with の中で使ってください.")
+        font = ft.Font(*self.inputs, profiler=self.profiler, DIR_SCRATCH=self.DIR_SCRATCH, **self.font_options)
+        # 前のビルド (--watch で作り直すとき) の Font が開いているファイルを閉じる
+        if self.font != None:
+            self.font.close()
+        self.font = font
+        OUTPUT_FONT = os.path.join(self.DIR_SCRATCH, font_file_name)
+        self.font.build(OUTPUT_FONT)
+        with open(OUTPUT_FONT, "rb") as read_file:
+            return read_file.read()
+
+    # build した Font の GSUB だけを作り直したフォント (ttf) のバイト列を返す (多音字のパターンだけが変わったとき)
+    def rebuild_GSUB(self, font_file_name="font.ttf"):
+        if self.font == None:
+            raise Exception("rebuild_GSUB は build の後に使ってください.")
+        OUTPUT_FONT = os.path.join(self.DIR_SCRATCH, font_file_name)
+        self.font.rebuild_GSUB(OUTPUT_FONT)
+        with open(OUTPUT_FONT, "rb") as read_file:
+            return read_file.read()
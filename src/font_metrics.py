@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import math
+import numpy as np
+import glyph_store
+import glyph_geometry
+
+"""
+合成グリフを含めた全グリフのバウンディングボックスから、フォントの縦方向の寸法 (head, hhea, OS_2, vhea) を計算する
+
+漢字 + ピンインのグリフは、base_line の位置に縮小した py_alphablet を参照する合成グリフなので、
+ピンインのグリフの advanceHeight だけでは実際の輪郭の上端が分からない (アプリで上端が切れることがある)。
+
+バウンディングボックスは以下のように求める
+    輪郭を持つグリフ (decode 済み) : glyph_geometry.ContourSet でまとめて計算する
+    輪郭を持つグリフ (RawGlyf)     : 元のフォントの輪郭なので、元のフォントの head の xMin, yMin, xMax, yMax で代用する (decode しない)
+    参照を持つグリフ              : 参照先のバウンディングボックスを変換して合わせる.
+                                   参照の深さごとに、その深さの全ての参照を glyph_geometry.transform_bboxes でまとめて変換する
+循環参照しているグリフは計算できないので nan になる
+"""
+
+# glyf_table の全グリフのバウンディングボックス (グリフ名のリスト, (グリフの数, 4) の [xMin, yMin, xMax, yMax])
+# raw_bbox : RawGlyf の輪郭のバウンディングボックス (元のフォントの head)
+def get_glyf_bboxes(glyf_table, raw_bbox):
+    glyf_names = list(glyf_table.keys())
+    indexes = { glyf_name: i for (i, glyf_name) in enumerate(glyf_names) }
+    bboxes = np.full((len(glyf_names), 4), np.nan)
+
+    # 自身の輪郭
+    outline_glyf_names = []
+    for (i, glyf_name) in enumerate(glyf_names):
+        glyf_data = glyf_table[glyf_name]
+        if isinstance(glyf_data, glyph_store.RawGlyf):
+            if b"\"contours\"" in glyf_data.raw:
+                bboxes[i] = raw_bbox
+        elif len(glyf_data.get("contours", [])) > 0:
+            outline_glyf_names.append(glyf_name)
+    contour_set = glyph_geometry.ContourSet.from_glyf_table(glyf_table, outline_glyf_names)
+    bboxes[[indexes[glyf_name] for glyf_name in outline_glyf_names]] = contour_set.get_bboxes()
+
+    # 参照 (親, 子, 変換行列)
+    # 参照の数だけ tuple を作ると遅いので、平坦なリストに詰める
+    parents, children, matrices = [], [], []
+    for (i, glyf_name) in enumerate(glyf_names):
+        references = glyf_table[glyf_name].get("references")
+        if not references:
+            continue
+        for r in references:
+            child = indexes.get(r["glyph"])
+            if child != None:
+                parents.append(i)
+                children.append(child)
+                matrices += [r["a"], r["b"], r["c"], r["d"], r["x"], r["y"]]
+    if len(parents) == 0:
+        return (glyf_names, bboxes)
+    parents  = np.array(parents,  dtype=np.int64)
+    children = np.array(children, dtype=np.int64)
+    matrices = np.array(matrices, dtype=np.float64).reshape(-1, 6)
+
+    # 参照先が全て計算済みのグリフから順番に計算する
+    remaining = np.bincount(parents, minlength=len(glyf_names))
+    is_resolved = remaining == 0
+    pending_edges = np.ones(len(parents), dtype=bool)
+    while True:
+        edges = np.nonzero(pending_edges & is_resolved[children])[0]
+        if len(edges) == 0:
+            break
+        pending_edges[edges] = False
+        transformed = glyph_geometry.transform_bboxes(bboxes[children[edges]], matrices[edges])
+        edge_parents = parents[edges]
+        # 参照先が空のグリフ (nan) は無視する
+        np.fmin.at(bboxes[:, 0], edge_parents, transformed[:, 0])
+        np.fmin.at(bboxes[:, 1], edge_parents, transformed[:, 1])
+        np.fmax.at(bboxes[:, 2], edge_parents, transformed[:, 2])
+        np.fmax.at(bboxes[:, 3], edge_parents, transformed[:, 3])
+        np.subtract.at(remaining, edge_parents, 1)
+        is_resolved = remaining == 0
+    if pending_edges.any():
+        unresolved = sorted(set(glyf_names[parent] for parent in parents[pending_edges]))
+        print("  ==> circular references : {} glyf ({} ...)".format(len(unresolved), ", ".join(unresolved[:5])))
+        bboxes[parents[pending_edges]] = np.nan
+    return (glyf_names, bboxes)
+
+# フォント全体のバウンディングボックス
+def get_font_bbox(bboxes):
+    if np.isnan(bboxes).all():
+        return None
+    return (np.nanmin(bboxes[:, 0]), np.nanmin(bboxes[:, 1]), np.nanmax(bboxes[:, 2]), np.nanmax(bboxes[:, 3]))
+
+# head, hhea, OS_2, vhea を実際の輪郭が収まるように広げる (狭くはしない)
+# min_ascender : 輪郭に関わらず確保する hhea.ascender, OS_2.usWinAscent (ピンインのグリフの advanceHeight)
+def update_vertical_metrics(font, font_bbox, min_ascender):
+    (x_min, y_min, x_max, y_max) = (math.floor(font_bbox[0]), math.floor(font_bbox[1]), math.ceil(font_bbox[2]), math.ceil(font_bbox[3]))
+    ascender  = max(math.ceil(min_ascender), y_max)
+    head, hhea, OS_2 = font["head"], font["hhea"], font["OS_2"]
+
+    # すべてのグリフの輪郭を含む範囲
+    head.update( {
+        "xMin": min(head.get("xMin", x_min), x_min),
+        "yMin": min(head.get("yMin", y_min), y_min),
+        "xMax": max(head.get("xMax", x_max), x_max),
+        "yMax": max(head.get("yMax", y_max), y_max),
+    } )
+    # 原点からグリフの上端、下端までの距離
+    hhea.update( {
+        "ascender":  max(hhea.get("ascender", ascender), ascender),
+        "descender": min(hhea.get("descender", y_min), y_min),
+    } )
+    # Windows はこの範囲の外を切り取る
+    OS_2.update( {
+        "usWinAscent":  max(OS_2.get("usWinAscent", ascender), ascender),
+        "usWinDescent": max(OS_2.get("usWinDescent", -y_min), -y_min),
+    } )
+    # 縦書き. advanceHeight の半分ずつを上下に確保する
+    if "vhea" in font:
+        vhea = font["vhea"]
+        advance_height_max = max( (glyf_data.get("advanceHeight", 0) for glyf_data in font["glyf"].values() \
+                                    if not isinstance(glyf_data, glyph_store.RawGlyf)), default=0 )
+        half = math.ceil(advance_height_max / 2)
+        vhea.update( {
+            "ascent":  max(vhea.get("ascent", half), half),
+            "descent": min(vhea.get("descent", -half), -half),
+        } )
+    return (x_min, y_min, x_max, y_max)
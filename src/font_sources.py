@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import os
+import threading
+import collections
+import orjson
+import config
+import path as p
+import glyph_store
+import pinyin_getter as pg
+import reading_rule as rr
+
+"""
+ビルドの入力 (テンプレートの json, マッピングテーブル, 多音字のパターン) の読み込み
+
+Font, PinyinGlyph, GSUBTable は入力をこのオブジェクトから読む
+    FileSources   : 毎回ファイルを読む (main.py)
+    CachedSources : 読み込んだものを (種類, ファイルのパス, 更新時刻, サイズ) ごとに LRU で持つ (build_daemon.py)
+                    ビルドは読み込んだものを書き換えるので、json, glyf table はビルドごとに複製を返す
+                    マッピングテーブル、多音字のルールはビルドで書き換えないので、同じものを返す
+"""
+
+class FileSources():
+
+    def load_json(self, JSON):
+        with open(JSON, "rb") as read_file:
+            return orjson.loads(read_file.read())
+
+    # cache_bytes : glyph_store.load_glyf_table の cache_bytes (--glyph-cache-mb)
+    def load_glyf_table(self, GLYF_JSON, cache_bytes=None):
+        return glyph_store.load_glyf_table(GLYF_JSON, cache_bytes)
+
+    def get_pinyin_mapping_table(self):
+        return pg.get_pinyin_table_with_mapping_table()
+
+    def load_reading_rule(self, pinyin_mapping_table, PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON):
+        reading_rule = rr.ReadingRuleCompiler(pinyin_mapping_table)
+        reading_rule.load_pattern_one(PATTERN_ONE_TXT)
+        reading_rule.load_pattern_two(PATTERN_TWO_JSON)
+        reading_rule.load_exception_pattern(EXCEPTION_PATTERN_JSON)
+        return reading_rule
+
+def read_bytes(FILE):
+    with open(FILE, "rb") as read_file:
+        return read_file.read()
+
+# ファイルが書き換えられたら別のキーになる
+def get_file_stamp(FILE):
+    stat = os.stat(FILE)
+    return (os.path.abspath(FILE), stat.st_mtime_ns, stat.st_size)
+
+class CachedSources(FileSources):
+
+    def __init__(self, max_entries=config.BUILD_DAEMON_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # 同じキーを同時に読み込むことはあるが、結果は同じなので後から入れた方を残す
+    def get_cached(self, key, load):
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+        value = load()
+        with self.lock:
+            self.cache.update( {key: value} )
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return value
+
+    def get_stats(self):
+        with self.lock:
+            return {"entries": len(self.cache), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+    def load_json(self, JSON):
+        raw = self.get_cached( ("json",) + get_file_stamp(JSON), lambda: read_bytes(JSON) )
+        return orjson.loads(raw)
+
+    # DiskRawGlyf (--glyph-cache-mb) はファイルを開いたままになるので、キャッシュしない
+    def load_glyf_table(self, GLYF_JSON, cache_bytes=None):
+        if cache_bytes != None:
+            return glyph_store.load_glyf_table(GLYF_JSON, cache_bytes)
+        glyf_table = self.get_cached( ("glyf",) + get_file_stamp(GLYF_JSON), lambda: glyph_store.load_glyf_table(GLYF_JSON) )
+        return glyph_store.copy_glyf_table(glyf_table)
+
+    def get_pinyin_mapping_table(self):
+        MAPPING_TABLE = os.path.join(p.DIR_OUTPUT, pg.MARGED_MAPPING_TABLE)
+        return self.get_cached( ("mapping_table",) + get_file_stamp(MAPPING_TABLE), pg.get_pinyin_table_with_mapping_table )
+
+    # マッピングテーブルを上書きしたビルドは、マッピングテーブルの内容ごとに別のルールになる
+    def load_reading_rule(self, pinyin_mapping_table, PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON):
+        table_key = hash(orjson.dumps(pinyin_mapping_table, option=orjson.OPT_SORT_KEYS))
+        key = ("reading_rule", table_key) + get_file_stamp(PATTERN_ONE_TXT) + get_file_stamp(PATTERN_TWO_JSON) + get_file_stamp(EXCEPTION_PATTERN_JSON)
+        load = lambda: FileSources.load_reading_rule(self, pinyin_mapping_table, PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON)
+        return self.get_cached(key, load)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import config
+import glyph_dedup
+import glyph_prune
+
+"""
+グリフ数の見積もり
+
+add_glyf でグリフを追加し終わってから MAX_GLYF_NUM (65535) 個を超えていることに気付くと時間の無駄なので、
+json を読み込んだ直後に最終的なグリフ数を計算する。
+
+最終的なグリフ数 = 元のフォントのグリフ数
+                + ピンイン用のアルファベットのグリフ数 (py_alphablet_*, --bake-pinyin のときは焼き込んだ発音のグリフ数 py_pronunciation_*)
+                + 拼音が一つの漢字: 1 (hanzi_glyf.ss00)
+                + 拼音が複数の漢字: 拼音の数 + 1 (hanzi_glyf.ss00, hanzi_glyf.ss01, ...)
+(発音のグリフ (PinyinGlyph.pronunciations) は漢字のグリフに参照をコピーするだけなので、グリフとしては追加されない)
+
+超えている場合は、Unicode のブロックごとの内訳と、削減できるグリフ数を表示して止める。
+auto_reduce が有効なら、超えなくなるまで削減 (REDUCTIONS) を順番に行う。
+"""
+
+# numGlyphs は uint16
+MAX_GLYF_NUM = 65535
+
+# 内訳の表示に使う Unicode のブロック
+UNICODE_BLOCKS = [
+    (0x0000, 0x007F, "Basic Latin"),
+    (0x0080, 0x024F, "Latin-1 Supplement / Latin Extended"),
+    (0x0250, 0x1FFF, "Other Alphabets"),
+    (0x1100, 0x11FF, "Hangul Jamo"),
+    (0x2000, 0x2E7F, "Symbols and Punctuation"),
+    (0x2E80, 0x2FDF, "CJK Radicals"),
+    (0x3000, 0x303F, "CJK Symbols and Punctuation"),
+    (0x3040, 0x30FF, "Hiragana / Katakana"),
+    (0x3130, 0x318F, "Hangul Compatibility Jamo"),
+    (0x3100, 0x33FF, "Other CJK Symbols"),
+    (0x3400, 0x4DBF, "CJK Unified Ideographs Extension A"),
+    (0x4E00, 0x9FFF, "CJK Unified Ideographs"),
+    (0xA960, 0xA97F, "Hangul Jamo Extended-A"),
+    (0xAC00, 0xD7AF, "Hangul Syllables"),
+    (0xD7B0, 0xD7FF, "Hangul Jamo Extended-B"),
+    (0xF900, 0xFAFF, "CJK Compatibility Ideographs"),
+    (0xFF00, 0xFFEF, "Halfwidth and Fullwidth Forms"),
+    (0x20000, 0x2FFFF, "CJK Unified Ideographs Extension B-"),
+]
+
+# 削減の種類. 上から順番に行う
+# hangul : Hangul の unicode からしか参照されていないグリフを削除する
+# prune  : 対象の漢字と config.PRUNE_ALLOWED_UNICODE_RANGES 以外から到達できないグリフを削除する
+REDUCTIONS = ["hangul", "prune"]
+
+HANGUL_RANGES = [
+    (0x1100, 0x11FF),  # Hangul Jamo
+    (0x3130, 0x318F),  # Hangul Compatibility Jamo
+    (0xA960, 0xA97F),  # Hangul Jamo Extended-A
+    (0xAC00, 0xD7AF),  # Hangul Syllables
+    (0xD7B0, 0xD7FF),  # Hangul Jamo Extended-B
+    (0xFFA0, 0xFFDC),  # Halfwidth Hangul
+]
+
+# 範囲が重なっているものは、先に一致したものを優先するので狭い範囲から探す
+SORTED_UNICODE_BLOCKS = sorted(UNICODE_BLOCKS, key=lambda block: block[1] - block[0])
+
+def get_unicode_block_name(int_unicode):
+    for (start, end, name) in SORTED_UNICODE_BLOCKS:
+        if start <= int_unicode <= end:
+            return name
+    return "Other"
+
+def is_hangul(int_unicode):
+    return any(start <= int_unicode <= end for (start, end) in HANGUL_RANGES)
+
+class GlyphBudget():
+
+    # hanzi_index : utility.HanziIndex
+    def __init__(self, marged_font, substance_glyf_table, py_alphablet_names, hanzi_index):
+        self.marged_font = marged_font
+        self.substance_glyf_table = substance_glyf_table
+        self.py_alphablet_names = py_alphablet_names
+        self.hanzi_index = hanzi_index
+
+    # グリフ名 -> そのグリフを参照している unicode のリスト
+    def get_reversed_cmap(self):
+        reversed_cmap = {}
+        for str_oct_unicode, glyf_name in self.marged_font["cmap"].items():
+            if not (glyf_name in reversed_cmap):
+                reversed_cmap.update( {glyf_name: []} )
+            reversed_cmap[glyf_name].append(int(str_oct_unicode))
+        return reversed_cmap
+
+    # add_glyf で追加されるグリフの数を漢字ごとに返す (add_glyf と同じ順番で数える)
+    def get_added_glyf_nums(self):
+        cmap = self.marged_font["cmap"]
+        added_cids = set()
+        added_glyf_nums = []
+        missing_hanzes = []
+        for (hanzi, pinyins) in self.hanzi_index.get_has_single_pinyin_hanzi() + self.hanzi_index.get_has_multiple_pinyin_hanzi():
+            str_oct_unicode = str(ord(hanzi))
+            if not (str_oct_unicode in cmap):
+                missing_hanzes.append(hanzi)
+                continue
+            cid = cmap[str_oct_unicode]
+            if cid in added_cids:
+                continue
+            added_cids.add(cid)
+            added_glyf_nums.append( (hanzi, 1 if len(pinyins) == 1 else len(pinyins) + 1) )
+        return added_glyf_nums, missing_hanzes
+
+    def plan(self):
+        reversed_cmap = self.get_reversed_cmap()
+        breakdown = {}
+        def count(name, num):
+            breakdown.update( {name: breakdown.get(name, 0) + num} )
+
+        for glyf_name in self.substance_glyf_table.keys():
+            if glyf_name in reversed_cmap:
+                count(get_unicode_block_name(min(reversed_cmap[glyf_name])), 1)
+            else:
+                count("(not in cmap)", 1)
+        for glyf_name in self.py_alphablet_names:
+            if not (glyf_name in self.substance_glyf_table):
+                count("(pinyin alphabet / pronunciation)", 1)
+
+        added_glyf_nums, missing_hanzes = self.get_added_glyf_nums()
+        for (hanzi, num) in added_glyf_nums:
+            count("{} (pinyin)".format(get_unicode_block_name(ord(hanzi))), num)
+
+        return {
+            "total": sum(breakdown.values()),
+            "breakdown": breakdown,
+            "missing_hanzes": missing_hanzes
+        }
+
+    # Hangul の unicode からしか参照されていないグリフ
+    def get_hangul_only_glyf_names(self):
+        used_glyf_names = set()
+        for table_name in ["GPOS", "GDEF"]:
+            if table_name in self.marged_font:
+                glyph_dedup.collect_glyf_names(self.marged_font[table_name], self.substance_glyf_table, used_glyf_names)
+        for glyf_data in self.substance_glyf_table.values():
+            for reference in glyf_data.get("references", []):
+                used_glyf_names.add(reference["glyph"])
+
+        hangul_only_glyf_names = []
+        for glyf_name, int_unicodes in self.get_reversed_cmap().items():
+            if glyf_name in used_glyf_names:
+                continue
+            if all(is_hangul(int_unicode) for int_unicode in int_unicodes):
+                hangul_only_glyf_names.append(glyf_name)
+        return hangul_only_glyf_names
+
+    # 削減できるグリフの数の見積もり e.g.: {"hangul": 11172, "prune": 20000} (重複して数えている可能性がある)
+    def get_reductions(self):
+        return {
+            "hangul": len(self.get_hangul_only_glyf_names()),
+            "prune":  glyph_prune.count_unreachable_glyf(self.marged_font, self.substance_glyf_table, config.PRUNE_ALLOWED_UNICODE_RANGES, self.hanzi_index)
+        }
+
+    # 削減を行い、削除するグリフ名を返す
+    def reduce(self, reduction):
+        if reduction == "hangul":
+            return self.drop_hangul()
+        elif reduction == "prune":
+            return glyph_prune.find_unreachable_glyf(self.marged_font, self.substance_glyf_table, config.PRUNE_ALLOWED_UNICODE_RANGES, self.hanzi_index)
+        return []
+
+    # Hangul を cmap, cmap_uvs から外して、削除するグリフ名を返す
+    def drop_hangul(self):
+        hangul_only_glyf_names = self.get_hangul_only_glyf_names()
+        for table_name in ["cmap", "cmap_uvs"]:
+            if table_name in self.marged_font:
+                table = self.marged_font[table_name]
+                for key in [key for key in table.keys() if is_hangul(int(key.split(" ")[0]))]:
+                    del table[key]
+        return hangul_only_glyf_names
+
+def print_plan(plan):
+    print("  ==> estimated glyf num : {} / {}".format(plan["total"], MAX_GLYF_NUM))
+    for name, num in sorted(plan["breakdown"].items(), key=lambda item: -item[1]):
+        print("      {:<48} {:>6}".format(name, num))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import hashlib
+import glyph_store
+
+"""
+輪郭と参照が同一のグリフを一つにまとめる
+
+Big5 の互換漢字 (e.g.: 兀(U+FA0C) と 兀(U+5140)) のように、別のグリフとして定義されているが
+輪郭が同じグリフがある。そのまま add_glyf を行うと同じ漢字にピンインのグリフを 2 つ作ることになるので、
+事前に cmap, cmap_uvs, references の参照先を統一して重複したグリフを削除する。
+
+GPOS, GDEF で使われているグリフは、まとめると位置調整やグリフの分類が変わってしまうので対象外にする。
+(GSUB は GSUBTable で作り直すので考慮しない)
+"""
+
+# 比較に使うハッシュ. グリフの全ての値 (幅、輪郭、参照...) を対象にする
+# (glyph_store.RawGlyf は save_glyf_table で キーをソートして保存しているので、バイト列をそのまま比較できる)
+def get_glyf_hash(glyf_data):
+    return hashlib.blake2b(glyph_store.dumps_glyf(glyf_data), digest_size=16).digest()
+
+# json の中で使われているグリフ名を全て集める
+def collect_glyf_names(obj, glyf_names, used_glyf_names):
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k in glyf_names:
+                used_glyf_names.add(k)
+            collect_glyf_names(v, glyf_names, used_glyf_names)
+    elif isinstance(obj, list):
+        for v in obj:
+            collect_glyf_names(v, glyf_names, used_glyf_names)
+    elif isinstance(obj, str) and obj in glyf_names:
+        used_glyf_names.add(obj)
+
+# 重複しているグリフ名 -> 残すグリフ名 を返す
+def find_duplicate_glyf(marged_font, substance_glyf_table):
+    ignore_glyf_names = set()
+    for table_name in ["GPOS", "GDEF"]:
+        if table_name in marged_font:
+            collect_glyf_names(marged_font[table_name], substance_glyf_table, ignore_glyf_names)
+    # glyph_order の先頭 (.notdef) は残す
+    if len(marged_font["glyph_order"]) > 0:
+        ignore_glyf_names.add(marged_font["glyph_order"][0])
+
+    hashed_glyf_names = {}
+    for glyf_name, glyf_data in substance_glyf_table.items():
+        if glyf_name in ignore_glyf_names:
+            continue
+        glyf_hash = get_glyf_hash(glyf_data)
+        if not (glyf_hash in hashed_glyf_names):
+            hashed_glyf_names.update( {glyf_hash: []} )
+        hashed_glyf_names[glyf_hash].append(glyf_name)
+
+    duplicate_glyf = {}
+    for glyf_names in hashed_glyf_names.values():
+        if len(glyf_names) < 2:
+            continue
+        # 最初のものに統一する
+        glyf_names.sort()
+        for glyf_name in glyf_names[1:]:
+            duplicate_glyf.update( {glyf_name: glyf_names[0]} )
+    return duplicate_glyf
+
+# cmap, cmap_uvs, references の参照先を残すグリフに置き換える
+def replace_reference_of_duplicate_glyf(marged_font, substance_glyf_table, duplicate_glyf):
+    for table_name in ["cmap", "cmap_uvs"]:
+        if table_name in marged_font:
+            table = marged_font[table_name]
+            for k, glyf_name in table.items():
+                if glyf_name in duplicate_glyf:
+                    table[k] = duplicate_glyf[glyf_name]
+    for glyf_data in substance_glyf_table.values():
+        for reference in glyf_data.get("references", []):
+            if reference["glyph"] in duplicate_glyf:
+                reference["glyph"] = duplicate_glyf[reference["glyph"]]
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import numpy as np
+import glyph_store
+
+"""
+グリフの輪郭を平坦な配列で持つ
+
+otfcc の json では輪郭は {"x","y","on"} の dict のリストなので、一点ごとに Python のオブジェクトが 4 つ以上できる。
+バウンディングボックスの計算 (set_about_size)、ピンイン用のアルファベットのグリフの寸法、輪郭の焼き込みなどで
+フォント全体の輪郭を扱うときは、複数のグリフの輪郭を以下の配列にまとめて numpy でまとめて計算する。
+
+    glyf_names    : グリフ名のリスト
+    points        : (点の数, 2) の float64. 全グリフの全輪郭の点を順番に並べた座標
+    on_curves     : (点の数,) の bool. True なら輪郭上の点, False なら制御点 (二次ベジェ)
+    contour_ends  : (輪郭の数,) の int64. 各輪郭の最後の点の次の index
+    glyf_contours : (グリフの数 + 1,) の int64. i 番目のグリフの輪郭は contour_ends[glyf_contours[i]:glyf_contours[i + 1]]
+    glyf_points   : (グリフの数 + 1,) の int64. i 番目のグリフの点は points[glyf_points[i]:glyf_points[i + 1]]
+
+e.g.:
+    contour_set = ContourSet.from_glyf_table(glyf_table)
+    bboxes = contour_set.get_bboxes()  # [[xMin, yMin, xMax, yMax], ...]
+    glyf_table["uni4E00"]["contours"] = contour_set.to_contours("uni4E00")
+"""
+
+# 変換行列 (otfcc の references と同じ並び) : x' = a * x + c * y + dx,  y' = b * x + d * y + dy
+IDENTITY_MATRIX = (1, 0, 0, 1, 0, 0)
+
+def get_matrix_of_reference(reference):
+    return (reference["a"], reference["b"], reference["c"], reference["d"], reference["x"], reference["y"])
+
+# json に書き出す座標. 整数になるものは int にする
+def to_number(value):
+    value = round(float(value), 3)
+    return int(value) if value.is_integer() else value
+
+# bboxes : (n, 4) の [xMin, yMin, xMax, yMax], matrices : (n, 6) の [a, b, c, d, dx, dy]
+# 四隅を変換して、変換後のバウンディングボックスを返す (回転、斜体でも外接する矩形になる)
+def transform_bboxes(bboxes, matrices):
+    bboxes   = np.asarray(bboxes,   dtype=np.float64).reshape(-1, 4)
+    matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 6)
+    xs = bboxes[:, [0, 2, 0, 2]]
+    ys = bboxes[:, [1, 1, 3, 3]]
+    (a, b, c, d, dx, dy) = [matrices[:, [i]] for i in range(6)]
+    transformed_xs = a * xs + c * ys + dx
+    transformed_ys = b * xs + d * ys + dy
+    return np.stack([transformed_xs.min(axis=1), transformed_ys.min(axis=1),
+                     transformed_xs.max(axis=1), transformed_ys.max(axis=1)], axis=1)
+
+class ContourSet():
+
+    def __init__(self, glyf_names, points, on_curves, contour_ends, glyf_contours):
+        self.glyf_names    = glyf_names
+        self.points        = points
+        self.on_curves     = on_curves
+        self.contour_ends  = contour_ends
+        self.glyf_contours = glyf_contours
+        contour_ends_with_zero = np.concatenate([[0], contour_ends]).astype(np.int64)
+        self.glyf_points   = contour_ends_with_zero[glyf_contours]
+        self.indexes       = { glyf_name: i for (i, glyf_name) in enumerate(glyf_names) }
+
+    # glyf_names を指定しなければ glyf_table の全てのグリフ. 輪郭の無いグリフ (参照だけのグリフ) は点が 0 個になる
+    @classmethod
+    def from_glyf_table(cls, glyf_table, glyf_names=None):
+        if glyf_names == None:
+            glyf_names = list(glyf_table.keys())
+        xs, ys, on_curves, contour_ends, glyf_contours = [], [], [], [], [0]
+        for glyf_name in glyf_names:
+            glyf_data = glyf_table[glyf_name]
+            if isinstance(glyf_data, glyph_store.RawGlyf):
+                glyf_data = glyf_data.decode()
+            for contour in glyf_data.get("contours", []):
+                xs += [point["x"] for point in contour]
+                ys += [point["y"] for point in contour]
+                on_curves += [point["on"] for point in contour]
+                contour_ends.append(len(xs))
+            glyf_contours.append(len(contour_ends))
+        points = np.empty((len(xs), 2), dtype=np.float64)
+        points[:, 0] = xs
+        points[:, 1] = ys
+        return cls(list(glyf_names), points, np.array(on_curves, dtype=bool),
+                   np.array(contour_ends, dtype=np.int64), np.array(glyf_contours, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.glyf_names)
+
+    def __contains__(self, glyf_name):
+        return glyf_name in self.indexes
+
+    def get_index(self, glyf_name):
+        return self.indexes[glyf_name]
+
+    # 配列が使っているバイト数
+    def get_nbytes(self):
+        return self.points.nbytes + self.on_curves.nbytes + self.contour_ends.nbytes + self.glyf_contours.nbytes + self.glyf_points.nbytes
+
+    # 点の数が 0 のグリフは nan になる
+    def get_bboxes(self):
+        bboxes = np.full((len(self), 4), np.nan)
+        has_points = self.glyf_points[1:] > self.glyf_points[:-1]
+        if not has_points.any():
+            return bboxes
+        starts = self.glyf_points[:-1][has_points]
+        bboxes[has_points, 0:2] = np.minimum.reduceat(self.points, starts, axis=0)
+        bboxes[has_points, 2:4] = np.maximum.reduceat(self.points, starts, axis=0)
+        return bboxes
+
+    def get_bbox(self, glyf_name):
+        i = self.get_index(glyf_name)
+        points = self.points[self.glyf_points[i]:self.glyf_points[i + 1]]
+        if len(points) == 0:
+            return None
+        return np.concatenate([points.min(axis=0), points.max(axis=0)])
+
+    # 全ての点に同じ変換をかけた ContourSet を返す
+    def transform(self, matrix):
+        (a, b, c, d, dx, dy) = matrix
+        points = np.empty_like(self.points)
+        points[:, 0] = a * self.points[:, 0] + c * self.points[:, 1] + dx
+        points[:, 1] = b * self.points[:, 0] + d * self.points[:, 1] + dy
+        return ContourSet(self.glyf_names, points, self.on_curves, self.contour_ends, self.glyf_contours)
+
+    # 各輪郭の次の点の index (輪郭の最後の点の次は、輪郭の最初の点)
+    @staticmethod
+    def get_next_indexes(points_num, contour_ends):
+        next_indexes = np.arange(1, points_num + 1)
+        contour_starts = np.concatenate([[0], contour_ends[:-1]]).astype(np.int64)
+        next_indexes[contour_ends - 1] = contour_starts
+        return next_indexes
+
+    # グリフごとの符号付きの面積 (TrueType の二次ベジェ曲線を含めた正確な値). 時計回りの輪郭が負になる
+    def get_areas(self):
+        points, on_curves, contour_ends = self.points, self.on_curves, self.contour_ends
+        if len(points) == 0:
+            return np.zeros(len(self))
+
+        # 連続する制御点の間に、暗黙の輪郭上の点 (中点) を入れる
+        next_indexes = self.get_next_indexes(len(points), contour_ends)
+        implied = np.nonzero(~on_curves & ~on_curves[next_indexes])[0]
+        if len(implied) > 0:
+            midpoints = (points[implied] + points[next_indexes[implied]]) / 2
+            points    = np.insert(points, implied + 1, midpoints, axis=0)
+            on_curves = np.insert(on_curves, implied + 1, True)
+            contour_ends = contour_ends + np.searchsorted(implied + 1, contour_ends, side='right')
+            next_indexes = self.get_next_indexes(len(points), contour_ends)
+
+        # 多角形 (制御点も頂点とする) の面積から、制御点ごとの三角形の 1/3 を引くと曲線の面積になる
+        xs, ys = points[:, 0], points[:, 1]
+        next_xs, next_ys = xs[next_indexes], ys[next_indexes]
+        cross = (xs * next_ys - next_xs * ys) / 2
+        prev_indexes = np.empty_like(next_indexes)
+        prev_indexes[next_indexes] = np.arange(len(points))
+        off = ~on_curves
+        triangle = ( (xs[off] - xs[prev_indexes[off]]) * (next_ys[off] - ys[prev_indexes[off]])
+                   - (next_xs[off] - xs[prev_indexes[off]]) * (ys[off] - ys[prev_indexes[off]]) ) / 2
+        cross[off] -= triangle / 3
+
+        # 点 -> グリフの index
+        contour_ends_with_zero = np.concatenate([[0], contour_ends]).astype(np.int64)
+        glyf_points = contour_ends_with_zero[self.glyf_contours]
+        point_glyf_indexes = np.repeat(np.arange(len(self)), np.diff(glyf_points))
+        return np.bincount(point_glyf_indexes, weights=cross, minlength=len(self))
+
+    # 部品のグリフを変換して組み合わせた、新しいグリフの ContourSet を返す (合成グリフの輪郭の焼き込み)
+    # compositions : [(新しいグリフ名, [(部品のグリフ名, 変換行列), ...]), ...]
+    def compose(self, compositions):
+        glyf_names = [glyf_name for (glyf_name, _) in compositions]
+        owners, components, matrices = [], [], []
+        for (i, (_, parts)) in enumerate(compositions):
+            for (component_name, matrix) in parts:
+                owners.append(i)
+                components.append(self.get_index(component_name))
+                matrices.append(matrix)
+        owners     = np.array(owners,     dtype=np.int64)
+        components = np.array(components, dtype=np.int64)
+        matrices   = np.array(matrices,   dtype=np.float64).reshape(-1, 6)
+
+        # 部品ごとの点を集めて、部品ごとの変換行列をかける
+        point_starts = self.glyf_points[components]
+        point_counts = self.glyf_points[components + 1] - point_starts
+        new_point_starts = np.cumsum(point_counts) - point_counts
+        point_components = np.repeat(np.arange(len(components)), point_counts)
+        source_points = point_starts[point_components] + np.arange(point_counts.sum()) - new_point_starts[point_components]
+        (a, b, c, d, dx, dy) = [matrices[point_components, i] for i in range(6)]
+        xs, ys = self.points[source_points, 0], self.points[source_points, 1]
+        points = np.stack([a * xs + c * ys + dx, b * xs + d * ys + dy], axis=1)
+        on_curves = self.on_curves[source_points]
+
+        # 輪郭の終わりの index を、新しい点の並びに合わせる
+        contour_starts = self.glyf_contours[components]
+        contour_counts = self.glyf_contours[components + 1] - contour_starts
+        contour_components = np.repeat(np.arange(len(components)), contour_counts)
+        source_contours = contour_starts[contour_components] + np.arange(contour_counts.sum()) \
+                            - (np.cumsum(contour_counts) - contour_counts)[contour_components]
+        contour_ends = self.contour_ends[source_contours] - point_starts[contour_components] + new_point_starts[contour_components]
+
+        glyf_contours = np.concatenate([[0], np.cumsum(np.bincount(owners, weights=contour_counts, minlength=len(glyf_names)))]).astype(np.int64)
+        return ContourSet(glyf_names, points, on_curves, contour_ends.astype(np.int64), glyf_contours)
+
+    # otfcc の json の輪郭に戻す
+    def to_contours(self, glyf_name):
+        i = self.get_index(glyf_name)
+        contours = []
+        start = self.glyf_points[i]
+        for end in self.contour_ends[self.glyf_contours[i]:self.glyf_contours[i + 1]]:
+            contours.append([ {"x": to_number(x), "y": to_number(y), "on": bool(on)}
+                                for ((x, y), on) in zip(self.points[start:end].tolist(), self.on_curves[start:end].tolist()) ])
+            start = end
+        return contours
+
+    # glyf_table の輪郭を書き換える (参照だけのグリフは変更しない)
+    def update_glyf_table(self, glyf_table):
+        for (i, glyf_name) in enumerate(self.glyf_names):
+            if self.glyf_contours[i + 1] == self.glyf_contours[i]:
+                continue
+            glyf_data = glyf_table[glyf_name]
+            if isinstance(glyf_data, glyph_store.RawGlyf):
+                glyf_data = glyf_data.decode()
+            glyf_data.update( {"contours": self.to_contours(glyf_name)} )
+            glyf_table.update( {glyf_name: glyf_data} )
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+"""
+グリフの並び (glyph_order. otfccbuild はこの順番で gid を振る) を決める
+
+GSUB の置き換えの対象のグリフは coverage (gid の昇順のリスト) に入る。
+coverage は gid が連続していれば範囲 (format 2 : 開始, 終了, index の 6 バイト) で書けるが、
+飛び飛びなら一グリフずつ (format 1 : 2 バイト) 書くことになる。
+グリフ名を辞書順に並べると、漢字の間に異体字 (cid.ss00, cid.ss01 ...) が入るので、漢字の coverage が範囲にならない。
+
+以下のように並べる
+    1. 元のフォントの glyph_order の順番. ピンインを付ける漢字以外のグリフの gid は変わらない
+       ピンインを付ける漢字は、元の漢字の位置の中で、置き換えの lookup (gsub_single, gsub_alternate) の組み合わせごとにまとめる
+       (e.g.: 単一の発音の漢字 (lookup_aalt_0), 多音字 (lookup_aalt_1), 多音字の中で ss02 に置き換わる漢字 (lookup_pattern_ss02) ...)
+    2. 元のフォントに無いグリフ (ピンインのグリフなど)
+    3. 漢字の異体字. 1. の漢字の順番で、同じ漢字の異体字は連続させる
+       (単一の発音の漢字は cid -> cid.ss00 の gid の差が一定になる)
+"""
+
+# 置き換えの lookup ごとの、置き換えの対象のグリフ
+# e.g.: {"lookup_aalt_0": {"uni4E00", ...}, "lookup_aalt_1": {"uni4E0D", ...}, "lookup_pattern_ss02": {...}}
+def get_substitution_coverages(GSUB):
+    coverages = {}
+    for (lookup_name, lookup) in GSUB.get("lookups", {}).items():
+        if not (lookup["type"] in ["gsub_single", "gsub_alternate"]):
+            continue
+        coverage = set()
+        for subtable in lookup["subtables"]:
+            coverage |= set(subtable.keys())
+        coverages.update( {lookup_name: coverage} )
+    return coverages
+
+# GSUB の全ての coverage (サブテーブルごと、chaining はマッチする位置ごと) のグリフ名のリスト
+def get_coverages(GSUB):
+    coverages = []
+    for lookup in GSUB.get("lookups", {}).values():
+        for subtable in lookup["subtables"]:
+            if lookup["type"] == "gsub_chaining":
+                coverages += subtable["match"]
+            elif isinstance(subtable, dict):
+                coverages.append(list(subtable.keys()))
+    return coverages
+
+# coverage を gid の範囲にしたときの数
+# e.g.: {"coverages": 260, "glyphs": 9000, "ranges": 1200}
+def count_coverage_ranges(coverages, glyph_order):
+    gids = { glyf_name: gid for (gid, glyf_name) in enumerate(glyph_order) }
+    glyphs_num = 0
+    ranges_num = 0
+    for coverage in coverages:
+        coverage_gids = sorted(set(gids[glyf_name] for glyf_name in coverage if glyf_name in gids))
+        glyphs_num += len(coverage_gids)
+        ranges_num += sum(1 for (i, gid) in enumerate(coverage_gids) if i == 0 or coverage_gids[i - 1] + 1 != gid)
+    return {"coverages": len(coverages), "glyphs": glyphs_num, "ranges": ranges_num}
+
+def print_coverage_ranges(stats, label="coverage"):
+    print("  ==> {} : {} ranges / {} glyphs in {} coverages".format(label, stats["ranges"], stats["glyphs"], stats["coverages"]))
+
+"""
+glyph_order        : 今のグリフの並び
+variants           : 漢字 -> 異体字のリスト (並べる順番) e.g.: {"uni4E0D": ["uni4E0D.ss00", "uni4E0D.ss01", ...]}
+substitution_coverages : get_substitution_coverages の戻り値
+"""
+def arrange_glyph_order(glyph_order, variants, substitution_coverages):
+    set_variant_names = set(variant_name for variant_names in variants.values() for variant_name in variant_names)
+    base_order = [glyf_name for glyf_name in glyph_order if not (glyf_name in set_variant_names)]
+    set_glyph_order = set(glyph_order)
+
+    # 対象の多い lookup から順に、含まれるかどうかで漢字を分ける
+    lookup_names = sorted(substitution_coverages.keys(), key=lambda lookup_name: (-len(substitution_coverages[lookup_name]), lookup_name))
+    coverages = [substitution_coverages[lookup_name] for lookup_name in lookup_names]
+    slots = [i for (i, glyf_name) in enumerate(base_order) if glyf_name in variants]
+    hanzi_glyf_names = sorted( (base_order[i] for i in slots), \
+                               key=lambda glyf_name: tuple(0 if glyf_name in coverage else 1 for coverage in coverages) )
+    for (i, glyf_name) in zip(slots, hanzi_glyf_names):
+        base_order[i] = glyf_name
+
+    new_glyph_order = base_order
+    for glyf_name in hanzi_glyf_names:
+        new_glyph_order += [variant_name for variant_name in variants[glyf_name] if variant_name in set_glyph_order]
+    # variants の漢字が glyph_order に無いときの異体字 (削除済みの漢字など) は最後に残す
+    set_arranged = set(new_glyph_order)
+    new_glyph_order += [glyf_name for glyf_name in glyph_order if not (glyf_name in set_arranged)]
+    return new_glyph_order
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import glyph_dedup
+
+"""
+どこからも到達できないグリフを削除する
+
+元のフォント (SourceHanSerifCN-Regular.ttf など) には、対象の漢字 (TGSCC/Big5/常用漢字) 以外のグリフも大量に含まれている。
+以下から到達できるグリフだけを残す。
+    - glyph_order の先頭 (.notdef)
+    - cmap, cmap_uvs (対象の漢字と config.PRUNE_ALLOWED_UNICODE_RANGES の範囲の unicode のみ)
+    - GSUB の置き換え先 (置き換え元に到達できるもの)
+    - GPOS, GDEF で使われているグリフ (削除すると otfccbuild で参照エラーになる)
+    - references (合成グリフの部品)
+"""
+
+# GSUB の lookup で、置き換え元のグリフ -> 置き換え先のグリフのリスト
+def get_substitutions(lookup):
+    substitutions = []
+    for subtable in lookup.get("subtables", []):
+        if lookup["type"] == "gsub_single":
+            substitutions += [ ([k], [v]) for k, v in subtable.items() ]
+        elif lookup["type"] in ["gsub_alternate", "gsub_multiple"]:
+            substitutions += [ ([k], v) for k, v in subtable.items() ]
+        elif lookup["type"] == "gsub_ligature":
+            substitutions += [ (s["from"], [s["to"]]) for s in subtable.get("substitutions", []) ]
+    return substitutions
+
+# hanzi_index : utility.HanziIndex (ピンインを付ける漢字は残す)
+def is_kept_unicode(int_unicode, allowed_unicode_ranges, hanzi_index):
+    if chr(int_unicode) in hanzi_index:
+        return True
+    return any(start <= int_unicode <= end for (start, end) in allowed_unicode_ranges)
+
+# cmap, cmap_uvs から対象外の unicode を外す
+def prune_cmap(marged_font, allowed_unicode_ranges, hanzi_index):
+    for table_name in ["cmap", "cmap_uvs"]:
+        if table_name in marged_font:
+            table = marged_font[table_name]
+            # cmap_uvs のキーは "unicode ivs"
+            for key in [key for key in table.keys() if not is_kept_unicode(int(key.split(" ")[0]), allowed_unicode_ranges, hanzi_index)]:
+                del table[key]
+
+# is_keep_layout_glyf : GPOS, GDEF で使われているグリフを全て残すか (web_font のサブセットでは GPOS, GDEF も絞るので残さない)
+def find_reachable_glyf(marged_font, glyf_table, is_keep_layout_glyf=True):
+    reachable = set()
+    if len(marged_font["glyph_order"]) > 0:
+        reachable.add(marged_font["glyph_order"][0])
+    for table_name in ["cmap", "cmap_uvs"]:
+        reachable |= set(marged_font.get(table_name, {}).values())
+    if is_keep_layout_glyf:
+        for table_name in ["GPOS", "GDEF"]:
+            if table_name in marged_font:
+                glyph_dedup.collect_glyf_names(marged_font[table_name], glyf_table, reachable)
+
+    substitutions = []
+    if "GSUB" in marged_font:
+        for lookup in marged_font["GSUB"].get("lookups", {}).values():
+            substitutions += get_substitutions(lookup)
+
+    # 置き換え先、部品を辿って、増えなくなるまで繰り返す
+    stack = list(reachable)
+    while True:
+        while len(stack) > 0:
+            glyf_name = stack.pop()
+            for reference in glyf_table.get(glyf_name, {}).get("references", []):
+                if not (reference["glyph"] in reachable):
+                    reachable.add(reference["glyph"])
+                    stack.append(reference["glyph"])
+        for (from_glyf_names, to_glyf_names) in substitutions:
+            if all(glyf_name in reachable for glyf_name in from_glyf_names):
+                for glyf_name in to_glyf_names:
+                    if not (glyf_name in reachable):
+                        reachable.add(glyf_name)
+                        stack.append(glyf_name)
+        if len(stack) == 0:
+            return reachable
+
+# cmap, cmap_uvs から対象外の unicode を外して、到達できないグリフ名を返す
+def find_unreachable_glyf(marged_font, glyf_table, allowed_unicode_ranges, hanzi_index):
+    prune_cmap(marged_font, allowed_unicode_ranges, hanzi_index)
+    reachable = find_reachable_glyf(marged_font, glyf_table)
+    return [glyf_name for glyf_name in glyf_table.keys() if not (glyf_name in reachable)]
+
+# 削除できるグリフの数の見積もり (marged_font は変更しない)
+def count_unreachable_glyf(marged_font, glyf_table, allowed_unicode_ranges, hanzi_index):
+    view = {k: v for k, v in marged_font.items() if k != "glyf"}
+    for table_name in ["cmap", "cmap_uvs"]:
+        if table_name in view:
+            view[table_name] = dict(view[table_name])
+    return len(find_unreachable_glyf(view, glyf_table, allowed_unicode_ranges, hanzi_index))
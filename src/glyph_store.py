@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import os
+import collections
+import orjson
+
+"""
+グリフの輪郭を decode せずにそのまま書き出す
+
+ビルドでは元のフォントのグリフの輪郭 (contours) を編集しない (add_glyf は cid を cid.ss00 に移して、参照だけのグリフを追加するだけ)。
+それでも template_glyf.json を全て decode すると、全ての点が Python の dict になり、save_as_json で全て encode し直すことになる。
+
+template_glyf.json を一行に一グリフの json で保存しておき (save_glyf_table)、読み込むときは行ごとに
+    references を持つグリフ : decode する (dedup, prune, add_glyf で参照先を辿る、書き換えるため)
+    それ以外のグリフ       : RawGlyf (json のバイト列のまま) にする
+書き出すときは RawGlyf のバイト列をそのまま書き込む (dumps_font)。
+
+e.g.: template_glyf.json
+{
+".notdef":{"advanceHeight":1000,"advanceWidth":1000,"contours":[],"verticalOrigin":880},
+"uni4E00":{"advanceHeight":1000,"advanceWidth":1000,"contours":[[{"on":true,"x":100,"y":100},...]],"verticalOrigin":880},
+...
+}
+一行に一グリフになっていないファイル (otfccdump --pretty, jq の出力など) は、全て decode する。
+
+--glyph-cache-mb (メモリの少ない CI) のときは、RawGlyf のバイト列もメモリに持たずに、
+template_glyf.json の中の位置 (offset, length) だけを持つ DiskRawGlyf にする (load_glyf_table の cache_bytes)。
+バイト列は必要になったときにファイルから読み、最近読んだものだけを cache_bytes まで LRU で持つ。
+書き出すときも一グリフずつファイルに書き込む (save_font) ので、フォント全体のバイト列を作らない。
+"""
+
+class RawGlyf():
+    # 参照を持たないグリフの json のバイト列
+    __slots__ = ["raw"]
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def decode(self):
+        return orjson.loads(self.raw)
+
+    # 参照を持つグリフは decode しているので、RawGlyf の references は常に無い
+    def get(self, key, default=None):
+        if key == "references":
+            return default
+        return self.decode().get(key, default)
+
+    def __getitem__(self, key):
+        return self.decode()[key]
+
+    def __contains__(self, key):
+        return key != "references" and key in self.decode()
+
+class GlyfFile():
+    """
+    一行に一グリフの json ファイルから、グリフの json のバイト列を読む
+    ビルドの間はファイルを書き換えないこと (サイズが変わっていれば Exception)
+    """
+
+    def __init__(self, GLYF_JSON, cache_bytes):
+        self.GLYF_JSON = GLYF_JSON
+        self.file = open(GLYF_JSON, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        # offset -> バイト列 (古い順)
+        self.cache = collections.OrderedDict()
+        self.cache_bytes = cache_bytes
+        self.cached_bytes = 0
+
+    def read(self, offset, length):
+        raw = self.cache.get(offset)
+        if raw != None:
+            self.cache.move_to_end(offset)
+            return raw
+        if os.fstat(self.file.fileno()).st_size != self.size:
+            raise Exception("ビルド中にグリフの json が書き換えられました.\n  file: {}".format(self.GLYF_JSON))
+        self.file.seek(offset)
+        raw = self.file.read(length)
+        if length <= self.cache_bytes:
+            self.cache.update( {offset: raw} )
+            self.cached_bytes += length
+            while self.cached_bytes > self.cache_bytes:
+                (_, old_raw) = self.cache.popitem(last=False)
+                self.cached_bytes -= len(old_raw)
+        return raw
+
+    def close(self):
+        self.cache.clear()
+        self.cached_bytes = 0
+        self.file.close()
+
+class DiskRawGlyf(RawGlyf):
+    # GlyfFile の中の位置だけを持つ RawGlyf. raw を読むたびに GlyfFile (LRU) から読む
+    __slots__ = ["glyf_file", "offset", "length"]
+
+    def __init__(self, glyf_file, offset, length):
+        self.glyf_file = glyf_file
+        self.offset = offset
+        self.length = length
+
+    @property
+    def raw(self):
+        return self.glyf_file.read(self.offset, self.length)
+
+# DiskRawGlyf が読む GlyfFile (閉じるのは読み込んだ側). DiskRawGlyf が無ければ None
+def get_glyf_file(glyf_table):
+    for glyf_data in glyf_table.values():
+        if isinstance(glyf_data, DiskRawGlyf):
+            return glyf_data.glyf_file
+    return None
+
+# glyf table の複製. RawGlyf は書き換えないのでそのまま、decode したグリフは複製する (font_sources.CachedSources)
+def copy_glyf_table(glyf_table):
+    return { glyf_name: glyf_data if isinstance(glyf_data, RawGlyf) else orjson.loads(orjson.dumps(glyf_data)) \
+                for (glyf_name, glyf_data) in glyf_table.items() }
+
+def dumps_glyf(glyf_data):
+    if isinstance(glyf_data, RawGlyf):
+        return glyf_data.raw
+    return orjson.dumps(glyf_data, option=orjson.OPT_SORT_KEYS)
+
+# 一行に一グリフの json
+def dumps_glyf_table(glyf_table):
+    lines = [ orjson.dumps(glyf_name) + b":" + dumps_glyf(glyf_data) for glyf_name, glyf_data in glyf_table.items() ]
+    return b"{\n" + b",\n".join(lines) + b"\n}"
+
+# dumps_glyf_table と同じものを、一グリフずつ f に書き込む
+def write_glyf_table(glyf_table, f):
+    f.write(b"{\n")
+    for (i, (glyf_name, glyf_data)) in enumerate(glyf_table.items()):
+        if i > 0:
+            f.write(b",\n")
+        f.write(orjson.dumps(glyf_name) + b":" + dumps_glyf(glyf_data))
+    f.write(b"\n}")
+
+def save_glyf_table(glyf_table, GLYF_JSON):
+    with open(GLYF_JSON, "wb") as f:
+        write_glyf_table(glyf_table, f)
+
+# "glyf_name":{...} の行を (グリフ名, グリフの json の開始位置) に分ける. グリフの行でなければ None
+def split_glyf_line(line):
+    colon = line.find(b"\":{")
+    if not line.startswith(b"\"") or colon < 0 or not line.endswith(b"}"):
+        return None
+    return (orjson.loads(line[:colon + 1]), colon + 2)
+
+# 一行に一グリフの json であれば RawGlyf を使って読み込む. そうでなければ None
+def loads_glyf_table_by_line(data):
+    lines = data.rstrip().split(b"\n")
+    if len(lines) < 2 or lines[0] != b"{" or lines[-1] != b"}":
+        return None
+    glyf_table = {}
+    for line in lines[1:-1]:
+        if line.endswith(b","):
+            line = line[:-1]
+        glyf_line = split_glyf_line(line)
+        if glyf_line == None:
+            return None
+        (glyf_name, start) = glyf_line
+        raw = line[start:]
+        if b"\"references\"" in raw:
+            glyf_table.update( {glyf_name: orjson.loads(raw)} )
+        else:
+            glyf_table.update( {glyf_name: RawGlyf(raw)} )
+    return glyf_table
+
+# 一行に一グリフの json を一行ずつ読んで、参照を持たないグリフを DiskRawGlyf にする. 一行に一グリフでなければ None
+def load_glyf_table_on_disk(GLYF_JSON, cache_bytes):
+    glyf_file = GlyfFile(GLYF_JSON, cache_bytes)
+    glyf_table = read_glyf_lines(GLYF_JSON, glyf_file)
+    if glyf_table == None:
+        glyf_file.close()
+    return glyf_table
+
+def read_glyf_lines(GLYF_JSON, glyf_file):
+    glyf_table = {}
+    with open(GLYF_JSON, "rb") as read_file:
+        line = read_file.readline()
+        offset = len(line)
+        if line.rstrip() != b"{":
+            return None
+        for line in read_file:
+            line_offset = offset
+            offset += len(line)
+            line = line.rstrip()
+            if line == b"}":
+                return glyf_table
+            if line.endswith(b","):
+                line = line[:-1]
+            glyf_line = split_glyf_line(line)
+            if glyf_line == None:
+                return None
+            (glyf_name, start) = glyf_line
+            raw = line[start:]
+            if b"\"references\"" in raw:
+                glyf_table.update( {glyf_name: orjson.loads(raw)} )
+            else:
+                glyf_table.update( {glyf_name: DiskRawGlyf(glyf_file, line_offset + start, len(raw))} )
+    return None
+
+# cache_bytes : None なら全てメモリに読み込む. 数値なら DiskRawGlyf にして、その byte 数まで LRU で持つ
+def load_glyf_table(GLYF_JSON, cache_bytes=None):
+    if cache_bytes != None:
+        glyf_table = load_glyf_table_on_disk(GLYF_JSON, cache_bytes)
+        if glyf_table != None:
+            return glyf_table
+    with open(GLYF_JSON, "rb") as read_file:
+        data = read_file.read()
+    glyf_table = loads_glyf_table_by_line(data)
+    if glyf_table == None:
+        glyf_table = orjson.loads(data)
+    return glyf_table
+
+# フォントの json. glyf 以外は orjson.OPT_INDENT_2 で、glyf は一行に一グリフで書き出す
+def dumps_font(font):
+    chunks = []
+    for k, v in font.items():
+        if k == "glyf":
+            chunks.append( orjson.dumps(k) + b": " + dumps_glyf_table(v) )
+        else:
+            chunks.append( orjson.dumps(k) + b": " + orjson.dumps(v, option=orjson.OPT_INDENT_2) )
+    return b"{\n" + b",\n".join(chunks) + b"\n}"
+
+# dumps_font と同じものを、glyf は一グリフずつファイルに書き込む
+def save_font(font, FONT_JSON):
+    with open(FONT_JSON, "wb") as f:
+        f.write(b"{\n")
+        for (i, (k, v)) in enumerate(font.items()):
+            if i > 0:
+                f.write(b",\n")
+            f.write(orjson.dumps(k) + b": ")
+            if k == "glyf":
+                write_glyf_table(v, f)
+            else:
+                f.write(orjson.dumps(v, option=orjson.OPT_INDENT_2))
+        f.write(b"\n}")
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 src/ivs_annotator.py < subtitles.srt > subtitles.ivs.srt
+# python3 src/ivs_annotator.py subtitles.srt -o subtitles.ivs.srt --all
+
+"""
+テキストの多音字に、読みを指定する異体字セレクタ (U+E01E0 + ss の番号) を付ける
+
+Word などの OpenType の機能 (rclt) が有効にならないアプリでも、Mengshen のフォントで正しい読みのピンインを表示するため。
+読みはフォントの rclt と同じルール (reading_index.py) で決めるので、rclt が有効なアプリと同じ表示になる。
+    標準の読み (ss01) の多音字 : 何も付けない (異体字セレクタが無いグリフが標準の読み). --all なら U+E01E1 を付ける
+    異読 (ss02~) の多音字     : U+E01E0 + ss の番号 を付ける
+    異体字セレクタが付いている文字 : そのまま (もう一度実行しても結果は変わらない)
+
+テキストはチャンクごとに読み、ルールの前後の文脈 (数文字) だけを次のチャンクに残すので、
+ファイルの大きさによらずメモリは config.IVS_ANNOTATOR_CHUNK_SIZE 程度になる。
+ルールの最初の文字 (と --all なら多音字) の位置だけを正規表現で探して調べる。
+"""
+
+import sys
+import codecs
+import argparse
+import config
+import pinyin_getter as pg
+import reading_index as ri
+
+class IvsAnnotator():
+
+    # all_selectors : 標準の読みの多音字にも異体字セレクタ (ss01) を付けるか
+    def __init__(self, reading_index, all_selectors=False):
+        self.reading_index = reading_index
+        self.all_selectors = all_selectors
+
+    # text[start:end] に異体字セレクタを入れた文字列
+    def insert_selectors(self, text, start, end, substitutions):
+        selectors = { pos: ss_number for (pos, (ss_number, _)) in substitutions.items() if start <= pos < end }
+        if self.all_selectors:
+            for m in self.reading_index.re_multiple_pinyin.finditer(text, start, end):
+                pos = m.start()
+                if not (pos in selectors) and not self.reading_index.has_selector(text, pos):
+                    selectors.update( {pos: pg.SS_NORMAL_PRONUNCIATION} )
+        pieces = []
+        prev = start
+        for pos in sorted(selectors.keys()):
+            pieces.append(text[prev:pos + 1])
+            pieces.append(ri.get_selector(selectors[pos]))
+            prev = pos + 1
+        pieces.append(text[prev:end])
+        return "".join(pieces)
+
+    # chunks : 文字列のイテレータ. 異体字セレクタを入れた文字列を順に返す
+    def annotate(self, chunks):
+        index = self.reading_index
+        text = ""
+        # text の中で、出力済みの位置と次に調べる位置
+        emitted = 0
+        next_pos = 0
+        substitutions = {}
+        for chunk in chunks:
+            text += chunk
+            # 後ろの文脈が揃っている位置まで調べる
+            limit = len(text) - index.max_after
+            if limit <= emitted:
+                continue
+            next_pos = index.scan(text, next_pos, limit, substitutions, next_pos)
+            yield self.insert_selectors(text, emitted, limit, substitutions)
+            # 前の文脈に使う文字だけ残す
+            keep = max(0, limit - index.max_before)
+            text = text[keep:]
+            emitted = limit - keep
+            next_pos -= keep
+            substitutions = { pos - keep: substitution for (pos, substitution) in substitutions.items() if pos >= keep }
+        index.scan(text, next_pos, len(text), substitutions, next_pos)
+        yield self.insert_selectors(text, emitted, len(text), substitutions)
+
+    def annotate_text(self, text):
+        return "".join(self.annotate([text]))
+
+    # UTF-8 のファイル (バイナリモード) を chunk_size バイトずつ読んで書き出す
+    def annotate_file(self, input_file, output_file, chunk_size=config.IVS_ANNOTATOR_CHUNK_SIZE):
+        for annotated in self.annotate(read_chunks(input_file, chunk_size)):
+            output_file.write(annotated.encode("utf-8"))
+
+# チャンクの境界で分かれた UTF-8 の文字は次のチャンクで decode する
+def read_chunks(input_file, chunk_size):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        data = input_file.read(chunk_size)
+        if len(data) == 0:
+            break
+        yield decoder.decode(data)
+    yield decoder.decode(b"", final=True)
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Insert ideographic variation selectors that pick the reading of each duoyinzi")
+    parser.add_argument('input', nargs='?', default=None, help="UTF-8 text (stdin if omitted)")
+    parser.add_argument('-o', '--output', default=None, help="Output file (stdout if omitted)")
+    parser.add_argument('--all', action='store_true', help="Also add U+E01E1 to duoyinzi with the standard reading")
+    parser.add_argument('--chunk-size', type=int, default=config.IVS_ANNOTATOR_CHUNK_SIZE, help="Bytes read at a time")
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(args)
+    annotator = IvsAnnotator(ri.load_reading_index(), options.all)
+    input_file  = open(options.input, "rb") if options.input != None else sys.stdin.buffer
+    output_file = open(options.output, "wb") if options.output != None else sys.stdout.buffer
+    try:
+        annotator.annotate_file(input_file, output_file, options.chunk_size)
+    finally:
+        if options.input != None:
+            input_file.close()
+        if options.output != None:
+            output_file.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
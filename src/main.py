@@ -9,16 +9,55 @@ import shell
 import sys
 import orjson
 import argparse
-import font as ft
+import font_builder as fb
 import path as p
 import config
 import make_template_jsons
 import retrieve_latin_alphabet
+import profiler as pf
+import web_font
+import font_sources
+import phonics_watch
+import build_fingerprint
+import reading_index
 
 def parse_args(args):
     parser = argparse.ArgumentParser(
         description="Select font style (\"han_serif\" or \"handwritten\")")
     parser.add_argument('-t', '--style', choices=['han_serif', 'handwritten'], default='han_serif')
+    # 各工程の時間、メモリを計測して json に出力する
+    parser.add_argument('--profile', nargs='?', const=os.path.join(p.DIR_TEMP, "profile.json"), default=None,
+                        metavar='PROFILE_JSON', help="Record wall time, CPU time, peak RSS and allocations of each build stage")
+    # グリフ数が 65535 を超えるときに、Hangul のグリフや到達できないグリフを削除する
+    parser.add_argument('--auto-reduce', action='store_true',
+                        help="Drop Hangul and unreachable glyphs when the glyph count would exceed 65535")
+    # 対象の漢字と config.PRUNE_ALLOWED_UNICODE_RANGES 以外から到達できないグリフを削除する
+    parser.add_argument('--prune', action='store_true',
+                        help="Drop glyphs that are unreachable from the target hanzi and the allowed unicode ranges")
+    # 発音のグリフに py_alphablet の輪郭を焼き込む
+    parser.add_argument('--bake-pinyin', action='store_true',
+                        help="Bake the scaled pinyin letter outlines into one glyph per pronunciation")
+    # 合成グリフの参照の深さを上限までに展開する (e.g.: 1 なら全ての参照が輪郭だけのグリフを指す)
+    parser.add_argument('--max-reference-depth', type=int, default=None, metavar='DEPTH',
+                        help="Flatten composite glyph references deeper than DEPTH by composing their transforms")
+    # グリフの輪郭をメモリに持たずに template_glyf.json から読み、最近読んだものを MB まで持つ (メモリの少ない CI 用)
+    # RSS の上限ではない (marged_font, 発音のテーブル, 参照を持つグリフはメモリに持つ)
+    parser.add_argument('--glyph-cache-mb', type=int, default=None, metavar='MB',
+                        help="Keep outlines of glyphs without references on disk and cache up to MB of them in memory (not an RSS limit)")
+    parser.add_argument('--profile-trace', default=None, metavar='TRACE_JSON',
+                        help="Also write the stages as a Trace Event Format json (flame graph)")
+    # Web 用に WOFF2 と、unicode-range ごとのサブセット + css を出力する
+    parser.add_argument('--woff2', action='store_true', help="Also write the font as WOFF2")
+    parser.add_argument('--subset', choices=web_font.SUBSET_MODES, default=None,
+                        help="Also write unicode-range subsets as WOFF2 and a CSS @font-face manifest to outputs/web/")
+    parser.add_argument('--frequency-list', default=None, metavar='FREQUENCY_TXT',
+                        help="Characters in descending order of frequency, one per line (for --subset frequency)")
+    # 同じ入力から同じバイト列のフォントを作り、フィンガープリントを出力する (環境変数 SOURCE_DATE_EPOCH があるときも有効)
+    parser.add_argument('--deterministic', action='store_true',
+                        help="Make the build reproducible (timestamps from SOURCE_DATE_EPOCH) and write a build fingerprint next to the font")
+    # ビルドの後に発音のデータ (多音字の単語、マッピングテーブル) の変更を監視して、影響のある工程だけを実行し直す
+    parser.add_argument('--watch', action='store_true',
+                        help="After the build, watch the phonics sources and rebuild only the affected stages when they change")
     return parser.parse_args(args)
 
 def main(args=None):
@@ -37,9 +76,14 @@ def main(args=None):
     else:
         pass
 
+    is_profile = options.profile != None or options.profile_trace != None
+    profiler = pf.BuildProfiler() if is_profile else pf.NullProfiler()
+
     # font (otf/ttf)を編集可能な json にダンプする
-    make_template_jsons.make_template(FONT_FOR_MAIN)
-    retrieve_latin_alphabet.make_alphabet_glyf_json(FONT_FOR_PINYIN)
+    with profiler.stage("dump"):
+        make_template_jsons.make_template(FONT_FOR_MAIN)
+    with profiler.stage("alphabet_extraction"):
+        retrieve_latin_alphabet.make_alphabet_glyf_json(FONT_FOR_PINYIN)
     print("finished dumping font")
 
     # 編集可能ファイルである json の出力名を指定する
@@ -52,10 +96,47 @@ def main(args=None):
     PATTERN_TWO_JSON         = os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_two.json")
     EXCEPTION_PATTERN_JSON   = os.path.join(p.DIR_OUTPUT, "duoyinzi_exceptional_pattern.json")
 
-    font = ft.Font( TAMPLATE_MAIN_JSON, TAMPLATE_GLYF_JSON, ALPHABET_FOR_PINYIN_JSON, \
-                    PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON, FONT_TYPE )
-    # glyf に追加するpinyin の種類は、mapping_table に準拠する
-    font.build(OUTPUT_FONT)
-    
+    # --watch のときは、作り直すたびにテンプレートの json を読み直さないように読み込んだものを使い回す
+    sources = font_sources.CachedSources() if options.watch else None
+    # 作業用のディレクトリはビルドごとに作られる (font_builder.py)
+    with fb.FontBuilder( TAMPLATE_MAIN_JSON, TAMPLATE_GLYF_JSON, ALPHABET_FOR_PINYIN_JSON, \
+                         PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON, FONT_TYPE, profiler, \
+                         auto_reduce=options.auto_reduce, prune=options.prune, bake=options.bake_pinyin, \
+                         max_reference_depth=options.max_reference_depth, glyph_cache_mb=options.glyph_cache_mb, sources=sources, \
+                         deterministic=options.deterministic ) as builder:
+
+        def write_font(font_bytes):
+            # --watch で作り直したフォントは、書き終わってから置き換える
+            phonics_watch.replace_file(OUTPUT_FONT, font_bytes)
+            font = builder.font
+            # 前回のビルドと同じなら、フォントも同じ (アップロードなどを省略できる)
+            if font.fingerprint != None:
+                print("  ==> {}".format(build_fingerprint.save_fingerprint(font.fingerprint, OUTPUT_FONT)))
+            # アプリが同じ読みを表示できるように、rclt のルールを書き出す (pinyin_lookup.py)
+            READING_INDEX_JSON = reading_index.save_reading_index(font.reading_rule.get_sorted_rules(), font.reading_rule.PINYIN_MAPPING_TABLE, \
+                                                                  source_digest=reading_index.get_source_digest(PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON))
+            print("  ==> {}".format(READING_INDEX_JSON))
+            if options.woff2:
+                with profiler.stage("woff2"):
+                    web_font.make_woff2(OUTPUT_FONT)
+            if options.subset != None:
+                with profiler.stage("subset"):
+                    subsets = web_font.plan_subsets(font.marged_font, options.subset, font.reading_rule.get_rules(), options.frequency_list)
+                    web_font.make_subsets(font.marged_font, OUTPUT_FONT, subsets, DIR_SCRATCH=builder.DIR_SCRATCH)
+
+        # glyf に追加するpinyin の種類は、mapping_table に準拠する
+        write_font(builder.build(os.path.basename(OUTPUT_FONT)))
+
+        if is_profile:
+            profiler.print_summary()
+            if options.profile != None:
+                profiler.save_as_json(options.profile)
+            if options.profile_trace != None:
+                profiler.save_as_trace(options.profile_trace)
+
+        # Ctrl-C で止める
+        if options.watch:
+            phonics_watch.watch(builder, write_font, os.path.basename(OUTPUT_FONT))
+
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
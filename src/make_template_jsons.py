@@ -20,38 +20,43 @@ import os
 import sys
 import argparse
 import subprocess
+import orjson
 import shell
 import path as p
+import glyph_store
 
 TAMPLATE_TEMP_JSON = "template_temp.json"
 TAMPLATE_MAIN_JSON = "template_main.json"
 TAMPLATE_GLYF_JSON = "template_glyf.json"
 
-def convert_otf2json(source_font_name):
-    template_temp_json_path = os.path.join(p.DIR_TEMP, TAMPLATE_TEMP_JSON)
+def convert_otf2json(source_font_name, DIR_TEMP=p.DIR_TEMP):
+    template_temp_json_path = os.path.join(DIR_TEMP, TAMPLATE_TEMP_JSON)
     cmd = "otfccdump -o {} --pretty {}".format(template_temp_json_path, source_font_name)
     shell.process(cmd)
 
 # TAMPLATE_MAIN_JSON の glyf table を別ファイルに分離する
-def make_new_glyf_table_json():
-    template_temp_json_path = os.path.join(p.DIR_TEMP, TAMPLATE_TEMP_JSON)
-    template_glyf_json_path = os.path.join(p.DIR_TEMP, TAMPLATE_GLYF_JSON)
-    cmd = "cat {} | jq '.glyf' > {}".format(template_temp_json_path, template_glyf_json_path)
-    shell.process(cmd)
+# Font.load_json で輪郭を decode しなくて済むように、一行に一グリフで保存する (glyph_store.py)
+def make_new_glyf_table_json(DIR_TEMP=p.DIR_TEMP):
+    template_temp_json_path = os.path.join(DIR_TEMP, TAMPLATE_TEMP_JSON)
+    template_glyf_json_path = os.path.join(DIR_TEMP, TAMPLATE_GLYF_JSON)
+    with open(template_temp_json_path, "rb") as read_file:
+        glyf_table = orjson.loads(read_file.read())["glyf"]
+    glyph_store.save_glyf_table(glyf_table, template_glyf_json_path)
 
 # TAMPLATE_MAIN_JSON の glyf のグリフ情報（contours）を削除する。これをビルドすると空のフォントができる。
-def delete_glyf_table_on_main_json():
-    template_temp_json_path = os.path.join(p.DIR_TEMP, TAMPLATE_TEMP_JSON)
-    template_main_json_path = os.path.join(p.DIR_TEMP, TAMPLATE_MAIN_JSON)
+def delete_glyf_table_on_main_json(DIR_TEMP=p.DIR_TEMP):
+    template_temp_json_path = os.path.join(DIR_TEMP, TAMPLATE_TEMP_JSON)
+    template_main_json_path = os.path.join(DIR_TEMP, TAMPLATE_MAIN_JSON)
     cmd = "cat {} | jq '.glyf |= map_values( (select(1).contours |= []) // .)' > {}".format(template_temp_json_path, template_main_json_path)
     shell.process(cmd)
 
-def make_template(source_font_name):
-    convert_otf2json(source_font_name)
-    make_new_glyf_table_json()
-    delete_glyf_table_on_main_json()
+# DIR_TEMP : json の出力先 (build_daemon.py はフォントごとに別のディレクトリにする)
+def make_template(source_font_name, DIR_TEMP=p.DIR_TEMP):
+    convert_otf2json(source_font_name, DIR_TEMP)
+    make_new_glyf_table_json(DIR_TEMP)
+    delete_glyf_table_on_main_json(DIR_TEMP)
 
-    template_temp_json_path = os.path.join(p.DIR_TEMP, TAMPLATE_TEMP_JSON)
+    template_temp_json_path = os.path.join(DIR_TEMP, TAMPLATE_TEMP_JSON)
     os.remove(template_temp_json_path)
 
 def parse_args(args):
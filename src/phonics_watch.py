@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import shell
+import config
+import path as p
+import pinyin_getter as pg
+import font_sources
+
+"""
+発音のデータの変更を監視して、フォントを作り直す (main.py の --watch)
+
+辞書を編集するたびに make_pattern_table.py, make_unicode_pinyin_map_table.py, main.py を順に実行する代わりに、
+監視するファイルが変更されたら、影響のある工程だけを実行し直す
+    overwrite.txt                 -> marged-mapping-table.txt を作り直す (make_unicode_pinyin_map_table.py の marge_mapping_table, overwrite_pinyin)
+    marged-mapping-table.txt      -> 多音字のパターンの検証と作り直し (make_pattern_table.py) -> フォント全体を作り直す
+    phrase_of_pattern_one.txt,
+    phrase_of_pattern_two.txt     -> 多音字のパターンの検証と作り直し (make_pattern_table.py) -> GSUB だけを作り直す (グリフはそのまま)
+フォント全体を作り直すときも、テンプレートの json は読み込んだもの (font_sources.CachedSources) を使う。
+
+ファイルの変更は config.WATCH_POLL_INTERVAL 秒ごとに調べ、続けて保存されたときは
+config.WATCH_DEBOUNCE 秒変更が無くなってからまとめて作り直す。
+検証やビルドに失敗したときは、前のフォントを残したまま次の変更を待つ。
+"""
+
+DIR_DUOYINZI_SCRIPTS = os.path.join(p.DIR_PHONICS, "duo_yin_zi", "scripts")
+DIR_MAPPING_TABLE    = os.path.join(p.DIR_PHONICS, "unicode_mapping_table")
+
+PHRASE_ONE_TXT       = os.path.join(p.DIR_PHONICS, "duo_yin_zi", "phrase_of_pattern_one.txt")
+PHRASE_TWO_TXT       = os.path.join(p.DIR_PHONICS, "duo_yin_zi", "phrase_of_pattern_two.txt")
+OVERWRITE_TXT        = os.path.join(DIR_MAPPING_TABLE, "overwrite.txt")
+MARGED_MAPPING_TABLE = os.path.join(p.DIR_OUTPUT, pg.MARGED_MAPPING_TABLE)
+
+WATCHED_FILES = [PHRASE_ONE_TXT, PHRASE_TWO_TXT, OVERWRITE_TXT, MARGED_MAPPING_TABLE]
+
+# ファイルが無ければ None
+def get_stamps(FILES):
+    return { FILE: font_sources.get_file_stamp(FILE) if os.path.exists(FILE) else None for FILE in FILES }
+
+def get_changed_files(old_stamps, new_stamps):
+    return set( FILE for FILE in new_stamps.keys() if old_stamps.get(FILE) != new_stamps[FILE] )
+
+# 変更があれば、debounce 秒変更が無くなるまで待ってから、変更されたファイルを返す
+def wait_for_changes(stamps, poll_interval=config.WATCH_POLL_INTERVAL, debounce=config.WATCH_DEBOUNCE):
+    while True:
+        time.sleep(poll_interval)
+        new_stamps = get_stamps(stamps.keys())
+        if new_stamps == stamps:
+            continue
+        last_changed = time.perf_counter()
+        while time.perf_counter() - last_changed < debounce:
+            time.sleep(poll_interval)
+            latest_stamps = get_stamps(stamps.keys())
+            if latest_stamps != new_stamps:
+                new_stamps = latest_stamps
+                last_changed = time.perf_counter()
+        return get_changed_files(stamps, new_stamps)
+
+# overwrite.txt を TGSCC, BIG5 のテーブルに上書きして marged-mapping-table.txt を作る
+def make_mapping_table():
+    cmd = "cd {} && {} -c \"import make_unicode_pinyin_map_table as m; m.marge_mapping_table(); m.overwrite_pinyin()\"".format(DIR_MAPPING_TABLE, sys.executable)
+    shell.process(cmd)
+    print("  ==> {} を作り直しました".format(pg.MARGED_MAPPING_TABLE))
+
+# outputs/ の多音字のパターンを作り直す. 検証 (validate_phrase.py) に失敗したときは出力を書き換えずに止まる
+def make_pattern_table():
+    cmd = "cd {} && {} make_pattern_table.py".format(DIR_DUOYINZI_SCRIPTS, sys.executable)
+    stdout = shell.process(cmd)
+    if "Error:" in stdout:
+        raise Exception("多音字の単語の検証に失敗しました.\n{}".format(stdout[stdout.find("Error:"):].rstrip()))
+    print("  ==> 多音字のパターンを作り直しました")
+
+"""
+builder      : build が終わった font_builder.FontBuilder (Font の sources は CachedSources にしておく)
+write_font   : 作り直したフォントのバイト列を受け取って出力する関数 (main.py. 出力は置き換える)
+font_file_name : builder.build に渡すファイル名
+"""
+def watch(builder, write_font, font_file_name="font.ttf"):
+    stamps = get_stamps(WATCHED_FILES)
+    # 作り直しに失敗した Font は途中までしかできていないので、次はフォント全体を作り直す
+    is_font_broken = False
+    print("  ==> watching : {}".format(", ".join(os.path.relpath(FILE, os.path.join(p.DIR, "..")) for FILE in WATCHED_FILES)))
+    while True:
+        try:
+            changed_files = wait_for_changes(stamps)
+        except KeyboardInterrupt:
+            return
+        start = time.perf_counter()
+        print("  ==> changed : {}".format(", ".join(os.path.basename(FILE) for FILE in sorted(changed_files))))
+        try:
+            is_mapping_table_changed = MARGED_MAPPING_TABLE in changed_files
+            if OVERWRITE_TXT in changed_files:
+                make_mapping_table()
+                is_mapping_table_changed = True
+            if is_mapping_table_changed or PHRASE_ONE_TXT in changed_files or PHRASE_TWO_TXT in changed_files:
+                make_pattern_table()
+            # 発音が変わった漢字はグリフも変わるので、フォント全体を作り直す
+            is_full_build = is_mapping_table_changed or is_font_broken
+            is_font_broken = True
+            if is_full_build:
+                font_bytes = builder.build(font_file_name)
+            else:
+                font_bytes = builder.rebuild_GSUB(font_file_name)
+            is_font_broken = False
+            write_font(font_bytes)
+            print("  ==> rebuilt in {:.3f}s ({})".format(time.perf_counter() - start, "font" if is_full_build else "GSUB"))
+        except Exception as e:
+            print("  ==> rebuild failed, keeping the previous font :\n{}".format(e))
+        # 作り直した marged-mapping-table.txt などの変更は次の変更に含めない
+        stamps = get_stamps(WATCHED_FILES)
+
+# 書き終わるまでは別の名前にしておき、出力を置き換える (フォントを読み込んでいるアプリが途中のファイルを読まないように)
+def replace_file(OUTPUT_FILE, data):
+    TEMP_OUTPUT_FILE = OUTPUT_FILE + ".part"
+    with open(TEMP_OUTPUT_FILE, "wb") as f:
+        f.write(data)
+    os.replace(TEMP_OUTPUT_FILE, OUTPUT_FILE)
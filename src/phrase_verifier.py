@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 src/phrase_verifier.py
+# python3 src/phrase_verifier.py --url baidu=http://127.0.0.1:8000/baidu/{} --url zdic=http://127.0.0.1:8000/zdic/{} --requests-per-second 50
+
+"""
+多音字の単語の辞書 (phrase_of_pattern_one.txt, phrase_of_pattern_two.txt) のピンインをまとめて検証する
+
+tools/createduoyinziJson.py は一つの漢字の単語を pypinyin と百度汉语で一つずつ調べるが、
+これは辞書の全ての単語を、次のソースで同時に調べて、辞書のピンインと違うものを一つのレポートにする
+    pypinyin      : 単語のピンイン (スレッドで実行する)
+    baidu, zdic   : 辞書サイトの単語のピンイン (pinyin_scraper.py. 取得したページはキャッシュする)
+    mapping_table : 辞書のピンインが、マッピングテーブルのその漢字の読みにあるか (無いとフォントで表示できない)
+
+ソースごとの結果
+    agree     : 辞書と同じ
+    disagree  : 辞書と違う (違う文字の位置を positions に入れる)
+    not_found : ソースに単語が無い
+    error     : 取得できなかった
+レポート (json) には、どれかのソースが disagree になった単語と、ソースごとの件数、一件あたりの時間を書き出す。
+    latency    : ソースが答えるのにかかった時間 (辞書サイトはリクエストとやり直し、またはキャッシュの読み込み)
+    turnaround : 待ち時間 (ホストごとの同時接続数、リクエストの間隔、スレッドの空き) を含めた時間
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import orjson
+import config
+import path as p
+import pinyin_getter as pg
+import pinyin_scraper as ps
+
+PHRASE_ONE_TXT = os.path.join(p.DIR_PHONICS, "duo_yin_zi", "phrase_of_pattern_one.txt")
+PHRASE_TWO_TXT = os.path.join(p.DIR_PHONICS, "duo_yin_zi", "phrase_of_pattern_two.txt")
+VERIFICATION_REPORT_JSON = os.path.join(p.DIR_TEMP, "phrase_verification.json")
+
+SOURCE_PYPINYIN      = "pypinyin"
+SOURCE_MAPPING_TABLE = "mapping_table"
+SOURCES = [SOURCE_PYPINYIN] + list(ps.SOURCES.keys()) + [SOURCE_MAPPING_TABLE]
+
+AGREE     = "agree"
+DISAGREE  = "disagree"
+NOT_FOUND = "not_found"
+ERROR     = "error"
+VERDICTS = [AGREE, DISAGREE, NOT_FOUND, ERROR]
+
+"""
+e.g.:
+阿托品: ā/tuō/pǐn
+-> [{"phrase": "阿托品", "pinyins": ["ā", "tuō", "pǐn"], "file": "phrase_of_pattern_one.txt", "line": 1}, ...]
+"""
+def load_phrases(PHRASE_FILES):
+    phrases = []
+    for PHRASE_FILE in PHRASE_FILES:
+        with open(PHRASE_FILE, mode='r', encoding='utf-8') as read_file:
+            for (line_number, line) in enumerate(read_file, 1):
+                line = line.rstrip('\n')
+                if line == "":
+                    continue
+                (phrase, _, str_pinyins) = line.partition(': ')
+                pinyins = str_pinyins.split('/')
+                if len(phrase) != len(pinyins):
+                    raise Exception("単語とピンインの数が違います.\n  {}:{}: {}".format(os.path.basename(PHRASE_FILE), line_number, line))
+                phrases.append( {"phrase": phrase, "pinyins": pinyins, "file": os.path.basename(PHRASE_FILE), "line": line_number} )
+    return phrases
+
+# 辞書と違う文字の位置 (文字数が違うときは全ての位置)
+def get_different_positions(expected_pinyins, pinyins):
+    if len(expected_pinyins) != len(pinyins):
+        return list(range(len(expected_pinyins)))
+    return [i for (i, (expected_pinyin, pinyin)) in enumerate(zip(expected_pinyins, pinyins)) if expected_pinyin.lower() != pinyin.strip().lower()]
+
+# pinyins : ソースのピンイン (単語が無ければ None, 取得できなければ例外)
+def get_result(expected_pinyins, pinyins, latency, turnaround):
+    times = {"latency": latency, "turnaround": turnaround}
+    if isinstance(pinyins, Exception):
+        return dict({"verdict": ERROR, "message": str(pinyins)}, **times)
+    if pinyins == None:
+        return dict({"verdict": NOT_FOUND}, **times)
+    positions = get_different_positions(expected_pinyins, pinyins)
+    if len(positions) > 0:
+        return dict({"verdict": DISAGREE, "pinyins": pinyins, "positions": positions}, **times)
+    return dict({"verdict": AGREE}, **times)
+
+# (戻り値, 時間)
+def call_with_latency(function, *args):
+    start = time.perf_counter()
+    return (function(*args), time.perf_counter() - start)
+
+# マッピングテーブルのその漢字の読みに、辞書のピンインが無い文字の位置
+def get_result_of_mapping_table(entry, pinyin_mapping_table):
+    start = time.perf_counter()
+    positions = [i for (i, (hanzi, pinyin)) in enumerate(zip(entry["phrase"], entry["pinyins"])) \
+                 if not (pinyin in pinyin_mapping_table.get(hanzi, []))]
+    latency = time.perf_counter() - start
+    times = {"latency": latency, "turnaround": latency}
+    if len(positions) > 0:
+        candidates = [pinyin_mapping_table.get(entry["phrase"][i]) for i in positions]
+        return dict({"verdict": DISAGREE, "positions": positions, "candidates": candidates}, **times)
+    return dict({"verdict": AGREE}, **times)
+
+class PhraseVerifier():
+
+    def __init__(self, scraper, pinyin_mapping_table, sources=SOURCES):
+        self.scraper = scraper
+        self.PINYIN_MAPPING_TABLE = pinyin_mapping_table
+        self.sources = sources
+
+    async def get_result_of_pypinyin(self, entry):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        (pinyins, latency) = await loop.run_in_executor(None, call_with_latency, pg.get_pinyin_with_pypinyin, entry["phrase"])
+        return get_result(entry["pinyins"], pinyins, latency, time.perf_counter() - start)
+
+    async def get_result_of_site(self, source, entry):
+        start = time.perf_counter()
+        try:
+            (pinyins, latency) = await self.scraper.get_pinyins_with_latency(source, entry["phrase"])
+        except Exception as e:
+            # やり直した時間は分からないので、latency の統計に含めない
+            (pinyins, latency) = (e, None)
+        return get_result(entry["pinyins"], pinyins, latency, time.perf_counter() - start)
+
+    async def get_result_of_source(self, source, entry):
+        if source == SOURCE_PYPINYIN:
+            return await self.get_result_of_pypinyin(entry)
+        if source == SOURCE_MAPPING_TABLE:
+            return get_result_of_mapping_table(entry, self.PINYIN_MAPPING_TABLE)
+        return await self.get_result_of_site(source, entry)
+
+    async def verify_phrase(self, entry):
+        results = await asyncio.gather(*[self.get_result_of_source(source, entry) for source in self.sources])
+        return dict(zip(self.sources, results))
+
+    # 単語ごとのソースの結果 [{ソース: 結果}, ...]
+    async def verify(self, phrases):
+        return await asyncio.gather(*[self.verify_phrase(entry) for entry in phrases])
+
+# latency が None (取得できなかった) のものは除く
+def get_latency_stats(latencies):
+    latencies = [latency for latency in latencies if latency != None]
+    if len(latencies) == 0:
+        return None
+    latencies = sorted(latencies)
+    get_percentile = lambda percent: latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))]
+    return {
+        "count": len(latencies),
+        "total": sum(latencies),
+        "mean": sum(latencies) / len(latencies),
+        "p50": get_percentile(50),
+        "p95": get_percentile(95),
+        "max": latencies[-1]
+    }
+
+def make_report(phrases, results_list, sources, elapsed_time, scraper_stats):
+    report_phrases = []
+    for (entry, results) in zip(phrases, results_list):
+        disagreed_sources = [source for source in sources if results[source]["verdict"] == DISAGREE]
+        if len(disagreed_sources) == 0:
+            continue
+        report_phrases.append(
+            {
+                "phrase": entry["phrase"],
+                "pinyins": entry["pinyins"],
+                "file": entry["file"],
+                "line": entry["line"],
+                "disagreed_sources": disagreed_sources,
+                "results": { source: { key: value for (key, value) in result.items() if not (key in ["latency", "turnaround"]) } \
+                             for (source, result) in results.items() }
+            }
+        )
+    summary = {
+        "phrases": len(phrases),
+        "disagreed_phrases": len(report_phrases),
+        "elapsed_time": elapsed_time,
+        "scraper": scraper_stats,
+        "sources": {}
+    }
+    for source in sources:
+        verdicts = [results[source]["verdict"] for results in results_list]
+        summary["sources"][source] = {verdict: verdicts.count(verdict) for verdict in VERDICTS}
+        summary["sources"][source]["latency"] = get_latency_stats([results[source]["latency"] for results in results_list])
+        summary["sources"][source]["turnaround"] = get_latency_stats([results[source]["turnaround"] for results in results_list])
+    return {"summary": summary, "phrases": report_phrases}
+
+# 時間が一つも無い (単語が無い、全て取得できなかった) ソースの表示
+NO_LATENCY_STATS = {"mean": float("nan"), "p95": float("nan"), "max": float("nan")}
+
+def print_summary(report):
+    summary = report["summary"]
+    print("  ==> {} phrases, {} with disagreements, {:.1f}s".format(summary["phrases"], summary["disagreed_phrases"], summary["elapsed_time"]))
+    print("  {:<14}{:>8}{:>10}{:>11}{:>7}{:>11}{:>11}{:>11}{:>15}".format("source", "agree", "disagree", "not_found", "error", \
+          "mean[ms]", "p95[ms]", "max[ms]", "turnaround[s]"))
+    for (source, stats) in summary["sources"].items():
+        latency = stats["latency"] if stats["latency"] != None else NO_LATENCY_STATS
+        turnaround = stats["turnaround"] if stats["turnaround"] != None else NO_LATENCY_STATS
+        print("  {:<14}{:>8}{:>10}{:>11}{:>7}{:>11.2f}{:>11.2f}{:>11.2f}{:>15.2f}".format(source, stats[AGREE], stats[DISAGREE], stats[NOT_FOUND], stats[ERROR], \
+              latency["mean"] * 1000, latency["p95"] * 1000, latency["max"] * 1000, turnaround["max"]))
+    print("  ==> requests: {requests}, cache hits: {cache_hits}, retries: {retries}, failures: {failures}".format(**summary["scraper"]))
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Verify the pinyin of the duoyinzi phrases against pypinyin, the dictionary sites and the mapping table")
+    parser.add_argument('phrase_files', nargs='*', default=[PHRASE_ONE_TXT, PHRASE_TWO_TXT], help="Phrase files (phrase: pinyin/pinyin)")
+    parser.add_argument('-o', '--output', default=VERIFICATION_REPORT_JSON, help="Report json")
+    parser.add_argument('--source', action='append', choices=SOURCES, default=None, help="Sources to check (all if omitted)")
+    parser.add_argument('--url', action='append', default=[], metavar='SOURCE=URL', help="Replace the URL of a site, e.g. baidu=http://127.0.0.1:8000/baidu/{}")
+    parser.add_argument('--refresh', action='store_true', help="Ignore the cached pages and fetch them again")
+    parser.add_argument('--no-cache', action='store_true', help="Neither read nor write the page cache")
+    parser.add_argument('--concurrency', type=int, default=config.SCRAPE_CONCURRENCY_PER_HOST, help="Concurrent requests per host")
+    parser.add_argument('--requests-per-second', type=float, default=config.SCRAPE_REQUESTS_PER_SECOND, help="Requests per second per host")
+    return parser.parse_args(args)
+
+async def verify(options):
+    sources = options.source if options.source != None else SOURCES
+    phrases = load_phrases(options.phrase_files)
+    DIR_CACHE = None if options.no_cache else ps.DIR_SCRAPE_CACHE
+    start = time.perf_counter()
+    async with ps.PinyinScraper(ps.replace_urls(options.url), DIR_CACHE, options.refresh, \
+                                concurrency=options.concurrency, requests_per_second=options.requests_per_second) as scraper:
+        verifier = PhraseVerifier(scraper, pg.get_pinyin_table_with_mapping_table(), sources)
+        results_list = await verifier.verify(phrases)
+    return make_report(phrases, results_list, sources, time.perf_counter() - start, scraper.stats)
+
+def main(args=None):
+    options = parse_args(args)
+    report = asyncio.run(verify(options))
+    with open(options.output, "wb") as write_file:
+        write_file.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+    print_summary(report)
+    print("  ==> {}".format(options.output))
+
+if __name__ == "__main__":
+    sys.exit(main())
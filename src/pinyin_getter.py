@@ -3,13 +3,12 @@
 
 import os
 from pypinyin import pinyin, lazy_pinyin, Style
-import requests
-from bs4 import BeautifulSoup
 import path as p
+import pinyin_scraper as ps
 
 
-BAIDU_URL  = "https://hanyu.baidu.com/s?wd={}&from=zici"
-ZDIC_URL   = "https://www.zdic.net/hans/{}"
+BAIDU_URL  = ps.BAIDU_URL
+ZDIC_URL   = ps.ZDIC_URL
 
 MARGED_MAPPING_TABLE = "marged-mapping-table.txt"
 
@@ -21,34 +20,12 @@ SS_NORMAL_PRONUNCIATION      = 1
 SS_VARIATIONAL_PRONUNCIATION = 2
 
 
+# ページにピンインが無ければ None. 取得できなかったときは例外 (pinyin_scraper.py)
 def get_pinyin_with_baidu(hanzi):
-    try:
-        html = requests.get(BAIDU_URL.format(hanzi))
-        soup = BeautifulSoup(html.content, "html.parser")
-        elem = soup.find("div", id="pinyin")
-        raw_text = elem.find("b")
-        # [ chóng xiāo ] こんな感じの文字列
-        text = raw_text.get_text()
-        text = text.replace("[ ", "")
-        text = text.replace(" ]", "")
-        pinyins = text.split(" ")
-        # print(pinyins)
-        return pinyins
-    except:
-        # print("not found pinyin")
-        return None
+    return ps.get_pinyins("baidu", hanzi)
 
 def get_pinyin_with_zdic(hanzi):
-    try:
-        html = requests.get(ZDIC_URL.format(hanzi))
-        soup = BeautifulSoup(html.content, "html.parser")
-        elem = soup.find_all(class_="dicpy")
-        text = elem[0].get_text()
-        pinyins = text.split(" ")
-        return pinyins
-    except:
-        # print("not found pinyin")
-        return None
+    return ps.get_pinyins("zdic", hanzi)
 
 def get_pinyin_with_pypinyin(hanzi):
     return [p[0] for p in pinyin(hanzi)]
@@ -2,10 +2,11 @@
 #!/usr/bin/env python
 
 import orjson
-import pinyin_getter as pg
 import shell
 import utility
 import config
+import glyph_geometry
+import font_sources
 
 # advanceHeight に対する advanceHeight の割合 (適当に決めてるから調整)
 VERTICAL_ORIGIN_PER_HEIGHT = 0.88
@@ -13,20 +14,29 @@ VERTICAL_ORIGIN_PER_HEIGHT = 0.88
 HEIGHT_RATE_OF_MONOSPACE = 1.4
 # otfccbuild の仕様なのか opentype の仕様なのか分からないが a と d が同じ値だと、グリフが消失する。 
 # 少しでもサイズが違えば反映されるので、反映のためのマジックナンバー
+# (bake のときは縮小した輪郭を焼き込むので使わない)
 DELTA_4_REFLECTION = 0.001
+# 輪郭を焼き込んだ発音のグリフ名 e.g.: py_pronunciation_yi1
+BAKED_PRONUNCIATION = "py_pronunciation_{}"
 
 class PinyinGlyph():
     
 
     # マージ先のフォントのメインjson（フォントサイズを取得するため）, ピンイン表示に使うためのglyfのjson, ピンインのグリフを追加したjson(出力ファイル)
-    def __init__(self, TAMPLATE_MAIN_JSON, ALPHABET_FOR_PINYIN_JSON, FONT_TYPE):
-        self.PINYIN_MAPPING_TABLE = pg.get_pinyin_table_with_mapping_table()
-
-        with open(TAMPLATE_MAIN_JSON, "rb") as read_file:
-            self.font_main = orjson.loads(read_file.read())
-            self.cmap_table = self.font_main["cmap"]
-        with open(ALPHABET_FOR_PINYIN_JSON, "rb") as read_file:
-            self.PY_ALPHABET_GLYF = orjson.loads(read_file.read())
+    # bake : 発音ごとに py_alphablet の輪郭を焼き込んだグリフを作る (bake_pronunciations)
+    # pinyin_mapping_table : None ならマッピングテーブルを読み込む
+    # sources : 入力の読み込み (font_sources.py). None ならファイルを読む
+    def __init__(self, TAMPLATE_MAIN_JSON, ALPHABET_FOR_PINYIN_JSON, FONT_TYPE, bake=False, pinyin_mapping_table=None, sources=None):
+        self.bake = bake
+        if sources == None:
+            sources = font_sources.FileSources()
+        if pinyin_mapping_table == None:
+            pinyin_mapping_table = sources.get_pinyin_mapping_table()
+        self.PINYIN_MAPPING_TABLE = pinyin_mapping_table
+
+        self.font_main = sources.load_json(TAMPLATE_MAIN_JSON)
+        self.cmap_table = self.font_main["cmap"]
+        self.PY_ALPHABET_GLYF = sources.load_json(ALPHABET_FOR_PINYIN_JSON)
 
         if FONT_TYPE == config.HAN_SERIF_TYPE:
             # 想定する漢字のサイズに対するピンイン表示部のサイズ
@@ -39,6 +49,8 @@ class PinyinGlyph():
         
         # 発音の参照をもつ e.g.: {"làng":ref}
         self.pronunciations = {}
+        # 輪郭を焼き込んだ発音のグリフ e.g.: {"py_pronunciation_lang4": glyf}
+        self.baked_pronunciations = {}
 
     
     
@@ -163,7 +175,7 @@ class PinyinGlyph():
             if is_avoid_overlapping_mode and len(pronunciation) >= 5:
                 x_scale -= x_scale_reduction_for_avoid_overlapping
 
-            y_scale = round(pinyin_scale + DELTA_4_REFLECTION, 3)
+            y_scale = round(pinyin_scale if self.bake else pinyin_scale + DELTA_4_REFLECTION, 3)
             references.append( 
                 {"glyph":"py_alphablet_{}".format(simpled_alphabet),
                                 "x": x_position, "y": y_position,
@@ -185,6 +197,33 @@ class PinyinGlyph():
         self.pronunciations.update( pronunciation )
 
 
+    """
+    発音ごとに、縮小した py_alphablet の輪郭を一つのグリフに焼き込む
+    漢字のグリフは、参照が 拡大縮小した py_alphablet * 文字数 + ss00 から、焼き込んだ発音のグリフ + ss00 (どちらも無変換) になるので、
+    描画のたびに部品を変換しなくて済む。
+    全ての発音の全ての文字を glyph_geometry.ContourSet.compose でまとめて変換する
+    """
+    def bake_pronunciations(self):
+        contour_set = glyph_geometry.ContourSet.from_glyf_table(self.PY_ALPHABET_GLYF)
+        compositions = []
+        for simpled_pronunciation, glyf_data in self.pronunciations.items():
+            parts = [ (reference["glyph"], glyph_geometry.get_matrix_of_reference(reference)) for reference in glyf_data["references"] ]
+            compositions.append( (BAKED_PRONUNCIATION.format(simpled_pronunciation), parts) )
+        baked_contour_set = contour_set.compose(compositions)
+
+        for simpled_pronunciation, glyf_data in self.pronunciations.items():
+            glyf_name = BAKED_PRONUNCIATION.format(simpled_pronunciation)
+            self.baked_pronunciations.update( {
+                glyf_name: {
+                    "advanceWidth"  : glyf_data["advanceWidth"],
+                    "advanceHeight" : glyf_data["advanceHeight"],
+                    "verticalOrigin": glyf_data["verticalOrigin"],
+                    "contours"      : baked_contour_set.to_contours(glyf_name)
+                }
+            } )
+            # 漢字のグリフには焼き込んだ発音のグリフを参照させる
+            glyf_data.update( {"references": [ {"glyph": glyf_name, "x": 0, "y": 0, "a": 1, "b": 0, "c": 0, "d": 1} ]} )
+
     # 確認のために使う。生成時には利用しない。
     def save_json(self, OUTPUT_JSON):
         tmp_pinyin_glyf = self.PY_ALPHABET_GLYF
@@ -202,4 +241,7 @@ class PinyinGlyph():
 
     def get_pronunciation_glyf_table(self):
         return self.pronunciations
+
+    def get_baked_pronunciation_glyf_table(self):
+        return self.baked_pronunciations
     
\ No newline at end of file
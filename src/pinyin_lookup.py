@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 src/pinyin_lookup.py 银行行长 一行行
+# python3 src/pinyin_lookup.py --input phrases.txt --workers 4 > readings.jsonl
+# python3 src/pinyin_lookup.py --compile
+
+"""
+文字列の各文字のピンインを、フォントの rclt と同じ規則で返す (アプリの UI とフォントの表示を一致させるため)
+
+ルールは main.py がフォントと一緒に書き出すコンパイル済みのもの (reading_index.READING_INDEX_JSON) を使う。
+多音字の辞書データやマッピングテーブルが変わっていれば、それから作り直す (pypinyin は使わない)。
+    各文字 : (ピンイン, ss の番号, 適用したルール)
+        マッピングテーブルに無い文字   : (None, None, None)
+        標準の読み                   : (ピンイン, 1, None)
+        rclt のルールで変わる読み      : (ピンイン, 2~, ルール) (ルールの ignore で標準の読みのままのときは ss は 1)
+        異体字セレクタが付いている文字 : その ss の読み (U+E01E0 は ss00 でピンインの無いグリフなので None, 0, None)
+        異体字セレクタ               : (None, None, None)
+ss の番号 N のピンインは、マッピングテーブルの pinyins[N - 1]。
+
+文字ごとの処理は辞書を引くだけなので、文字数に比例する。
+文字数の多いバッチは、workers > 1 ならプロセスに分けて処理する (ルールは各プロセスに一度だけ渡す)。
+
+e.g.:
+    with load_pinyin_lookup(workers=4) as lookup:
+        lookup.lookup_batch(["银行", "行长"])
+        # -> [[("yín", 1, None), ("háng", 2, {"match": [["发", "同", "外", "银"], ["行"]], ...})], [("xíng", 1, None), ("zhǎng", 1, None)]]
+"""
+
+import os
+import re
+import sys
+import argparse
+import concurrent.futures
+import orjson
+import config
+import pinyin_getter as pg
+import reading_index as ri
+
+NO_READING = (None, None, None)
+
+RE_VARIATION_SELECTOR = re.compile("[{}]".format("".join("{}-{}".format(chr(start), chr(end)) for (start, end) in ri.VARIATION_SELECTOR_RANGES)))
+
+# ss の番号のピンイン. ss00 (ピンインの無いグリフ) や読みが無い番号は None
+def get_pinyin_of_ss(pinyins, ss_number):
+    if not (pg.SS_NORMAL_PRONUNCIATION <= ss_number <= len(pinyins)):
+        return None
+    return pinyins[ss_number - pg.SS_NORMAL_PRONUNCIATION]
+
+class PinyinLookup():
+
+    # workers : lookup_batch で使うプロセスの数 (1 なら同じプロセスで処理する)
+    def __init__(self, reading_index, workers=1):
+        self.reading_index = reading_index
+        self.PINYIN_MAPPING_TABLE = reading_index.PINYIN_MAPPING_TABLE
+        # 漢字 -> 標準の読み
+        self.normal_readings = { hanzi: (pinyins[0], pg.SS_NORMAL_PRONUNCIATION, None) for (hanzi, pinyins) in self.PINYIN_MAPPING_TABLE.items() }
+        self.workers = workers
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.executor != None:
+            self.executor.shutdown()
+            self.executor = None
+
+    """
+    ルールの代わりにルールの番号を入れた読みと、ルールを適用した位置のリスト
+    プロセスの間で受け渡すので、ルールは番号にしておく (同じルールを何度も送らないように)
+    """
+    def get_readings_with_rule_ids(self, text):
+        table = self.PINYIN_MAPPING_TABLE
+        substitutions = {}
+        self.reading_index.scan(text, 0, len(text), substitutions)
+        # 標準の読みにしてから、ルールと異体字セレクタで変わる文字だけ書き換える
+        readings = [self.normal_readings.get(character, NO_READING) for character in text]
+        for (pos, (ss_number, rule_id)) in substitutions.items():
+            readings[pos] = (get_pinyin_of_ss(table[text[pos]], ss_number), ss_number, rule_id)
+        for m in RE_VARIATION_SELECTOR.finditer(text):
+            pos = m.start() - 1
+            if pos < 0 or not (text[pos] in table):
+                continue
+            pinyins = table[text[pos]]
+            ss_number = ord(m.group()) - ri.IVS
+            # フォントに無い異体字セレクタは無視されて、標準の読みのグリフになる
+            if not (0 <= ss_number <= len(pinyins)):
+                ss_number = pg.SS_NORMAL_PRONUNCIATION
+            readings[pos] = (get_pinyin_of_ss(pinyins, ss_number), ss_number, None)
+        return (readings, sorted(substitutions.keys()))
+
+    # ルールの番号をルールに置き換える
+    def resolve_rules(self, readings, rule_positions):
+        rules = self.reading_index.rules
+        for pos in rule_positions:
+            (pinyin, ss_number, rule_id) = readings[pos]
+            readings[pos] = (pinyin, ss_number, rules[rule_id])
+        return readings
+
+    def lookup(self, text):
+        return self.resolve_rules(*self.get_readings_with_rule_ids(text))
+
+    # texts の順に、文字ごとの読みのリストを返す
+    def lookup_batch(self, texts):
+        texts = list(texts)
+        if self.workers <= 1 or sum(len(text) for text in texts) < config.PINYIN_LOOKUP_PARALLEL_CHARS:
+            return [self.lookup(text) for text in texts]
+        if self.executor == None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, \
+                                                                   initargs=(self.reading_index.rules, self.PINYIN_MAPPING_TABLE))
+        batches = [texts[i:i + config.PINYIN_LOOKUP_BATCH_SIZE] for i in range(0, len(texts), config.PINYIN_LOOKUP_BATCH_SIZE)]
+        readings_list = []
+        for results in self.executor.map(get_readings_in_worker, batches):
+            readings_list.extend( self.resolve_rules(readings, rule_positions) for (readings, rule_positions) in results )
+        return readings_list
+
+# ワーカーのプロセスの PinyinLookup (init_worker で作る)
+worker_lookup = None
+
+def init_worker(rules, pinyin_mapping_table):
+    global worker_lookup
+    worker_lookup = PinyinLookup(ri.ReadingIndex(rules, pinyin_mapping_table))
+
+def get_readings_in_worker(texts):
+    return [worker_lookup.get_readings_with_rule_ids(text) for text in texts]
+
+# コンパイル済みのルールが今の辞書データから作ったものなら使い、違えば辞書データから作る
+# 辞書データが無いとき (アプリに READING_INDEX_JSON だけを組み込んだとき) は、コンパイル済みのルールをそのまま使う
+def load_pinyin_lookup(READING_INDEX_JSON=ri.READING_INDEX_JSON, workers=1):
+    reading_index = None
+    if os.path.exists(READING_INDEX_JSON):
+        reading_index = ri.load_precompiled_reading_index(READING_INDEX_JSON, ri.get_source_digest())
+    if reading_index == None:
+        reading_index = ri.load_reading_index()
+    return PinyinLookup(reading_index, workers)
+
+def compile_reading_index(READING_INDEX_JSON=ri.READING_INDEX_JSON):
+    reading_index = ri.load_reading_index()
+    return ri.save_reading_index(reading_index.rules, reading_index.PINYIN_MAPPING_TABLE, READING_INDEX_JSON, ri.get_source_digest())
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Look up the pinyin of each character the way the font's rclt shows it")
+    parser.add_argument('texts', nargs='*', help="Texts to look up")
+    parser.add_argument('--input', default=None, help="UTF-8 file with one text per line")
+    parser.add_argument('--index', default=ri.READING_INDEX_JSON, help="Precompiled reading index")
+    parser.add_argument('--workers', type=int, default=1, help="Processes for large batches")
+    parser.add_argument('--compile', action='store_true', help="Write the precompiled reading index and exit")
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(args)
+    if options.compile:
+        print("  ==> {}".format(compile_reading_index(options.index)))
+        return
+    texts = list(options.texts)
+    if options.input != None:
+        with open(options.input, encoding="utf-8") as read_file:
+            texts.extend(line.rstrip("\n") for line in read_file)
+    with load_pinyin_lookup(options.index, options.workers) as lookup:
+        for (text, readings) in zip(texts, lookup.lookup_batch(texts)):
+            readings = [ {"character": character, "pinyin": pinyin, "ss": ss_number, "rule": rule} \
+                         for (character, (pinyin, ss_number, rule)) in zip(text, readings) ]
+            sys.stdout.buffer.write(orjson.dumps(readings) + b"\n")
+
+if __name__ == "__main__":
+    sys.exit(main())
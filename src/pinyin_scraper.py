@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 src/pinyin_scraper.py 重版 重婚 兴兴头头
+# python3 src/pinyin_scraper.py 重版 --source baidu --url baidu=http://127.0.0.1:8000/baidu/{}
+
+"""
+辞書サイト (百度汉语, 汉典) から単語のピンインを取得する asyncio のクライアント
+
+多音字の単語をまとめて検証するため (phrase_verifier.py など)
+    接続        : requests.Session の接続プールを全てのリクエストで使い回す (リクエストはスレッドで実行する)
+    ホストごと  : 同時に送るリクエストを config.SCRAPE_CONCURRENCY_PER_HOST まで、
+                  一秒あたり config.SCRAPE_REQUESTS_PER_SECOND までにする
+    失敗したとき : 接続のエラー、タイムアウト、429、5xx は config.SCRAPE_RETRIES 回までやり直す (間隔は倍にしていく)
+                  やり直しても取得できなければ例外を投げる. 200, 404 以外のステータスコード (403 など) も例外
+                  None になるのは 404 とページにピンインが無いときだけ
+    キャッシュ   : 取得したページ (404 も) を URL の sha256 ごとに DIR_SCRAPE_CACHE に保存し、次からはサイトに問い合わせない
+
+ページからピンインを取り出す関数は SOURCES でサイトごとに指定する (ページのバイト列 -> ピンインのリスト or None)。
+URL を差し替えると、記録したページを返すローカルのサーバー (tools/pinyin_stub_server.py) で試せる。
+
+e.g.:
+    async with PinyinScraper() as scraper:
+        await scraper.get_pinyins("baidu", "重版")  # -> ["chóng", "bǎn"]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import argparse
+import functools
+import concurrent.futures
+import urllib.parse
+import orjson
+import requests
+from bs4 import BeautifulSoup
+import config
+import path as p
+
+BAIDU_URL  = "https://hanyu.baidu.com/s?wd={}&from=zici"
+ZDIC_URL   = "https://www.zdic.net/hans/{}"
+
+DIR_SCRAPE_CACHE = os.path.join(p.DIR_TEMP, "scrape_cache")
+
+# やり直すステータスコード
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+# キャッシュするステータスコード (404 は「ページが無い」という結果として残す). これ以外は例外にする
+CACHE_STATUS_CODES = [200, 404]
+
+# [ chóng xiāo ] こんな感じの文字列
+def parse_baidu(html):
+    soup = BeautifulSoup(html, "html.parser")
+    elem = soup.find("div", id="pinyin")
+    if elem == None or elem.find("b") == None:
+        return None
+    text = elem.find("b").get_text()
+    text = text.replace("[", "").replace("]", "")
+    pinyins = text.split()
+    return pinyins if len(pinyins) > 0 else None
+
+def parse_zdic(html):
+    soup = BeautifulSoup(html, "html.parser")
+    elem = soup.find_all(class_="dicpy")
+    if len(elem) == 0:
+        return None
+    pinyins = elem[0].get_text().split()
+    return pinyins if len(pinyins) > 0 else None
+
+# サイトの名前 -> URL ({} に単語を入れる), ページからピンインを取り出す関数
+SOURCES = {
+    "baidu": {"url": BAIDU_URL, "parser": parse_baidu},
+    "zdic":  {"url": ZDIC_URL,  "parser": parse_zdic}
+}
+
+# e.g.: ["baidu=http://127.0.0.1:8000/baidu/{}"] -> SOURCES の URL を差し替えたもの
+def replace_urls(url_options, sources=SOURCES):
+    sources = { name: dict(source) for (name, source) in sources.items() }
+    for url_option in url_options:
+        (name, _, url) = url_option.partition("=")
+        if not (name in sources) or not ("{}" in url):
+            raise Exception("--url は <{}>=<単語を {{}} にした URL> にしてください.\n  --url: {}".format("|".join(sources.keys()), url_option))
+        sources[name]["url"] = url
+    return sources
+
+class HostLimiter():
+
+    def __init__(self, concurrency, requests_per_second):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0
+        self.lock = asyncio.Lock()
+        self.next_time = 0
+
+    # 前のリクエストから interval 秒空ける
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+class PinyinScraper():
+
+    # DIR_CACHE : None ならキャッシュしない. refresh : キャッシュを読まずに取得し直す (保存はする)
+    def __init__(self, sources=SOURCES, DIR_CACHE=DIR_SCRAPE_CACHE, refresh=False, \
+                 concurrency=config.SCRAPE_CONCURRENCY_PER_HOST, requests_per_second=config.SCRAPE_REQUESTS_PER_SECOND, \
+                 retries=config.SCRAPE_RETRIES, retry_backoff=config.SCRAPE_RETRY_BACKOFF, timeout=config.SCRAPE_TIMEOUT):
+        self.sources = sources
+        self.DIR_CACHE = DIR_CACHE
+        self.refresh = refresh
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        hosts = set( urllib.parse.urlsplit(source["url"]).netloc for source in sources.values() )
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=len(hosts), pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency * len(hosts))
+        # ホスト -> HostLimiter (イベントループの中で作る)
+        self.limiters = {}
+        self.stats = {"requests": 0, "cache_hits": 0, "retries": 0, "failures": 0}
+        if DIR_CACHE != None:
+            os.makedirs(DIR_CACHE, exist_ok=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+
+    def get_limiter(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        if not (host in self.limiters):
+            self.limiters[host] = HostLimiter(self.concurrency, self.requests_per_second)
+        return self.limiters[host]
+
+    def get_cache_path(self, url):
+        return os.path.join(self.DIR_CACHE, hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    # (ステータスコード, ページのバイト列). キャッシュが無ければ None
+    def load_cache(self, url):
+        if self.DIR_CACHE == None or self.refresh:
+            return None
+        CACHE = self.get_cache_path(url)
+        if not os.path.exists(CACHE + ".json"):
+            return None
+        with open(CACHE + ".json", "rb") as read_file:
+            meta = orjson.loads(read_file.read())
+        with open(CACHE + ".body", "rb") as read_file:
+            return (meta["status"], read_file.read())
+
+    # ページを書いてから .json を置き換えるので、途中で止まっても壊れたキャッシュは読まれない
+    def save_cache(self, url, status, body):
+        if self.DIR_CACHE == None:
+            return
+        CACHE = self.get_cache_path(url)
+        with open(CACHE + ".body.part", "wb") as write_file:
+            write_file.write(body)
+        os.replace(CACHE + ".body.part", CACHE + ".body")
+        with open(CACHE + ".json.part", "wb") as write_file:
+            write_file.write(orjson.dumps({"url": url, "status": status, "fetched": int(time.time())}))
+        os.replace(CACHE + ".json.part", CACHE + ".json")
+
+    def get_retry_wait(self, attempt, response):
+        wait_time = self.retry_backoff * (2 ** attempt)
+        retry_after = response.headers.get("Retry-After", "") if response != None else ""
+        if retry_after.isdigit():
+            wait_time = max(wait_time, int(retry_after))
+        return wait_time
+
+    # (ステータスコード, ページのバイト列, 時間). 時間はリクエスト (やり直しを含む) かキャッシュの読み込みにかかった秒数
+    # ホストの同時接続数やリクエストの間隔による待ち時間は含まない
+    # ステータスコードは 200 か 404. 他のステータスコード (403 など) はキャッシュせずに例外を投げる
+    async def fetch(self, url):
+        start = time.perf_counter()
+        cached = self.load_cache(url)
+        if cached != None:
+            self.stats["cache_hits"] += 1
+            return cached + (time.perf_counter() - start,)
+        limiter = self.get_limiter(url)
+        loop = asyncio.get_running_loop()
+        latency = 0
+        for attempt in range(self.retries + 1):
+            response = None
+            async with limiter.semaphore:
+                await limiter.wait()
+                self.stats["requests"] += 1
+                start = time.perf_counter()
+                try:
+                    response = await loop.run_in_executor(self.executor, functools.partial(self.session.get, url, timeout=self.timeout))
+                    error = "HTTP {}".format(response.status_code)
+                except requests.RequestException as e:
+                    error = "{}: {}".format(type(e).__name__, e)
+                latency += time.perf_counter() - start
+            if response != None and not (response.status_code in RETRY_STATUS_CODES):
+                break
+            if attempt < self.retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.get_retry_wait(attempt, response))
+        else:
+            self.stats["failures"] += 1
+            raise Exception("{} を取得できませんでした ({} 回試しました).\n  {}".format(url, self.retries + 1, error))
+        if not (response.status_code in CACHE_STATUS_CODES):
+            self.stats["failures"] += 1
+            raise Exception("{}: HTTP {}".format(url, response.status_code))
+        self.save_cache(url, response.status_code, response.content)
+        return (response.status_code, response.content, latency)
+
+    def get_url(self, source, phrase):
+        return self.sources[source]["url"].format(urllib.parse.quote(phrase))
+
+    # ページが無い (404) かページにピンインが無いときは None
+    async def get_pinyins(self, source, phrase):
+        (pinyins, _) = await self.get_pinyins_with_latency(source, phrase)
+        return pinyins
+
+    # (ピンインのリスト, fetch の時間)
+    async def get_pinyins_with_latency(self, source, phrase):
+        (status, body, latency) = await self.fetch(self.get_url(source, phrase))
+        if status == 404:
+            return (None, latency)
+        return (self.sources[source]["parser"](body), latency)
+
+    # 単語 -> ピンインのリスト (取得できなかった単語は例外)
+    async def get_pinyins_batch(self, source, phrases):
+        results = await asyncio.gather(*[self.get_pinyins(source, phrase) for phrase in phrases], return_exceptions=True)
+        return dict(zip(phrases, results))
+
+# 一つの単語だけ取得する (pinyin_getter.get_pinyin_with_baidu など)
+def get_pinyins(source, phrase, sources=SOURCES, DIR_CACHE=DIR_SCRAPE_CACHE):
+    async def run():
+        async with PinyinScraper(sources, DIR_CACHE) as scraper:
+            return await scraper.get_pinyins(source, phrase)
+    return asyncio.run(run())
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Fetch the pinyin of phrases from the dictionary sites")
+    parser.add_argument('phrases', nargs='+', help="Phrases to look up")
+    parser.add_argument('--source', action='append', choices=list(SOURCES.keys()), default=None, help="Dictionary site (all if omitted)")
+    parser.add_argument('--url', action='append', default=[], metavar='SOURCE=URL', help="Replace the URL of a site, e.g. baidu=http://127.0.0.1:8000/baidu/{}")
+    parser.add_argument('--refresh', action='store_true', help="Ignore the cached pages and fetch them again")
+    parser.add_argument('--no-cache', action='store_true', help="Neither read nor write the page cache")
+    return parser.parse_args(args)
+
+async def scrape(options):
+    sources = replace_urls(options.url)
+    DIR_CACHE = None if options.no_cache else DIR_SCRAPE_CACHE
+    async with PinyinScraper(sources, DIR_CACHE, options.refresh) as scraper:
+        for source in (options.source if options.source != None else sources.keys()):
+            results = await scraper.get_pinyins_batch(source, options.phrases)
+            for (phrase, pinyins) in results.items():
+                if isinstance(pinyins, Exception):
+                    print("{} {}: error: {}".format(source, phrase, pinyins))
+                else:
+                    print("{} {}: {}".format(source, phrase, "/".join(pinyins) if pinyins != None else None))
+        print("  ==> requests: {requests}, cache hits: {cache_hits}, retries: {retries}, failures: {failures}".format(**scraper.stats))
+
+def main(args=None):
+    asyncio.run(scrape(parse_args(args)))
+
+if __name__ == "__main__":
+    sys.exit(main())
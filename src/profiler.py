@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import resource
+import contextlib
+import orjson
+
+"""
+ビルドの各工程 (stage) の計測を行う
+python3 src/main.py --profile を指定したときだけ有効になる
+
+e.g.: 出力する json
+{
+    "stages": [
+        {
+            "name": "glyf",
+            "wall_time": 12.3,          # 経過時間 [s]
+            "cpu_time": 12.1,           # CPU 時間 [s]
+            "peak_rss": 1234567890,     # この工程が終わった時点でのプロセスの最大 RSS [byte]
+            "allocated_blocks": 123456  # この工程で増えた Python のメモリブロック数
+        },
+        ...
+    ]
+}
+"""
+
+# ru_maxrss は Linux では KB, macOS では byte
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+def get_peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+class BuildProfiler():
+
+    def __init__(self):
+        self.stages = []
+        self.origin = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start_wall   = time.perf_counter()
+        start_cpu    = time.process_time()
+        start_blocks = sys.getallocatedblocks()
+        try:
+            yield
+        finally:
+            self.stages.append(
+                {
+                    "name": name,
+                    "start": round(start_wall - self.origin, 6),
+                    "wall_time": round(time.perf_counter() - start_wall, 6),
+                    "cpu_time": round(time.process_time() - start_cpu, 6),
+                    "peak_rss": get_peak_rss(),
+                    "allocated_blocks": sys.getallocatedblocks() - start_blocks
+                }
+            )
+
+    def get_stages(self):
+        return self.stages
+
+    def print_summary(self):
+        for stage in self.stages:
+            print("  {:<24} wall: {:>9.3f}s  cpu: {:>9.3f}s  peak rss: {:>8.1f}MB".format(
+                stage["name"], stage["wall_time"], stage["cpu_time"], stage["peak_rss"] / (1024 * 1024)))
+
+    def save_as_json(self, OUTPUT_JSON):
+        with open(OUTPUT_JSON, "wb") as f:
+            f.write(orjson.dumps({"stages": self.stages}, option=orjson.OPT_INDENT_2))
+
+    # Trace Event Format (chrome://tracing, Perfetto, speedscope で flame graph として読み込める)
+    # [Trace Event Format](https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU)
+    def save_as_trace(self, OUTPUT_TRACE_JSON):
+        trace_events = []
+        for stage in self.stages:
+            trace_events.append(
+                {
+                    "name": stage["name"],
+                    "ph": "X",
+                    "ts": round(stage["start"] * 1000000),
+                    "dur": round(stage["wall_time"] * 1000000),
+                    "pid": os.getpid(),
+                    "tid": 0,
+                    "args": {
+                        "cpu_time": stage["cpu_time"],
+                        "peak_rss": stage["peak_rss"],
+                        "allocated_blocks": stage["allocated_blocks"]
+                    }
+                }
+            )
+        with open(OUTPUT_TRACE_JSON, "wb") as f:
+            f.write(orjson.dumps({"traceEvents": trace_events, "displayTimeUnit": "ms"}))
+
+# --profile を指定しないときに使う。何も計測しない
+class NullProfiler():
+
+    def stage(self, name):
+        return contextlib.nullcontext()
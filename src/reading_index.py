@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import os
+import re
+import hashlib
+import orjson
+import path as p
+import pinyin_getter as pg
+import font_sources
+
+"""
+文字列の中の多音字の読み (ss の番号) を、フォントの rclt (GSUBTable が作る lookup_rclt_0) と同じ規則で決める
+
+ルールは reading_rule.ReadingRuleCompiler のもの (get_sorted_rules の順) をそのまま使い、
+OpenType の chaining lookup と同じように文字を左から順に調べる
+    - 位置ごとに、その位置の文字から入力 (inputBegins ~ inputEnds) が始まるルールを順に試し、最初にマッチしたものを適用する
+    - マッチしたら、入力の終わりの次の位置から続ける (ignore のルールも同じ)
+    - 置き換え済みの文字 (ssXX のグリフ) は、後のルールの前の文脈にマッチしない
+    - 異体字セレクタが付いている文字は、すでに異体字のグリフなので、どのルールにもマッチしない
+フォントは cid でマッチするので、同じグリフを共有する別の unicode の漢字 (glyph_dedup) もマッチするが、ここでは文字でマッチする。
+
+e.g.:
+    index = ReadingIndex(reading_rule.get_sorted_rules(), pinyin_mapping_table)
+    index.find_substitutions("银行行业")  # -> {1: (2, 银~ のルール), 2: (2, ~业 のルール)}  位置 -> (ss の番号, 適用したルール)
+"""
+
+# 多音字の辞書データ (main.py と同じ)
+PATTERN_ONE_TXT        = os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_one.txt")
+PATTERN_TWO_JSON       = os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_two.json")
+EXCEPTION_PATTERN_JSON = os.path.join(p.DIR_OUTPUT, "duoyinzi_exceptional_pattern.json")
+MARGED_MAPPING_TABLE   = os.path.join(p.DIR_OUTPUT, pg.MARGED_MAPPING_TABLE)
+
+# コンパイル済みのルールとマッピングテーブル (main.py がフォントと一緒に書き出す)
+READING_INDEX_JSON = os.path.join(p.DIR_OUTPUT, "reading_index.json")
+# READING_INDEX_JSON の形式を変えたときに上げる
+READING_INDEX_VERSION = 1
+
+# 異体字セレクタ (VS1~VS16, VS17~VS256)
+VARIATION_SELECTOR_RANGES = [(0xFE00, 0xFE0F), (0xE0100, 0xE01EF)]
+# cmap_uvs の異体字セレクタ (Font.add_cmap_uvs). ss の番号を足す
+IVS = 0xE01E0
+
+def get_selector(ss_number):
+    return chr(IVS + ss_number)
+
+def is_variation_selector(character):
+    return any(start <= ord(character) <= end for (start, end) in VARIATION_SELECTOR_RANGES)
+
+class ReadingIndex():
+
+    # rules : reading_rule.ReadingRuleCompiler.get_sorted_rules() (最初にマッチしたものを適用する順)
+    def __init__(self, rules, pinyin_mapping_table):
+        self.PINYIN_MAPPING_TABLE = pinyin_mapping_table
+        self.rules = rules
+        # 入力の最初の文字 -> [(ルールの番号, 文字の位置の差 と マッチする文字の組のリスト, 適用 (位置の差, ss の番号), 入力の長さ), ...]
+        self.rules_by_hanzi = {}
+        for (rule_id, rule) in enumerate(rules):
+            begin = rule["inputBegins"]
+            checks = tuple( (k - begin, frozenset(hanzes)) for (k, hanzes) in enumerate(rule["match"]) )
+            applies = tuple( (apply["at"] - begin, apply["ss"]) for apply in rule["apply"] )
+            compiled_rule = (rule_id, checks, applies, rule["inputEnds"] - begin)
+            for hanzi in dict.fromkeys(rule["match"][begin]):
+                self.rules_by_hanzi.setdefault(hanzi, []).append(compiled_rule)
+        # ルールを試す位置の前後に必要な文字数 (異体字セレクタが付いているかを調べるために後ろは一文字多く見る)
+        self.max_before = max( [rule["inputBegins"] for rule in rules], default=0 )
+        self.max_after  = max( [len(rule["match"]) - rule["inputBegins"] for rule in rules], default=1 )
+        self.re_trigger = self.compile_character_class(self.rules_by_hanzi.keys())
+        # 読みが複数ある漢字 (ss01 が標準の読み)
+        self.multiple_pinyin_hanzes = frozenset(hanzi for (hanzi, pinyins) in pinyin_mapping_table.items() if len(pinyins) > 1)
+        self.re_multiple_pinyin = self.compile_character_class(self.multiple_pinyin_hanzes)
+
+    def compile_character_class(self, hanzes):
+        if len(hanzes) == 0:
+            # 何にもマッチしない
+            return re.compile("(?!)")
+        return re.compile("[{}]".format("".join(re.escape(hanzi) for hanzi in sorted(hanzes))))
+
+    # 異体字セレクタが付いている文字か
+    def has_selector(self, text, pos):
+        return pos + 1 < len(text) and is_variation_selector(text[pos + 1])
+
+    # text[i] から入力が始まるルールを順に試し、最初にマッチしたルールを返す
+    def match_at(self, text, i, substitutions):
+        for compiled_rule in self.rules_by_hanzi.get(text[i], []):
+            (_, checks, _, _) = compiled_rule
+            for (offset, hanzes) in checks:
+                pos = i + offset
+                if pos < 0 or pos >= len(text) or not (text[pos] in hanzes):
+                    break
+                if offset < 0 and pos in substitutions:
+                    break
+                if self.has_selector(text, pos):
+                    break
+            else:
+                return compiled_rule
+        return None
+
+    """
+    text[start:limit] の位置から始まるルールを調べ、substitutions (位置 -> (ss の番号, ルールの番号)) に追加する
+    skip_until : この位置より前は前のルールの入力なので調べない
+    text は limit から max_after 文字先まで (文字列の終わりならそこまで) 必要. 前の文脈は max_before 文字前まで見る
+    戻り値は次に調べる位置 (limit より後になることがある)
+    """
+    def scan(self, text, start, limit, substitutions, skip_until=0):
+        skip_until = max(start, skip_until)
+        for m in self.re_trigger.finditer(text, skip_until, limit):
+            i = m.start()
+            if i < skip_until:
+                continue
+            compiled_rule = self.match_at(text, i, substitutions)
+            if compiled_rule == None:
+                continue
+            (rule_id, _, applies, input_length) = compiled_rule
+            for (offset, ss_number) in applies:
+                substitutions.update( {i + offset: (ss_number, rule_id)} )
+            skip_until = i + input_length
+        return max(skip_until, limit)
+
+    # 文字列全体の置き換え. 位置 -> (ss の番号, 適用したルール)
+    def find_substitutions(self, text):
+        substitutions = {}
+        self.scan(text, 0, len(text), substitutions)
+        return { pos: (ss_number, self.rules[rule_id]) for (pos, (ss_number, rule_id)) in substitutions.items() }
+
+# マッピングテーブルと多音字の辞書データから作る (GSUBTable と同じ読み込み)
+def load_reading_index(pinyin_mapping_table=None, PATTERN_ONE_TXT=PATTERN_ONE_TXT, PATTERN_TWO_JSON=PATTERN_TWO_JSON, \
+                       EXCEPTION_PATTERN_JSON=EXCEPTION_PATTERN_JSON, sources=None):
+    sources = sources if sources != None else font_sources.FileSources()
+    if pinyin_mapping_table == None:
+        pinyin_mapping_table = sources.get_pinyin_mapping_table()
+    reading_rule = sources.load_reading_rule(pinyin_mapping_table, PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON)
+    return ReadingIndex(reading_rule.get_sorted_rules(), pinyin_mapping_table)
+
+# 多音字の辞書データとマッピングテーブルの sha256 (コンパイル済みのルールが古くないかを調べる)
+# アプリに READING_INDEX_JSON だけを組み込んだときなど、ファイルが無ければ None
+def get_source_digest(PATTERN_ONE_TXT=PATTERN_ONE_TXT, PATTERN_TWO_JSON=PATTERN_TWO_JSON, \
+                      EXCEPTION_PATTERN_JSON=EXCEPTION_PATTERN_JSON, MARGED_MAPPING_TABLE=MARGED_MAPPING_TABLE):
+    FILES = [PATTERN_ONE_TXT, PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON, MARGED_MAPPING_TABLE]
+    if not all(os.path.exists(FILE) for FILE in FILES):
+        return None
+    sha256 = hashlib.sha256()
+    for FILE in FILES:
+        sha256.update(font_sources.read_bytes(FILE))
+    return sha256.hexdigest()
+
+# rules は get_sorted_rules の順. source_digest : get_source_digest (ピンインを上書きしたときなどは None)
+def save_reading_index(rules, pinyin_mapping_table, READING_INDEX_JSON=READING_INDEX_JSON, source_digest=None):
+    reading_index = {
+        "version": READING_INDEX_VERSION,
+        "source_digest": source_digest,
+        "rules": rules,
+        "pinyin_mapping_table": pinyin_mapping_table
+    }
+    TEMP_READING_INDEX_JSON = READING_INDEX_JSON + ".part"
+    with open(TEMP_READING_INDEX_JSON, "wb") as write_file:
+        write_file.write(orjson.dumps(reading_index))
+    os.replace(TEMP_READING_INDEX_JSON, READING_INDEX_JSON)
+    return READING_INDEX_JSON
+
+# source_digest を指定すると、違うデータから作ったもの (作り直しが必要) は None を返す
+def load_precompiled_reading_index(READING_INDEX_JSON=READING_INDEX_JSON, source_digest=None):
+    with open(READING_INDEX_JSON, "rb") as read_file:
+        reading_index = orjson.loads(read_file.read())
+    if reading_index.get("version") != READING_INDEX_VERSION:
+        raise Exception("{} の形式が古いので、作り直してください.\n  version: {}".format(READING_INDEX_JSON, reading_index.get("version")))
+    if source_digest != None and reading_index["source_digest"] != source_digest:
+        return None
+    return ReadingIndex(reading_index["rules"], reading_index["pinyin_mapping_table"])
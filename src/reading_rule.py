@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import re
+import orjson
+import pinyin_getter as pg
+
+"""
+多音字の文脈による読み分けのルールを一箇所に集めて、GSUB の lookup に変換する
+
+ルールは漢字のままで保持する（cid への変換は compile の時に行う）
+pattern one / pattern two / exceptional pattern はそれぞれ add_rule でルールを追加するだけなので、
+別のソースからルールを追加したい場合も add_rule を呼べばよい。
+
+ルールの形式
+e.g.: 银~ (行 -> háng)
+{
+    "match": [ ["银"], ["行"] ],       # 位置ごとにマッチする漢字のリスト
+    "apply": [ {"at": 1, "ss": 2} ],   # 置き換える位置と ss の番号（apply が空なら ignore のルール）
+    "inputBegins": 1,
+    "inputEnds": 2,
+    "source": "pattern_one"
+}
+
+OpenType の chaining lookup は subtable を上から順に試し、最初にマッチしたものだけを適用する。
+なので、全てのルールを一つの lookup にまとめ、マッチする長さが長い順に並べることで最長一致を優先させる。
+"""
+
+LOOKUP_CHAINING    = "lookup_rclt_0"
+# 置き換え用の lookup は ss の番号ごとに一つだけ作る e.g.: lookup_pattern_ss02
+LOOKUP_SUBSTITUTION = "lookup_pattern_ss{:02}"
+
+SOURCE_PATTERN_ONE       = "pattern_one"
+SOURCE_PATTERN_TWO       = "pattern_two"
+SOURCE_EXCEPTION_PATTERN = "exception_pattern"
+
+# "行.ss02" や "cid16957.ss05" から ss の番号を取り出す
+def get_ss_number(glyf_name):
+    return int(glyf_name.split(".ss")[-1])
+
+def get_substitution_lookup_name(ss_number):
+    return LOOKUP_SUBSTITUTION.format(ss_number)
+
+class ReadingRuleCompiler():
+
+    def __init__(self, PINYIN_MAPPING_TABLE):
+        self.PINYIN_MAPPING_TABLE = PINYIN_MAPPING_TABLE
+        self.rules = []
+
+    def add_rule(self, match, applies, input_begins, input_ends, source=""):
+        self.rules.append(
+            {
+                "match": match,
+                "apply": applies,
+                "inputBegins": input_begins,
+                "inputEnds": input_ends,
+                "source": source
+            }
+        )
+
+    # 何もしないルール. これより短いルールが適用されるのを防ぐ
+    def add_ignore_rule(self, match, at, source=""):
+        self.add_rule(match, [], at, at + 1, source)
+
+    # マッピングテーブル上の読みの位置から ss の番号を求める
+    # ss00 はピンインの無いグリフ、ss01 は標準の読みなので、 pinyins[i] は ss{i+1} になる
+    def get_ss_number_of_pinyin(self, hanzi, pinyin):
+        pinyins = self.PINYIN_MAPPING_TABLE[hanzi]
+        if not (pinyin in pinyins):
+            raise Exception("{} => {} は 正しいピンインではありません".format(hanzi, pinyin))
+        return pinyins.index(pinyin) + pg.SS_NORMAL_PRONUNCIATION
+
+    def load_pattern_one(self, PATTERN_ONE_TXT):
+        """
+        e.g.:
+        1, 行, xíng, [~走|步~|~人道]
+        2, 行, háng, [~当|~家|发~|银~|~话]
+        """
+        variational_patterns = []
+        normal_patterns = []
+        with open(PATTERN_ONE_TXT, mode='r', encoding='utf-8') as read_file:
+            for line in read_file:
+                [_, hanzi, pinyin, str_patterns] = line.rstrip('\n').split(', ')
+                patterns = str_patterns.strip("[]").split('|')
+                ss_number = self.get_ss_number_of_pinyin(hanzi, pinyin)
+                if ss_number == pg.SS_NORMAL_PRONUNCIATION:
+                    normal_patterns.append( (hanzi, patterns) )
+                else:
+                    variational_patterns.append( (hanzi, ss_number, patterns) )
+
+        for (hanzi, ss_number, patterns) in variational_patterns:
+            self.add_rules_of_pattern_one(hanzi, ss_number, patterns)
+
+        # 標準の読みのパターンは置き換え不要だが、異読のパターンを含んでいるなら
+        # 異読に置き換わらないように ignore のルールにする
+        # e.g.: 银~ (háng) と 银~子 (xíng) なら 银~子 を ignore にする
+        for (hanzi, patterns) in normal_patterns:
+            shorter_patterns = [pattern for (h, _, ps) in variational_patterns if h == hanzi for pattern in ps]
+            for pattern in patterns:
+                if any(self.is_contained_pattern(shorter, pattern) for shorter in shorter_patterns):
+                    at = pattern.index("~")
+                    self.add_ignore_rule([ [c] for c in pattern.replace("~", hanzi) ], at, SOURCE_PATTERN_ONE)
+
+    # ~ の位置を揃えたときに shorter が pattern の一部になっているか
+    def is_contained_pattern(self, shorter, pattern):
+        if len(shorter) >= len(pattern):
+            return False
+        begin = pattern.index("~") - shorter.index("~")
+        return begin >= 0 and pattern[begin:begin + len(shorter)] == shorter
+
+    def add_rules_of_pattern_one(self, apply_hanzi, ss_number, patterns):
+        # まとめて記述できるもの
+        # e.g.:
+        # sub [uni4E0D uni9280] uni884C' lookup lookup_0 ;
+        # sub uni884C' lookup lookup_0　[uni4E0D uni9280] ;
+        left_match  = [s for s in patterns if re.match("^~.$", s)]
+        right_match = [s for s in patterns if re.match("^.~$", s)]
+        # 一つ一つ記述するもの
+        # e.g.:
+        # sub uni85CF' lookup lookup_0 uni7D05 uni82B1 ;
+        other_match = [s for s in patterns if not (s in (left_match + right_match))]
+
+        if len(left_match) > 0:
+            context_hanzes = [context_hanzi.replace("~", "") for context_hanzi in left_match]
+            self.add_rule([ [apply_hanzi], context_hanzes ], [ {"at": 0, "ss": ss_number} ], 0, 1, SOURCE_PATTERN_ONE)
+
+        if len(right_match) > 0:
+            context_hanzes = [context_hanzi.replace("~", "") for context_hanzi in right_match]
+            self.add_rule([ context_hanzes, [apply_hanzi] ], [ {"at": 1, "ss": ss_number} ], 1, 2, SOURCE_PATTERN_ONE)
+
+        for match_pattern in other_match:
+            at = match_pattern.index("~")
+            self.add_rule([ [hanzi] for hanzi in match_pattern.replace("~", apply_hanzi) ],
+                            [ {"at": at, "ss": ss_number} ], at, at + 1, SOURCE_PATTERN_ONE)
+
+    # pattern two と exceptional pattern で共通の形式
+    # e.g.: [{"兴": null}, {"兴": "lookup_pattern_10"}, {"头": "lookup_pattern_10"}, {"头": null}]
+    def add_rule_of_phrase(self, phrase, list_pattern_table, lookup_table, source):
+        applies = []
+        for i in range(len(list_pattern_table)):
+            # 要素は一つしかない
+            [(hanzi, lookup_name)] = list_pattern_table[i].items()
+            if lookup_name != None:
+                applies.append( {"at": i, "ss": get_ss_number(lookup_table[lookup_name][hanzi])} )
+        ats = [apply["at"] for apply in applies]
+        self.add_rule([ [hanzi] for hanzi in phrase ], applies, min(ats), max(ats) + 1, source)
+
+    def load_pattern_two(self, PATTERN_TWO_JSON):
+        with open(PATTERN_TWO_JSON, "rb") as read_file:
+            pattern_two = orjson.loads(read_file.read())
+        for phrase, list_pattern_table in pattern_two["patterns"].items():
+            self.add_rule_of_phrase(phrase, list_pattern_table, pattern_two["lookup_table"], SOURCE_PATTERN_TWO)
+
+    def load_exception_pattern(self, EXCEPTION_PATTERN_JSON):
+        with open(EXCEPTION_PATTERN_JSON, "rb") as read_file:
+            exception_pattern = orjson.loads(read_file.read())
+        for phrase, setting_of_phrase in exception_pattern["patterns"].items():
+            ignore_pattern = setting_of_phrase["ignore"]
+            # ignore のパターンがあれば記述する e.g.: "背 着' 手"
+            if ignore_pattern != None:
+                list_ignore_pattern = ignore_pattern.split(' ')
+                tmp = [ hanzi for hanzi in list_ignore_pattern if re.match(".'", hanzi) ]
+                if len(tmp) != 1:
+                    # 現在は、対象('がある)漢字はひとつだけと想定している
+                    raise Exception("exception pattern の ignore 記述が間違っています。: \n {}".format(ignore_pattern))
+                at = list_ignore_pattern.index(tmp[0])
+                # 空白とシングルコートを削除
+                ignore_phrase = ignore_pattern.replace(" ", "").replace("'", "")
+                self.add_ignore_rule([ [hanzi] for hanzi in ignore_phrase ], at, SOURCE_EXCEPTION_PATTERN)
+            self.add_rule_of_phrase(phrase, setting_of_phrase["pattern"], exception_pattern["lookup_table"], SOURCE_EXCEPTION_PATTERN)
+
+    # マッチする長さが長い順. 同じ長さなら追加した順（pattern one -> pattern two -> exceptional pattern）
+    def get_sorted_rules(self):
+        return sorted(self.rules, key=lambda rule: -len(rule["match"]))
+
+    def get_rules(self):
+        return self.rules
+
+    def compile(self, convert_hanzi_2_cid):
+        """
+        e.g.:
+        "lookup_rclt_0": {
+            "type": "gsub_chaining",
+            "flags": {},
+            "subtables": [
+                {
+                    "match": [ ["uni4E0D","uni9280"], ["uni884C"] ],
+                    "apply": [ {"at": 1, "lookup": "lookup_pattern_ss02"} ],
+                    "inputBegins": 1,
+                    "inputEnds": 2
+                }
+            ]
+        },
+        "lookup_pattern_ss02": {
+            "type": "gsub_single",
+            "flags": {},
+            "subtables": [ {"uni884C": "uni884C.ss02"} ]
+        }
+        """
+        chaining_subtables = []
+        substitution_tables = {}
+        for rule in self.get_sorted_rules():
+            match = [ [convert_hanzi_2_cid(hanzi) for hanzi in hanzes] for hanzes in rule["match"] ]
+            applies = []
+            for apply in rule["apply"]:
+                lookup_name = get_substitution_lookup_name(apply["ss"])
+                if not (lookup_name in substitution_tables):
+                    substitution_tables.update( {lookup_name: {}} )
+                for cid in match[apply["at"]]:
+                    substitution_tables[lookup_name].update( {cid: "{}.ss{:02}".format(cid, apply["ss"])} )
+                applies.append( {"at": apply["at"], "lookup": lookup_name} )
+            chaining_subtables.append(
+                {
+                    "match": match,
+                    "apply": applies,
+                    "inputBegins": rule["inputBegins"],
+                    "inputEnds": rule["inputEnds"]
+                }
+            )
+
+        lookups = {
+            LOOKUP_CHAINING: {
+                "type": "gsub_chaining",
+                "flags": {},
+                "subtables": chaining_subtables
+            }
+        }
+        for lookup_name in sorted(substitution_tables.keys()):
+            lookups.update(
+                {
+                    lookup_name: {
+                        "type": "gsub_single",
+                        "flags": {},
+                        "subtables": [ substitution_tables[lookup_name] ]
+                    }
+                }
+            )
+        return lookups
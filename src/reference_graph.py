@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+"""
+合成グリフの参照 (references) のグラフ
+
+漢字のグリフは cid -> cid.ss01 -> (cid.ss00 + ピンインの部品) のように参照が連なっていて、
+描画のたびに参照を辿って変換を合成することになる。
+また、重複した unicode の扱いを間違えると循環参照になり、otfccbuild で警告 (Circular glyph reference) が出る。
+
+深さ : 参照を持たないグリフは 0, 参照を持つグリフは 参照先の深さの最大 + 1
+       (cid.ss00 = 0, cid.ss01 = 1, cid = 2)
+flatten(max_depth) で、深さが max_depth を超えるグリフの参照先を、参照先の参照 (変換を合成したもの) で置き換える
+(max_depth = 1 なら、全ての参照が輪郭だけのグリフを指すようになる)
+
+グラフは一度の深さ優先探索 (再帰を使わず、訪問中/訪問済みの色分け) で調べるので、グリフ数 + 参照数に比例する時間で終わる。
+循環参照しているグリフと、そこに到達するグリフの深さは None にして、flatten の対象にしない。
+
+check_circular_references は otfccbuild の前に循環参照を調べて、見つかれば gid (glyph_order の index) と一緒に表示して止める
+(otfccbuild は警告を出して参照を捨てるだけなので、漢字の輪郭やピンインが消えたフォントができてしまう)。
+tools/find_circular_reference_gid.py から任意の json を調べることもできる。
+"""
+
+VISITING = 1
+VISITED  = 2
+
+# 参照の変換を合成する. parent の参照先のグリフが child を参照しているとき、parent のグリフから child の参照先への参照を返す
+# 変換 : x' = a * x + c * y + dx,  y' = b * x + d * y + dy
+def compose_reference(parent, child):
+    (a, b, c, d, x, y) = (parent["a"], parent["b"], parent["c"], parent["d"], parent["x"], parent["y"])
+    return {
+        "glyph": child["glyph"],
+        "x": round(a * child["x"] + c * child["y"] + x, 2),
+        "y": round(b * child["x"] + d * child["y"] + y, 2),
+        "a": round(a * child["a"] + c * child["b"], 6),
+        "b": round(b * child["a"] + d * child["b"], 6),
+        "c": round(a * child["c"] + c * child["d"], 6),
+        "d": round(b * child["c"] + d * child["d"], 6)
+    }
+
+def get_references(glyf_data):
+    return glyf_data.get("references") or []
+
+def has_contours(glyf_data):
+    return len(glyf_data.get("contours") or []) > 0
+
+class ReferenceGraph():
+
+    def __init__(self, glyf_table):
+        self.glyf_table = glyf_table
+        self.analyze()
+
+    """
+    深さ優先探索で、深さと循環参照を調べる
+        self.depths        : グリフ名 -> 深さ (循環参照に関わるグリフは None)
+        self.post_order    : 参照先が先に来る順番のグリフ名のリスト
+        self.cycles        : 見つかった循環参照のリスト e.g.: [["uni5140", "uni5140.ss01", "uni5140"], ...]
+        self.missing       : 存在しないグリフへの参照 (参照元, 参照先) のリスト
+    """
+    def analyze(self):
+        glyf_table = self.glyf_table
+        states = {}
+        self.depths = {}
+        self.post_order = []
+        self.cycles = []
+        self.missing = []
+        cyclic_glyf_names = set()
+
+        for root in glyf_table.keys():
+            if root in states:
+                continue
+            states.update( {root: VISITING} )
+            # (グリフ名, 次に調べる参照の index)
+            stack = [ [root, 0] ]
+            stack_indexes = {root: 0}
+            while len(stack) > 0:
+                frame = stack[-1]
+                (glyf_name, i) = frame
+                references = get_references(glyf_table[glyf_name])
+                if i < len(references):
+                    frame[1] += 1
+                    child = references[i]["glyph"]
+                    if not (child in glyf_table):
+                        self.missing.append( (glyf_name, child) )
+                        continue
+                    state = states.get(child)
+                    if state == None:
+                        states.update( {child: VISITING} )
+                        stack_indexes.update( {child: len(stack)} )
+                        stack.append( [child, 0] )
+                    elif state == VISITING:
+                        # stack 上の child から glyf_name までが循環している
+                        cycle = [name for (name, _) in stack[stack_indexes[child]:]] + [child]
+                        self.cycles.append(cycle)
+                        cyclic_glyf_names |= set(cycle)
+                    continue
+
+                # 参照先を全て調べ終わった
+                stack.pop()
+                del stack_indexes[glyf_name]
+                states.update( {glyf_name: VISITED} )
+                self.post_order.append(glyf_name)
+                child_depths = [ self.depths.get(reference["glyph"], 0) if reference["glyph"] in glyf_table else 0 for reference in references ]
+                if glyf_name in cyclic_glyf_names or None in child_depths:
+                    self.depths.update( {glyf_name: None} )
+                else:
+                    self.depths.update( {glyf_name: 0 if len(references) == 0 else max(child_depths) + 1} )
+
+    # e.g.: {"max": 2, "histogram": {0: 30000, 1: 25000, 2: 8000}, "cyclic": 0, "missing": 0}
+    def get_depth_stats(self):
+        histogram = {}
+        cyclic = 0
+        for depth in self.depths.values():
+            if depth == None:
+                cyclic += 1
+            else:
+                histogram.update( {depth: histogram.get(depth, 0) + 1} )
+        return {
+            "max": max(histogram.keys(), default=0),
+            "histogram": dict(sorted(histogram.items())),
+            "cyclic": cyclic,
+            "missing": len(self.missing)
+        }
+
+    """
+    深さが max_depth を超えるグリフの参照を、参照先の参照で置き換える
+    参照先が先に来る順番 (post_order) で処理するので、参照先は既に max_depth 以下になっている。
+    輪郭と参照の両方を持つグリフは展開すると輪郭が消えるので、そのまま参照する
+    参照のリスト、参照の dict は他のグリフと共有していることがある (Font.generate_hanzi_glyf_with_pinyin) ので、書き換えずに作り直す
+    """
+    def flatten(self, max_depth):
+        if max_depth < 1:
+            raise Exception("参照の深さの上限は 1 以上にしてください.\n  max_depth: {}".format(max_depth))
+        flattened_num = 0
+        for glyf_name in self.post_order:
+            depth = self.depths[glyf_name]
+            if depth == None or depth <= max_depth:
+                continue
+            glyf_data = self.glyf_table[glyf_name]
+            new_references = []
+            for reference in get_references(glyf_data):
+                child_data = self.glyf_table.get(reference["glyph"])
+                if child_data != None and self.depths[reference["glyph"]] >= max_depth and not has_contours(child_data):
+                    new_references += [ compose_reference(reference, child_reference) for child_reference in get_references(child_data) ]
+                else:
+                    new_references.append(reference)
+            glyf_data.update( {"references": new_references} )
+            self.depths.update( {glyf_name: max((self.depths.get(reference["glyph"], 0) for reference in new_references), default=-1) + 1} )
+            flattened_num += 1
+        return flattened_num
+
+# グリフ名 -> gid (otfccbuild の警告の gid)
+def get_glyf_gids(glyph_order):
+    return { glyf_name: gid for (gid, glyf_name) in enumerate(glyph_order) }
+
+# e.g.: "uni5140 (gid 11663) -> uni5140.ss01 (gid 11664) -> uni5140 (gid 11663)"
+def format_cycle(cycle, gids={}):
+    return " -> ".join("{} (gid {})".format(glyf_name, gids[glyf_name]) if glyf_name in gids else glyf_name for glyf_name in cycle)
+
+# 循環参照があれば表示して Exception を投げる
+def check_circular_references(glyf_table, glyph_order=[]):
+    graph = ReferenceGraph(glyf_table)
+    if len(graph.cycles) > 0:
+        gids = get_glyf_gids(glyph_order)
+        for cycle in graph.cycles:
+            print("  ==> circular reference : {}".format(format_cycle(cycle, gids)))
+        raise Exception("循環参照しているグリフがあります. otfccbuild で参照が削除されます.\n  circular reference num: {}".format(len(graph.cycles)))
+    return graph
+
+def print_depth_stats(stats, label="reference depth"):
+    print("  ==> {} : max {}, {}, cyclic {}, missing {}".format(label, stats["max"], \
+            ", ".join("{}: {}".format(depth, num) for depth, num in stats["histogram"].items()), stats["cyclic"], stats["missing"]))
@@ -61,8 +61,8 @@ def expand_pattern_list2match_pattern(ALPHABET):
         match_pattern += "^{}$|".format(c) if ALPHABET[-1] != c else "^{}$".format(c)
     return ' "{}" '.format(match_pattern)
 
-def get_reversed_cmap_table():
-    output_json = os.path.join(p.DIR_TEMP, OUTPUT_JSON)
+def get_reversed_cmap_table(DIR_TEMP=p.DIR_TEMP):
+    output_json = os.path.join(DIR_TEMP, OUTPUT_JSON)
     cmap_table = get_cmap_table( output_json )
 
     reversed_cmap_table = {}
@@ -72,11 +72,11 @@ def get_reversed_cmap_table():
 
     return reversed_cmap_table
 
-def rename_cid_of_alphabet_for_pinyin(alphabet_glyf4pinyin_json):
+def rename_cid_of_alphabet_for_pinyin(alphabet_glyf4pinyin_json, DIR_TEMP=p.DIR_TEMP):
     with open(alphabet_glyf4pinyin_json, mode='r', encoding='utf-8') as read_file:
         glyf_json = json.load(read_file) 
     
-    reversed_cmap_table = get_reversed_cmap_table()
+    reversed_cmap_table = get_reversed_cmap_table(DIR_TEMP)
 
     new_glyf_json = {}
     for cid, glyf_data in glyf_json.items():
@@ -85,20 +85,21 @@ def rename_cid_of_alphabet_for_pinyin(alphabet_glyf4pinyin_json):
     with open(alphabet_glyf4pinyin_json, mode='w', encoding='utf-8') as write_file:
         json.dump(new_glyf_json, write_file, indent=4, ensure_ascii=False)
 
-def make_alphabet_glyf_json(source_font_name):
-    output_json = os.path.join(p.DIR_TEMP, OUTPUT_JSON)
+# DIR_TEMP : json の出力先 (build_daemon.py はフォントごとに別のディレクトリにする)
+def make_alphabet_glyf_json(source_font_name, DIR_TEMP=p.DIR_TEMP):
+    output_json = os.path.join(DIR_TEMP, OUTPUT_JSON)
     convert_otf2json( source_font_name, output_json )
     cmap_table = get_cmap_table( output_json )
     cid_table_of_alphabet  = [cmap_table[str(ucode)] for ucode in UNICODE_ALPHABET]
     match_pattern = expand_pattern_list2match_pattern( cid_table_of_alphabet )
     
-    alphabet_glyf4pinyin_json = os.path.join(p.DIR_TEMP, ALPHABET_FOR_PINYIN_JSON)
+    alphabet_glyf4pinyin_json = os.path.join(DIR_TEMP, ALPHABET_FOR_PINYIN_JSON)
     # match_pattern = ' "^a$|^b$" ' 
     cmd = "cat {} | jq '.glyf | with_entries(select(.key|match({})))' > {}".format(output_json, match_pattern, alphabet_glyf4pinyin_json)
     try:
         print(cmd)
         process_shell(cmd)
-        rename_cid_of_alphabet_for_pinyin(alphabet_glyf4pinyin_json)
+        rename_cid_of_alphabet_for_pinyin(alphabet_glyf4pinyin_json, DIR_TEMP)
     except Exception as e:
         print()
         print(e)
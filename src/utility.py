@@ -1,11 +1,6 @@
 # -*- coding: utf-8 -*-
 #!/usr/bin/env python
 
-import os
-import orjson
-import pinyin_getter as pg
-import path as p
-
 SIMPLED_ALPHABET = {
     "a":"a", "ā":"a1", "á":"a2", "ǎ":"a3", "à":"a4",
     "b":"b",
@@ -35,32 +30,39 @@ SIMPLED_ALPHABET = {
     "z":"z"
 }
 
-cmap_table = {}
-PINYIN_MAPPING_TABLE = pg.get_pinyin_table_with_mapping_table()
+class HanziIndex():
+    """
+    ピンインを付ける漢字の索引. ビルドごとに作って Font, GSUBTable, GlyphBudget などに渡す
+    (モジュールの変数に cmap を持たないので、同じプロセスで複数のフォントを同時にビルドできる)
+        cmap_table           : 元のフォントの cmap e.g.: {"19968": "uni4E00", ...}
+        pinyin_mapping_table : pinyin_getter.get_pinyin_table_with_mapping_table の戻り値 e.g.: {"一": ["yī", ...], ...}
+    """
 
-def get_cmap_table():
-    TAMPLATE_MAIN_JSON = os.path.join(p.DIR_TEMP, "template_main.json")
-    with open(TAMPLATE_MAIN_JSON, "rb") as read_file:
-        marged_font = orjson.loads(read_file.read())
-    cmap_table = marged_font["cmap"]
+    def __init__(self, cmap_table, pinyin_mapping_table):
+        self.cmap_table = cmap_table
+        self.PINYIN_MAPPING_TABLE = pinyin_mapping_table
+        self.single_pinyin_hanzes   = [(hanzi, pinyins) for hanzi, pinyins in pinyin_mapping_table.items() if 1 == len(pinyins)]
+        self.multiple_pinyin_hanzes = [(hanzi, pinyins) for hanzi, pinyins in pinyin_mapping_table.items() if 1 < len(pinyins)]
 
-# ピンイン表記の簡略化、e.g.: wěi -> we3i
-def simplification_pronunciation(pronunciation):
-    return  "".join( [SIMPLED_ALPHABET[c] for c in pronunciation] )
+    # ピンインが一つだけの漢字をすべて取得する
+    def get_has_single_pinyin_hanzi(self):
+        return self.single_pinyin_hanzes
 
-# ピンインが一つだけの漢字をすべて取得する
-def get_has_single_pinyin_hanzi():
-    return [(hanzi, pinyins) for hanzi, pinyins in PINYIN_MAPPING_TABLE.items() if 1 == len(pinyins)]
+    # ピンインが2つ以上の漢字をすべて取得する
+    def get_has_multiple_pinyin_hanzi(self):
+        return self.multiple_pinyin_hanzes
 
-# ピンインが2つ以上の漢字をすべて取得する
-def get_has_multiple_pinyin_hanzi():
-    return [(hanzi, pinyins) for hanzi, pinyins in PINYIN_MAPPING_TABLE.items() if 1 < len(pinyins)]
+    # 漢字から cid を取得する
+    def convert_str_hanzi_2_cid(self, str_hanzi):
+        return self.cmap_table[ str(ord(str_hanzi)) ]
 
-# 漢字から cid を取得する
-def convert_str_hanzi_2_cid(str_hanzi):
-    if len(cmap_table) == 0:
-        get_cmap_table()
-    return cmap_table[ str(ord(str_hanzi)) ]
+    # ピンインを付ける漢字か
+    def __contains__(self, hanzi):
+        return hanzi in self.PINYIN_MAPPING_TABLE
+
+# ピンイン表記の簡略化、e.g.: wěi -> we3i
+def simplification_pronunciation(pronunciation):
+    return  "".join( [SIMPLED_ALPHABET[c] for c in pronunciation] )
 
 # [階層構造のあるdictをupdateする](https://www.greptips.com/posts/1242/)
 def deepupdate(dict_base, other):
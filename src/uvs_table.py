@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import os
+
+"""
+異体字セレクタ (cmap format 14) のレコード
+
+otfcc の json の cmap_uvs は "unicode 異体字セレクタ": グリフ名 の dict で、otfccbuild は全てを Non-Default UVS
+(unicode, グリフの組を一つずつ 5 バイト) で書き出す。
+format 14 には、cmap の通常のグリフと同じになる組を unicode の範囲 (開始, 追加の数 : 4 バイト) で書ける Default UVS がある。
+元のフォントの異体字 (Adobe-Japan1 の IVS など) は通常のグリフと同じものが多いので、
+otfccbuild の後に format 14 のサブテーブルをこのレコードで書き直す (fontTools が必要)。
+
+e.g.:
+records = {
+    0xE0100: {
+        "default":     [[0x4E00, 0], [0x4E08, 2], ...],       # [開始の unicode, 追加の数 (範囲の長さ - 1)]
+        "non_default": [[0x4E0D, "uni4E0D.ss00"], ...]        # unicode の昇順
+    },
+    ...
+}
+"""
+
+# 追加の数は 1 バイト
+MAX_ADDITIONAL_COUNT = 0xFF
+
+# cmap : {"19968": "uni4E00", ...}, cmap_uvs : {"19968 917984": "uni4E00.ss00", ...}
+def get_uvs_records(cmap, cmap_uvs):
+    mappings = {}
+    for (key, glyf_name) in cmap_uvs.items():
+        (str_unicode, str_selector) = key.split(" ")
+        mappings.setdefault(int(str_selector), []).append( (int(str_unicode), glyf_name) )
+
+    records = {}
+    for selector in sorted(mappings.keys()):
+        default_ranges = []
+        non_default = []
+        for (unicode, glyf_name) in sorted(mappings[selector]):
+            if cmap.get(str(unicode)) != glyf_name:
+                non_default.append( [unicode, glyf_name] )
+                continue
+            # 直前の範囲に続くなら範囲を伸ばす
+            if len(default_ranges) > 0 and sum(default_ranges[-1]) + 1 == unicode and default_ranges[-1][1] < MAX_ADDITIONAL_COUNT:
+                default_ranges[-1][1] += 1
+            else:
+                default_ranges.append( [unicode, 0] )
+        records.update( {selector: {"default": default_ranges, "non_default": non_default}} )
+    return records
+
+# format 14 のサブテーブルのバイト数
+#   ヘッダ (10) + セレクタごとに (11) + Default UVS (4 + 範囲ごとに 4) + Non-Default UVS (4 + 組ごとに 5)
+def get_format14_size(records):
+    size = 10
+    for record in records.values():
+        size += 11
+        if len(record["default"]) > 0:
+            size += 4 + 4 * len(record["default"])
+        if len(record["non_default"]) > 0:
+            size += 4 + 5 * len(record["non_default"])
+    return size
+
+def get_uvs_stats(records):
+    default_mappings = sum(additional_count + 1 for record in records.values() for (_, additional_count) in record["default"])
+    non_default_mappings = sum(len(record["non_default"]) for record in records.values())
+    # otfccbuild と同じく、全て Non-Default UVS で書いたとき
+    explicit_size = 10 + sum(11 + 4 + 5 * (sum(additional_count + 1 for (_, additional_count) in record["default"]) + len(record["non_default"])) \
+                                for record in records.values())
+    return {
+        "selectors": len(records),
+        "default_ranges": sum(len(record["default"]) for record in records.values()),
+        "default_mappings": default_mappings,
+        "non_default_mappings": non_default_mappings,
+        "size": get_format14_size(records),
+        "explicit_size": explicit_size if len(records) > 0 else 0
+    }
+
+def print_uvs_stats(stats):
+    print("  ==> cmap format 14 : {} selectors, {} default ranges ({} mappings), {} non-default mappings, {} bytes (all non-default: {} bytes)".format( \
+            stats["selectors"], stats["default_ranges"], stats["default_mappings"], stats["non_default_mappings"], stats["size"], stats["explicit_size"]))
+
+# fontTools の uvsDict. Default UVS はグリフ名を None にする
+def get_uvs_dict(records):
+    uvs_dict = {}
+    for (selector, record) in records.items():
+        mappings = []
+        for (start, additional_count) in record["default"]:
+            mappings += [ (unicode, None) for unicode in range(start, start + additional_count + 1) ]
+        mappings += [ (unicode, glyf_name) for (unicode, glyf_name) in record["non_default"] ]
+        uvs_dict.update( {selector: mappings} )
+    return uvs_dict
+
+# TTF の format 14 のサブテーブルを records で書き直す
+def rewrite_format14(TTF, records):
+    try:
+        from fontTools.ttLib import TTFont
+        from fontTools.ttLib.tables._c_m_a_p import CmapSubtable
+    except ImportError:
+        raise Exception("cmap format 14 の書き直しには fonttools が必要です.\n  pip install fonttools")
+    font = TTFont(TTF, recalcBBoxes=False, recalcTimestamp=False)
+    glyph_order = set(font.getGlyphOrder())
+    uvs_dict = get_uvs_dict(records)
+    for mappings in uvs_dict.values():
+        for (unicode, glyf_name) in mappings:
+            if glyf_name != None and not (glyf_name in glyph_order):
+                raise Exception("異体字のグリフが見つかりません.\n  unicode: {:x}, glyf: {}".format(unicode, glyf_name))
+
+    cmap = font["cmap"]
+    cmap.tables = [table for table in cmap.tables if table.format != 14]
+    subtable = CmapSubtable.newSubtable(14)
+    (subtable.platformID, subtable.platEncID, subtable.language) = (0, 5, 0xFF)
+    subtable.cmap = {}
+    subtable.uvsDict = uvs_dict
+    cmap.tables.append(subtable)
+    cmap.tables.sort(key=lambda table: (table.platformID, table.platEncID))
+
+    TEMP_TTF = TTF + ".uvs"
+    font.save(TEMP_TTF)
+    font.close()
+    os.replace(TEMP_TTF, TTF)
+
+# otfccbuild の出力 (TTF) の format 14 を Default UVS を使って書き直す. 通常のグリフと同じ組が無ければ何もしない
+def compact_format14(font_json, TTF):
+    records = get_uvs_records(font_json["cmap"], font_json.get("cmap_uvs", {}))
+    stats = get_uvs_stats(records)
+    if stats["default_mappings"] > 0:
+        rewrite_format14(TTF, records)
+    return stats
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+import os
+import shell
+import path as p
+import config
+import glyph_prune
+import glyph_store
+import uvs_table
+
+"""
+Web 用のフォントの出力 (main.py の --woff2, --subset)
+
+字幕や読書アプリでは数 MB の ttf を丸ごと読み込むことになるので、以下を出力する
+    --woff2        : outputs/<フォント名>.woff2
+    --subset block : unicode の範囲ごとに分割した outputs/web/<フォント名>.<サブセット名>.woff2 と
+                     @font-face をまとめた outputs/web/<フォント名>.css
+    --subset frequency : 同じく、文字の頻度リスト (--frequency-list) の順に config.WEB_FONT_FREQUENCY_TIERS の文字数ずつ
+ブラウザは unicode-range に一致する文字があるサブセットだけをダウンロードする。
+
+ブラウザは unicode-range ごとに別のフォントで shaping するので、rclt のルール (e.g.: 银行) の漢字が別のサブセットにあると
+文脈が一致しない。frequency では GSUBTable のルール (ReadingRuleCompiler.get_rules) で繋がっている漢字を、
+その中で一番頻度が高い漢字のティアにまとめる。
+
+サブセットの json は、ビルドした json (marged_font) から以下を絞って作る
+    cmap, cmap_uvs        : サブセットの unicode のみ
+    glyf, glyph_order     : glyph_prune.find_reachable_glyf で到達できるグリフのみ (発音のグリフ、ssXX のグリフも含む)
+    GSUB, GPOS, GDEF      : 残したグリフだけで成り立つ lookup の subtable (文脈の漢字が別のサブセットにある rclt のルールは落ちる)
+
+WOFF2 への変換には fonttools と brotli が必要
+"""
+
+DIR_WEB = os.path.join(p.DIR_OUTPUT, "web")
+
+# サブセットの分け方
+SUBSET_MODES = ["block", "frequency"]
+
+# unicode の範囲
+def get_unicode_ranges(int_unicodes):
+    unicode_ranges = []
+    for int_unicode in sorted(int_unicodes):
+        if len(unicode_ranges) > 0 and unicode_ranges[-1][1] + 1 == int_unicode:
+            unicode_ranges[-1][1] = int_unicode
+        else:
+            unicode_ranges.append([int_unicode, int_unicode])
+    return unicode_ranges
+
+# e.g.: "U+4E00-4E5F, U+4E61"
+def get_css_unicode_range(int_unicodes):
+    css_unicode_ranges = []
+    for (start, end) in get_unicode_ranges(int_unicodes):
+        if start == end:
+            css_unicode_ranges.append("U+{:X}".format(start))
+        else:
+            css_unicode_ranges.append("U+{:X}-{:X}".format(start, end))
+    return ", ".join(css_unicode_ranges)
+
+# config.WEB_FONT_SUBSET_BLOCKS ごとに分けて、config.WEB_FONT_MAX_CHARS_PER_SUBSET 文字ずつに分割する
+# どのブロックにも含まれない unicode は "others" にまとめる
+# e.g.: [{"name": "latin", "unicodes": [32, 33, ...]}, {"name": "cjk-0", "unicodes": [...]}, ...]
+def plan_subsets_by_block(marged_font, max_chars=config.WEB_FONT_MAX_CHARS_PER_SUBSET):
+    blocks = [(name, ranges, []) for (name, ranges) in config.WEB_FONT_SUBSET_BLOCKS] + [("others", [], [])]
+    for int_unicode in sorted(int(str_oct_unicode) for str_oct_unicode in marged_font["cmap"].keys()):
+        for (_, ranges, int_unicodes) in blocks:
+            if any(start <= int_unicode <= end for (start, end) in ranges):
+                int_unicodes.append(int_unicode)
+                break
+        else:
+            blocks[-1][2].append(int_unicode)
+
+    subsets = []
+    for (name, _, int_unicodes) in blocks:
+        if len(int_unicodes) <= max_chars:
+            if len(int_unicodes) > 0:
+                subsets.append( {"name": name, "unicodes": int_unicodes} )
+            continue
+        for i in range(0, len(int_unicodes), max_chars):
+            subsets.append( {"name": "{}-{}".format(name, i // max_chars), "unicodes": int_unicodes[i:i + max_chars]} )
+    return subsets
+
+# 頻度の高い順に文字が並んだテキスト. 一行に一文字 (2 列目以降の出現回数などは無視する), # から始まる行はコメント
+def load_frequency_list(FREQUENCY_TXT):
+    hanzes = []
+    appeared_hanzes = set()
+    with open(FREQUENCY_TXT, mode='r', encoding='utf-8') as read_file:
+        for line in read_file:
+            columns = line.replace(",", " ").split()
+            if len(columns) == 0 or columns[0].startswith("#"):
+                continue
+            for hanzi in columns[0]:
+                if not (hanzi in appeared_hanzes):
+                    appeared_hanzes.add(hanzi)
+                    hanzes.append(hanzi)
+    return hanzes
+
+# rclt のルールで繋がっている文字のグループ (union-find)
+# e.g.: {"银": "行", "行": "行", "发": "行", ...} (値はグループの代表の文字)
+def get_rule_groups(reading_rules, hanzes):
+    parents = {}
+    def find(hanzi):
+        while parents.setdefault(hanzi, hanzi) != hanzi:
+            parents[hanzi] = parents[parents[hanzi]]
+            hanzi = parents[hanzi]
+        return hanzi
+    for rule in reading_rules:
+        rule_hanzes = [hanzi for hanzes_at in rule["match"] for hanzi in hanzes_at if hanzi in hanzes]
+        for hanzi in rule_hanzes:
+            parents[find(hanzi)] = find(rule_hanzes[0])
+    return { hanzi: find(hanzi) for hanzi in parents.keys() }
+
+# 頻度リストの順に config.WEB_FONT_FREQUENCY_TIERS の文字数ずつ tier-0, tier-1, ... に分ける
+# 頻度リストに無い文字は rest-0, rest-1, ... に config.WEB_FONT_MAX_CHARS_PER_SUBSET 文字ずつ分ける
+# rclt のルールで繋がっている文字は、一番頻度が高い文字のティアにまとめる (rest の分割でも分けない)
+def plan_subsets_by_frequency(marged_font, reading_rules, frequency_hanzes, \
+                              tier_sizes=config.WEB_FONT_FREQUENCY_TIERS, max_chars=config.WEB_FONT_MAX_CHARS_PER_SUBSET):
+    hanzes = set(chr(int(str_oct_unicode)) for str_oct_unicode in marged_font["cmap"].keys())
+    rest_tier = len(tier_sizes)
+
+    tiers = {}
+    frequency_hanzes = [hanzi for hanzi in frequency_hanzes if hanzi in hanzes]
+    rank = 0
+    for (tier, tier_size) in enumerate(tier_sizes):
+        for hanzi in frequency_hanzes[rank:rank + tier_size]:
+            tiers.update( {hanzi: tier} )
+        rank += tier_size
+    for hanzi in hanzes:
+        if not (hanzi in tiers):
+            tiers.update( {hanzi: rest_tier} )
+
+    # グループの中で一番前のティアに移す
+    rule_groups = get_rule_groups(reading_rules, hanzes)
+    group_tiers = {}
+    for hanzi, group in rule_groups.items():
+        group_tiers.update( {group: min(group_tiers.get(group, rest_tier), tiers[hanzi])} )
+    promoted_num = 0
+    for hanzi, group in rule_groups.items():
+        if group_tiers[group] < tiers[hanzi]:
+            tiers.update( {hanzi: group_tiers[group]} )
+            promoted_num += 1
+    print("  ==> promoted {} chars to keep {} rclt rules in one subset".format(promoted_num, len(reading_rules)))
+
+    grouped_hanzes = {}
+    for hanzi, group in rule_groups.items():
+        if tiers[hanzi] == rest_tier:
+            grouped_hanzes.setdefault(group, []).append(hanzi)
+
+    subsets = []
+    for tier in range(rest_tier):
+        int_unicodes = sorted(ord(hanzi) for hanzi, t in tiers.items() if t == tier)
+        if len(int_unicodes) > 0:
+            subsets.append( {"name": "tier-{}".format(tier), "unicodes": int_unicodes} )
+
+    # rest は unicode 順に分けるが、グループの途中では区切らない
+    chunks = [[]]
+    placed_hanzes = set()
+    for int_unicode in sorted(ord(hanzi) for hanzi, t in tiers.items() if t == rest_tier):
+        hanzi = chr(int_unicode)
+        if hanzi in placed_hanzes:
+            continue
+        group_hanzes = grouped_hanzes.get(rule_groups.get(hanzi), [hanzi])
+        if len(chunks[-1]) > 0 and len(chunks[-1]) + len(group_hanzes) > max_chars:
+            chunks.append([])
+        chunks[-1] += [ord(group_hanzi) for group_hanzi in group_hanzes]
+        placed_hanzes |= set(group_hanzes)
+    for (i, int_unicodes) in enumerate(chunks):
+        if len(int_unicodes) > 0:
+            subsets.append( {"name": "rest-{}".format(i), "unicodes": sorted(int_unicodes)} )
+    return subsets
+
+# json の中のグリフ名 (dict のキー、list の要素) のうち、kept_glyf_names に無いものを取り除く
+def filter_glyf_names(obj, glyf_names, kept_glyf_names):
+    if isinstance(obj, dict):
+        return { k: filter_glyf_names(v, glyf_names, kept_glyf_names) for k, v in obj.items()
+                    if not (k in glyf_names) or (k in kept_glyf_names) }
+    elif isinstance(obj, list):
+        return [ filter_glyf_names(v, glyf_names, kept_glyf_names) for v in obj
+                    if not (isinstance(v, str) and v in glyf_names) or (v in kept_glyf_names) ]
+    return obj
+
+# 残したグリフだけで subtable を作り直す. 空になったら None を返す
+def subset_subtable(lookup_type, subtable, glyf_names, kept_glyf_names):
+    if lookup_type == "gsub_single":
+        new_subtable = { k: v for k, v in subtable.items() if k in kept_glyf_names and v in kept_glyf_names }
+    elif lookup_type == "gsub_alternate":
+        new_subtable = {}
+        for k, v in subtable.items():
+            alternates = [glyf_name for glyf_name in v if glyf_name in kept_glyf_names]
+            if k in kept_glyf_names and len(alternates) > 0:
+                new_subtable.update( {k: alternates} )
+    elif lookup_type == "gsub_multiple":
+        new_subtable = { k: v for k, v in subtable.items() if k in kept_glyf_names and all(glyf_name in kept_glyf_names for glyf_name in v) }
+    elif lookup_type == "gsub_ligature":
+        substitutions = [ s for s in subtable.get("substitutions", [])
+                            if s["to"] in kept_glyf_names and all(glyf_name in kept_glyf_names for glyf_name in s["from"]) ]
+        new_subtable = { "substitutions": substitutions } if len(substitutions) > 0 else {}
+    elif lookup_type in ["gsub_chaining", "gpos_chaining"]:
+        # 文脈のどこかが空になるルールは一致しなくなるので落とす
+        match = [ [glyf_name for glyf_name in glyf_names_at if glyf_name in kept_glyf_names] for glyf_names_at in subtable["match"] ]
+        if any(len(glyf_names_at) == 0 for glyf_names_at in match):
+            return None
+        new_subtable = dict(subtable)
+        new_subtable.update( {"match": match} )
+    else:
+        new_subtable = filter_glyf_names(subtable, glyf_names, kept_glyf_names)
+    return new_subtable if len(new_subtable) > 0 else None
+
+# GSUB, GPOS を残したグリフだけで作り直す
+def subset_layout_table(table, glyf_names, kept_glyf_names):
+    lookups = {}
+    for lookup_name, lookup in table.get("lookups", {}).items():
+        subtables = [ subset_subtable(lookup["type"], subtable, glyf_names, kept_glyf_names) for subtable in lookup.get("subtables", []) ]
+        subtables = [ subtable for subtable in subtables if subtable != None ]
+        if len(subtables) > 0:
+            new_lookup = dict(lookup)
+            new_lookup.update( {"subtables": subtables} )
+            lookups.update( {lookup_name: new_lookup} )
+
+    # chaining から呼び出している lookup が無くなったら、その apply を外す
+    for lookup in lookups.values():
+        if not lookup["type"] in ["gsub_chaining", "gpos_chaining"]:
+            continue
+        subtables = []
+        for subtable in lookup["subtables"]:
+            # apply が空のもの (ignore のルール) はそのまま残す
+            apply = [a for a in subtable["apply"] if a["lookup"] in lookups]
+            if len(apply) > 0 or len(subtable["apply"]) == 0:
+                subtable.update( {"apply": apply} )
+                subtables.append(subtable)
+        lookup.update( {"subtables": subtables} )
+    lookups = { lookup_name: lookup for lookup_name, lookup in lookups.items() if len(lookup["subtables"]) > 0 }
+
+    features = {}
+    for feature_name, lookup_names in table.get("features", {}).items():
+        lookup_names = [lookup_name for lookup_name in lookup_names if lookup_name in lookups]
+        if len(lookup_names) > 0:
+            features.update( {feature_name: lookup_names} )
+    languages = {}
+    for language_name, language in table.get("languages", {}).items():
+        new_language = dict(language)
+        new_language.update( {"features": [feature_name for feature_name in language.get("features", []) if feature_name in features]} )
+        if "requiredFeature" in language and not (language["requiredFeature"] in features):
+            del new_language["requiredFeature"]
+        languages.update( {language_name: new_language} )
+
+    new_table = dict(table)
+    new_table.update( {
+        "languages": languages,
+        "features": features,
+        "lookups": lookups,
+        "lookupOrder": [lookup_name for lookup_name in table.get("lookupOrder", []) if lookup_name in lookups]
+    } )
+    return new_table
+
+# int_unicodes の文字だけを含むフォントの json を作る (marged_font は変更しない)
+def subset_font(marged_font, int_unicodes):
+    str_oct_unicodes = set(str(int_unicode) for int_unicode in int_unicodes)
+    glyf_table = marged_font["glyf"]
+
+    subset = { k: v for k, v in marged_font.items() if not k in ["cmap", "cmap_uvs", "glyf", "glyph_order", "GSUB", "GPOS", "GDEF"] }
+    subset["glyph_order"] = marged_font["glyph_order"]
+    subset["cmap"] = { k: v for k, v in marged_font["cmap"].items() if k in str_oct_unicodes }
+    if "cmap_uvs" in marged_font:
+        # cmap_uvs のキーは "unicode ivs"
+        subset["cmap_uvs"] = { k: v for k, v in marged_font["cmap_uvs"].items() if k.split(" ")[0] in str_oct_unicodes }
+    if "GSUB" in marged_font:
+        subset["GSUB"] = marged_font["GSUB"]
+    kept_glyf_names = glyph_prune.find_reachable_glyf(subset, glyf_table, is_keep_layout_glyf=False)
+
+    subset["glyph_order"] = [glyf_name for glyf_name in marged_font["glyph_order"] if glyf_name in kept_glyf_names]
+    subset["glyf"] = { glyf_name: glyf_table[glyf_name] for glyf_name in subset["glyph_order"] }
+    for table_name in ["GSUB", "GPOS"]:
+        if table_name in marged_font:
+            subset[table_name] = subset_layout_table(marged_font[table_name], glyf_table, kept_glyf_names)
+    if "GDEF" in marged_font:
+        subset["GDEF"] = filter_glyf_names(marged_font["GDEF"], glyf_table, kept_glyf_names)
+    return subset
+
+def count_chaining_rules(font):
+    lookups = font.get("GSUB", {}).get("lookups", {})
+    return sum(len(lookup["subtables"]) for lookup in lookups.values() if lookup["type"] == "gsub_chaining")
+
+def convert_ttf2woff2(TTF, WOFF2):
+    try:
+        from fontTools.ttLib import TTFont
+        import brotli
+    except ImportError:
+        raise Exception("WOFF2 の出力には fonttools と brotli が必要です.\n  pip install fonttools brotli")
+    # head.modified は ttf のまま (build_fingerprint.py)
+    font = TTFont(TTF, recalcTimestamp=False)
+    font.flavor = "woff2"
+    font.save(WOFF2)
+    font.close()
+
+def convert_json2ttf(TAMPLATE_JSON, OUTPUT_FONT):
+    cmd = "otfccbuild {} -o {} --keep-modified-time".format(TAMPLATE_JSON, OUTPUT_FONT)
+    print(cmd)
+    shell.process(cmd)
+
+# e.g.: Mengshen-HanSerif.ttf -> Mengshen-HanSerif.woff2
+def make_woff2(OUTPUT_FONT):
+    OUTPUT_WOFF2 = os.path.splitext(OUTPUT_FONT)[0] + ".woff2"
+    convert_ttf2woff2(OUTPUT_FONT, OUTPUT_WOFF2)
+    print("  ==> {} : {} bytes".format(OUTPUT_WOFF2, os.path.getsize(OUTPUT_WOFF2)))
+    return OUTPUT_WOFF2
+
+def make_css(font_family, subsets):
+    css = []
+    for subset in subsets:
+        # 異体字セレクタ (U+E01E0~) は親文字と同じフォントで解決されるので unicode-range には含めない
+        css.append("/* {} : {} chars, {} glyphs */".format(subset["name"], len(subset["unicodes"]), subset["glyf_num"]))
+        css.append("@font-face {")
+        css.append("  font-family: \"{}\";".format(font_family))
+        css.append("  font-style: normal;")
+        css.append("  font-weight: 400;")
+        css.append("  font-display: swap;")
+        css.append("  src: url(\"./{}\") format(\"woff2\");".format(subset["file_name"]))
+        css.append("  unicode-range: {};".format(get_css_unicode_range(subset["unicodes"])))
+        css.append("}")
+    return "\n".join(css) + "\n"
+
+# subsets : plan_subsets_by_block などの結果
+# DIR_SCRATCH : サブセットの json, ttf を一時的に置くディレクトリ
+def make_subsets(marged_font, OUTPUT_FONT, subsets, DIR_OUTPUT_WEB=DIR_WEB, DIR_SCRATCH=p.DIR_TEMP):
+    if not os.path.exists(DIR_OUTPUT_WEB):
+        os.makedirs(DIR_OUTPUT_WEB)
+    font_family = os.path.splitext(os.path.basename(OUTPUT_FONT))[0]
+    all_chaining_rules = count_chaining_rules(marged_font)
+    TAMPLATE_SUBSET_JSON = os.path.join(DIR_SCRATCH, "template_subset.json")
+    for subset in subsets:
+        subset_json = subset_font(marged_font, subset["unicodes"])
+        glyph_store.save_font(subset_json, TAMPLATE_SUBSET_JSON)
+        subset_ttf = os.path.join(DIR_SCRATCH, "{}.{}.ttf".format(font_family, subset["name"]))
+        convert_json2ttf(TAMPLATE_SUBSET_JSON, subset_ttf)
+        uvs_table.compact_format14(subset_json, subset_ttf)
+        subset.update( {
+            "file_name": "{}.{}.woff2".format(font_family, subset["name"]),
+            "glyf_num": len(subset_json["glyf"]),
+        } )
+        subset_woff2 = os.path.join(DIR_OUTPUT_WEB, subset["file_name"])
+        convert_ttf2woff2(subset_ttf, subset_woff2)
+        os.remove(subset_ttf)
+        print("  ==> {} : {} chars, {} glyphs, {}/{} rclt rules, {} bytes".format(subset["file_name"], len(subset["unicodes"]), \
+                subset["glyf_num"], count_chaining_rules(subset_json), all_chaining_rules, os.path.getsize(subset_woff2)))
+    os.remove(TAMPLATE_SUBSET_JSON)
+
+    OUTPUT_CSS = os.path.join(DIR_OUTPUT_WEB, "{}.css".format(font_family))
+    with open(OUTPUT_CSS, mode='w', encoding='utf-8') as f:
+        f.write(make_css(font_family, subsets))
+    print("  ==> {} : {} subsets".format(OUTPUT_CSS, len(subsets)))
+    return OUTPUT_CSS
+
+# reading_rules : ReadingRuleCompiler.get_rules (frequency のときに使う)
+def plan_subsets(marged_font, mode, reading_rules=[], FREQUENCY_TXT=None):
+    if mode == "block":
+        return plan_subsets_by_block(marged_font)
+    elif mode == "frequency":
+        if FREQUENCY_TXT == None:
+            raise Exception("--subset frequency には頻度リスト (--frequency-list) が必要です.")
+        return plan_subsets_by_frequency(marged_font, reading_rules, load_frequency_list(FREQUENCY_TXT))
+    raise Exception("サブセットの分け方が不正です.\n  mode: {}".format(mode))
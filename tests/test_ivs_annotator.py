@@ -0,0 +1,53 @@
+# python3 -m pytest tests
+
+import io
+import os
+import sys
+import random
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import reading_index as ri
+import ivs_annotator as ia
+
+READING_INDEX = ri.load_reading_index()
+
+# ルールの文字を多めにした、ルールにマッチしやすい文字列
+def make_random_texts(count, seed=0):
+    rnd = random.Random(seed)
+    rules = rnd.sample(READING_INDEX.rules, 30)
+    characters = sorted(set( hanzi for rule in rules for hanzes in rule["match"] for hanzi in hanzes )) + ["一", "。", "a", " "]
+    return [ "".join(rnd.choice(characters) for _ in range(rnd.randint(0, 40))) for _ in range(count) ]
+
+def test_annotate_text():
+    annotator = ia.IvsAnnotator(READING_INDEX)
+    assert annotator.annotate_text("银行") == "银行" + ri.get_selector(2)
+    assert annotator.annotate_text("") == ""
+    assert annotator.annotate_text("一") == "一"
+
+def test_all_selectors():
+    annotator = ia.IvsAnnotator(READING_INDEX, all_selectors=True)
+    assert annotator.annotate_text("行走") == "行" + ri.get_selector(1) + "走"
+
+# チャンクの境界によらず、文字列全体を一度に処理したときと同じ
+def test_one_character_chunks():
+    for all_selectors in [False, True]:
+        annotator = ia.IvsAnnotator(READING_INDEX, all_selectors)
+        for text in make_random_texts(200):
+            assert "".join(annotator.annotate(iter(text))) == annotator.annotate_text(text), text
+
+# 異体字セレクタが付いている文字はそのままなので、もう一度実行しても変わらない
+def test_annotate_twice():
+    for all_selectors in [False, True]:
+        annotator = ia.IvsAnnotator(READING_INDEX, all_selectors)
+        for text in make_random_texts(200, seed=1):
+            annotated = annotator.annotate_text(text)
+            assert annotator.annotate_text(annotated) == annotated, text
+
+# UTF-8 の文字がチャンクの境界で分かれても同じ
+def test_annotate_file():
+    annotator = ia.IvsAnnotator(READING_INDEX)
+    text = "".join(make_random_texts(50, seed=2))
+    output_file = io.BytesIO()
+    annotator.annotate_file(io.BytesIO(text.encode("utf-8")), output_file, chunk_size=1)
+    assert output_file.getvalue().decode("utf-8") == annotator.annotate_text(text)
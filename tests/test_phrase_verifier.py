@@ -0,0 +1,52 @@
+# python3 -m pytest tests
+
+import os
+import sys
+import asyncio
+import threading
+import http.server
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+import pinyin_scraper as ps
+import phrase_verifier as pv
+import pinyin_stub_server as stub
+
+ENTRY = {"phrase": "重版", "pinyins": ["chóng", "bǎn"], "file": "phrase_of_pattern_one.txt", "line": 1}
+
+# stub_args で起動したスタブのサーバーで ENTRY を検証した baidu の結果
+def verify_with_stub(stub_args):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), stub.StubHandler)
+    server.options = stub.parse_args(stub_args)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    sources = ps.replace_urls(["baidu=http://127.0.0.1:{}/baidu/{{}}".format(server.server_address[1])])
+    async def run():
+        async with ps.PinyinScraper(sources, None, retries=0) as scraper:
+            verifier = pv.PhraseVerifier(scraper, {}, ["baidu"])
+            return (await verifier.verify([ENTRY]))[0]["baidu"]
+    try:
+        return asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+# 403 (アクセスを拒否された) は単語が無いのではなく、取得できなかった
+def test_forbidden_is_error():
+    result = verify_with_stub(["--fail-rate", "1", "--fail-status", "403"])
+    assert result["verdict"] == pv.ERROR
+    assert "HTTP 403" in result["message"]
+    assert result["latency"] == None
+
+def test_not_found():
+    result = verify_with_stub([])
+    assert result["verdict"] == pv.NOT_FOUND
+
+# 単語が無いときは、時間を nan にして表示する
+def test_summary_without_phrases(capsys):
+    scraper_stats = {"requests": 0, "cache_hits": 0, "retries": 0, "failures": 0}
+    report = pv.make_report([], [], pv.SOURCES, 0.0, scraper_stats)
+    assert report["summary"]["sources"]["baidu"]["turnaround"] == None
+    pv.print_summary(report)
+    assert "0 phrases" in capsys.readouterr().out
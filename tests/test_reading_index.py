@@ -0,0 +1,63 @@
+# python3 -m pytest tests
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import reading_index as ri
+
+PINYIN_MAPPING_TABLE = {
+    "行": ["xíng", "háng", "héng", "xìng", "hàng"],
+    "长": ["cháng", "zhǎng"],
+    "银": ["yín"]
+}
+
+def make_rule(match, applies, input_begins, input_ends):
+    return {"match": match, "apply": [ {"at": at, "ss": ss} for (at, ss) in applies ], "inputBegins": input_begins, "inputEnds": input_ends, "source": ""}
+
+# 银~ (行 -> háng)
+RULE_YINHANG = make_rule([["银"], ["行"]], [(1, 2)], 1, 2)
+# 行~ (长 -> zhǎng). 前の文脈は 行
+RULE_HANGZHANG = make_rule([["行"], ["长"]], [(1, 2)], 1, 2)
+
+def get_ss_numbers(index, text):
+    return { pos: ss_number for (pos, (ss_number, _)) in index.find_substitutions(text).items() }
+
+def test_shipped_rules():
+    index = ri.load_reading_index()
+    substitutions = index.find_substitutions("银行")
+    assert list(substitutions.keys()) == [1]
+    (ss_number, rule) = substitutions[1]
+    assert ss_number == 2
+    assert "银" in rule["match"][0]
+    assert get_ss_numbers(index, "银行行业") == {1: 2, 2: 2}
+
+def test_backtrack_context():
+    index = ri.ReadingIndex([RULE_YINHANG, RULE_HANGZHANG], PINYIN_MAPPING_TABLE)
+    assert get_ss_numbers(index, "行长") == {1: 2}
+    # 行 は 银~ で置き換え済みなので、行~ の前の文脈にマッチしない
+    assert get_ss_numbers(index, "银行长") == {1: 2}
+
+# 同じ位置から始まるルールは、最初にマッチしたものだけを適用する
+def test_first_match_wins():
+    rule_ss03 = make_rule([["银"], ["行"]], [(1, 3)], 1, 2)
+    assert get_ss_numbers(ri.ReadingIndex([RULE_YINHANG, rule_ss03], PINYIN_MAPPING_TABLE), "银行") == {1: 2}
+    assert get_ss_numbers(ri.ReadingIndex([rule_ss03, RULE_YINHANG], PINYIN_MAPPING_TABLE), "银行") == {1: 3}
+    # ignore のルールが先なら何もしない
+    ignore_rule = make_rule([["银"], ["行"], ["长"]], [], 1, 2)
+    index = ri.ReadingIndex([ignore_rule, RULE_YINHANG], PINYIN_MAPPING_TABLE)
+    assert get_ss_numbers(index, "银行长") == {}
+    assert get_ss_numbers(index, "银行") == {1: 2}
+
+# マッチしたら入力の終わりの次の位置から続ける
+def test_scan_skips_input():
+    lookahead_rule = make_rule([["行"], ["行"]], [(0, 2)], 0, 1)
+    assert get_ss_numbers(ri.ReadingIndex([lookahead_rule], PINYIN_MAPPING_TABLE), "行行行") == {0: 2, 1: 2}
+    input_rule = make_rule([["行"], ["行"]], [(0, 2)], 0, 2)
+    assert get_ss_numbers(ri.ReadingIndex([input_rule], PINYIN_MAPPING_TABLE), "行行行") == {0: 2}
+
+def test_selector_does_not_match():
+    index = ri.ReadingIndex([RULE_YINHANG], PINYIN_MAPPING_TABLE)
+    assert get_ss_numbers(index, "银行" + ri.get_selector(1)) == {}
+    assert get_ss_numbers(index, "银" + ri.get_selector(1) + "行") == {}
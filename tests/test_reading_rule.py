@@ -0,0 +1,99 @@
+# python3 -m pytest tests
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import path as p
+import pinyin_getter as pg
+import reading_rule as rr
+
+PINYIN_MAPPING_TABLE = {
+    "阿": ["ā", "ē", "à"],
+    "种": ["zhǒng", "chóng", "zhòng"],
+    "行": ["xíng", "háng", "héng", "xìng", "hàng"],
+    "胶": ["jiāo"],
+    "谀": ["yú"],
+    "银": ["yín"],
+    "子": ["zǐ", "zi"],
+    "地": ["dì", "de"],
+    "走": ["zǒu"]
+}
+
+def to_cid(hanzi):
+    return "uni{:04X}".format(ord(hanzi))
+
+# PATTERN_ONE_TXT の行から ReadingRuleCompiler を作る
+def make_compiler(tmp_path, lines):
+    PATTERN_ONE_TXT = os.path.join(tmp_path, "duoyinzi_pattern_one.txt")
+    with open(PATTERN_ONE_TXT, mode='w', encoding='utf-8') as write_file:
+        write_file.write("\n".join(lines) + "\n")
+    reading_rule = rr.ReadingRuleCompiler(PINYIN_MAPPING_TABLE)
+    reading_rule.load_pattern_one(PATTERN_ONE_TXT)
+    return reading_rule
+
+def get_phrase(rule):
+    return "".join(hanzes[0] for hanzes in rule["match"])
+
+# 阿谀 と 胶阿谀 なら、長い 胶阿谀 のルールが先に試される
+def test_longer_rule_comes_first(tmp_path):
+    reading_rule = make_compiler(tmp_path, ["2, 阿, ē, [~谀]", "3, 阿, à, [胶~谀]"])
+    assert [get_phrase(rule) for rule in reading_rule.get_rules()] == ["阿谀", "胶阿谀"]
+    assert [get_phrase(rule) for rule in reading_rule.get_sorted_rules()] == ["胶阿谀", "阿谀"]
+    subtables = reading_rule.compile(to_cid)[rr.LOOKUP_CHAINING]["subtables"]
+    assert [subtable["match"] for subtable in subtables] == [
+        [["uni80F6"], ["uni963F"], ["uni8C00"]],
+        [["uni963F"], ["uni8C00"]]
+    ]
+    assert subtables[0]["apply"] == [ {"at": 1, "lookup": "lookup_pattern_ss03"} ]
+    assert subtables[1]["apply"] == [ {"at": 0, "lookup": "lookup_pattern_ss02"} ]
+
+# 同じ長さなら追加した順
+def test_same_length_keeps_order(tmp_path):
+    reading_rule = make_compiler(tmp_path, ["2, 行, háng, [银~]", "3, 种, zhòng, [~地]"])
+    assert [get_phrase(rule) for rule in reading_rule.get_sorted_rules()] == ["银行", "种地"]
+
+# 標準の読みのパターン 银~子 は異読のパターン 银~ を含むので、ignore のルールになって先に試される
+def test_ignore_rule_for_default_reading(tmp_path):
+    reading_rule = make_compiler(tmp_path, ["1, 行, xíng, [银~子|~走]", "2, 行, háng, [银~]"])
+    rules = reading_rule.get_sorted_rules()
+    assert [get_phrase(rule) for rule in rules] == ["银行子", "银行"]
+    assert rules[0]["apply"] == []
+    assert (rules[0]["inputBegins"], rules[0]["inputEnds"]) == (1, 2)
+    # 異読のパターンを含まない ~走 は何もしない
+    subtables = reading_rule.compile(to_cid)[rr.LOOKUP_CHAINING]["subtables"]
+    assert subtables[0] == {"match": [["uni94F6"], ["uni884C"], ["uni5B50"]], "apply": [], "inputBegins": 1, "inputEnds": 2}
+
+def test_is_contained_pattern():
+    reading_rule = rr.ReadingRuleCompiler(PINYIN_MAPPING_TABLE)
+    assert reading_rule.is_contained_pattern("银~", "银~子")
+    assert not reading_rule.is_contained_pattern("~子", "银子~")
+    assert not reading_rule.is_contained_pattern("银~", "银~")
+
+# ss の番号はマッピングテーブルの位置 + 1 (PATTERN_ONE_TXT の番号は使わない)
+def test_substitution_lookup_follows_mapping_table(tmp_path):
+    reading_rule = make_compiler(tmp_path, ["2, 种, zhòng, [~地]", "2, 行, hàng, [~子]"])
+    lookups = reading_rule.compile(to_cid)
+    assert list(lookups.keys()) == [rr.LOOKUP_CHAINING, "lookup_pattern_ss03", "lookup_pattern_ss05"]
+    assert lookups["lookup_pattern_ss03"] == {"type": "gsub_single", "flags": {}, "subtables": [ {"uni79CD": "uni79CD.ss03"} ]}
+    assert lookups["lookup_pattern_ss05"]["subtables"] == [ {"uni884C": "uni884C.ss05"} ]
+    subtables = lookups[rr.LOOKUP_CHAINING]["subtables"]
+    assert subtables[0]["apply"] == [ {"at": 0, "lookup": "lookup_pattern_ss03"} ]
+    assert rr.get_ss_number("uni79CD.ss03") == PINYIN_MAPPING_TABLE["种"].index("zhòng") + 1
+
+def test_unknown_pinyin_is_error(tmp_path):
+    try:
+        make_compiler(tmp_path, ["1, 种, zhàng, [~地]"])
+    except Exception as e:
+        assert "zhàng" in str(e)
+    else:
+        assert False
+
+# outputs/duoyinzi_pattern_one.txt の番号は ss の番号と同じ (e.g.: 3, 种, zhòng)
+def test_shipped_pattern_one_order_is_ss_number():
+    reading_rule = rr.ReadingRuleCompiler(pg.get_pinyin_table_with_mapping_table())
+    with open(os.path.join(p.DIR_OUTPUT, "duoyinzi_pattern_one.txt"), mode='r', encoding='utf-8') as read_file:
+        for line in read_file:
+            [order, hanzi, pinyin, _] = line.rstrip('\n').split(', ')
+            assert int(order) == reading_rule.get_ss_number_of_pinyin(hanzi, pinyin), line
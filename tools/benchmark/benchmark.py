@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 tools/benchmark/make_fixtures.py
+# python3 tools/benchmark/benchmark.py --save-baseline
+# python3 tools/benchmark/benchmark.py --check
+
+"""
+フォントのビルドの各処理のベンチマーク
+
+fixture (make_fixtures.py で作成) ごとに以下の処理を計測する
+    mapping_table  : pinyin_getter.get_pinyin_table_with_mapping_table
+    load_json      : Font.load_json
+    pronunciation  : PinyinGlyph.add_references_of_pronunciation
+    glyf           : Font.add_glyf
+    GSUB           : GSUBTable (load_pattern_table + generate_GSUB_table)
+    metrics        : Font.set_about_size (合成グリフのバウンディングボックス)
+    save_as_json   : Font.save_as_json
+    geometry       : glyph_geometry.ContourSet (全グリフの輪郭の変換 + バウンディングボックス + 面積)
+    reference_graph: reference_graph.check_circular_references (合成グリフの参照の深さ、循環参照)
+
+各処理は --repeat 回実行して最小値を結果とする。
+--save-baseline で結果を baseline.json に保存し、--check で baseline より --tolerance 以上遅くなった処理があれば失敗する。
+baseline は計測したマシンに依存するので、比較は同じマシン（CI の runner など）で行うこと。
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import orjson
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), "../../src")))
+import config
+import utility
+import pinyin_getter as pg
+import pinyin_glyph as py_glyph
+import GSUB_table as gt
+import font as ft
+import glyph_store
+import font_sources
+import glyph_geometry
+import reference_graph
+import make_fixtures as mf
+
+BASELINE_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# baseline より 25% 以上遅くなったら失敗にする
+DEFAULT_TOLERANCE = 0.25
+
+class Fixture():
+
+    def __init__(self, fixture):
+        self.name = fixture
+        fixture_dir = mf.get_fixture_dir(fixture)
+        self.TAMPLATE_MAIN_JSON       = os.path.join(fixture_dir, "template_main.json")
+        self.TAMPLATE_GLYF_JSON       = os.path.join(fixture_dir, "template_glyf.json")
+        self.ALPHABET_FOR_PINYIN_JSON = os.path.join(fixture_dir, "alphabet4pinyin.json")
+        self.PATTERN_ONE_TXT          = os.path.join(fixture_dir, mf.PATTERN_ONE_TXT)
+        self.PATTERN_TWO_JSON         = os.path.join(fixture_dir, mf.PATTERN_TWO_JSON)
+        self.EXCEPTION_PATTERN_JSON   = os.path.join(fixture_dir, mf.EXCEPTION_PATTERN_JSON)
+
+    def exists(self):
+        return os.path.exists(self.TAMPLATE_MAIN_JSON)
+
+    # フォントに無い漢字はマッピングテーブルから除外する
+    def setup(self):
+        with open(self.TAMPLATE_MAIN_JSON, "rb") as read_file:
+            cmap = orjson.loads(read_file.read())["cmap"]
+        self.pinyin_mapping_table = { hanzi: pinyins for hanzi, pinyins in pg.get_pinyin_table_with_mapping_table().items() if str(ord(hanzi)) in cmap }
+        self.hanzi_index = utility.HanziIndex(cmap, self.pinyin_mapping_table)
+
+    def make_font(self):
+        return ft.Font( self.TAMPLATE_MAIN_JSON, self.TAMPLATE_GLYF_JSON, self.ALPHABET_FOR_PINYIN_JSON, \
+                        self.PATTERN_ONE_TXT, self.PATTERN_TWO_JSON, self.EXCEPTION_PATTERN_JSON, config.HAN_SERIF_TYPE, \
+                        pinyin_mapping_table=self.pinyin_mapping_table )
+
+# setup() の後に target() を計測する
+def measure(setup, target, repeat):
+    results = []
+    for _ in range(repeat):
+        context = setup()
+        start = time.perf_counter()
+        target(context)
+        results.append(time.perf_counter() - start)
+    return min(results)
+
+def bench_mapping_table(fixture, repeat):
+    return measure(lambda: None, lambda _: pg.get_pinyin_table_with_mapping_table(), repeat)
+
+def bench_load_json(fixture, repeat):
+    setup = lambda: ft.Font.__new__(ft.Font)
+    def target(font):
+        font.TAMPLATE_MAIN_JSON = fixture.TAMPLATE_MAIN_JSON
+        font.TAMPLATE_GLYF_JSON = fixture.TAMPLATE_GLYF_JSON
+        font.glyph_cache_mb = None
+        font.sources = font_sources.FileSources()
+        font.load_json()
+    return measure(setup, target, repeat)
+
+def bench_pronunciation(fixture, repeat):
+    setup = lambda: py_glyph.PinyinGlyph(fixture.TAMPLATE_MAIN_JSON, fixture.ALPHABET_FOR_PINYIN_JSON, config.HAN_SERIF_TYPE, \
+                                            pinyin_mapping_table=fixture.pinyin_mapping_table)
+    return measure(setup, lambda pinyin_glyph: pinyin_glyph.add_references_of_pronunciation(), repeat)
+
+def bench_glyf(fixture, repeat):
+    def setup():
+        font = fixture.make_font()
+        font.add_cmap_uvs()
+        font.add_glyph_order()
+        return font
+    return measure(setup, lambda font: font.add_glyf(), repeat)
+
+def bench_GSUB(fixture, repeat):
+    target = lambda _: gt.GSUBTable({}, fixture.PATTERN_ONE_TXT, fixture.PATTERN_TWO_JSON, fixture.EXCEPTION_PATTERN_JSON, fixture.hanzi_index)
+    return measure(lambda: None, target, repeat)
+
+# save_as_json と同じ状態のフォントを作る
+def make_built_font(fixture):
+    font = fixture.make_font()
+    font.add_cmap_uvs()
+    font.add_glyph_order()
+    font.add_glyf()
+    font.add_GSUB()
+    return font
+
+def bench_metrics(fixture, repeat):
+    return measure(lambda: make_built_font(fixture), lambda font: font.set_about_size(), repeat)
+
+def bench_save_as_json(fixture, repeat):
+    setup = lambda: make_built_font(fixture)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        return measure(setup, lambda font: font.save_as_json(os.path.join(temp_dir, "template.json")), repeat)
+
+def bench_geometry(fixture, repeat):
+    setup = lambda: glyph_store.load_glyf_table(fixture.TAMPLATE_GLYF_JSON)
+    def target(glyf_table):
+        contour_set = glyph_geometry.ContourSet.from_glyf_table(glyf_table)
+        contour_set.get_bboxes()
+        contour_set.get_areas()
+    return measure(setup, target, repeat)
+
+def bench_reference_graph(fixture, repeat):
+    target = lambda font: reference_graph.check_circular_references(font.marged_font["glyf"], font.marged_font["glyph_order"])
+    return measure(lambda: make_built_font(fixture), target, repeat)
+
+BENCHMARKS = {
+    "mapping_table": bench_mapping_table,
+    "load_json":     bench_load_json,
+    "pronunciation": bench_pronunciation,
+    "glyf":          bench_glyf,
+    "GSUB":          bench_GSUB,
+    "metrics":       bench_metrics,
+    "save_as_json":  bench_save_as_json,
+    "geometry":      bench_geometry,
+    "reference_graph": bench_reference_graph,
+}
+
+def run(fixtures, benchmarks, repeat):
+    results = {}
+    for fixture_name in fixtures:
+        fixture = Fixture(fixture_name)
+        if not fixture.exists():
+            print("skip {}: fixture が見つかりません. tools/benchmark/make_fixtures.py を実行してください".format(fixture_name))
+            continue
+        fixture.setup()
+        results[fixture_name] = {}
+        for benchmark in benchmarks:
+            results[fixture_name][benchmark] = round(BENCHMARKS[benchmark](fixture, repeat), 6)
+    return results
+
+def print_results(results, baseline):
+    for fixture_name, result in results.items():
+        print(fixture_name)
+        for benchmark, seconds in result.items():
+            base = baseline.get(fixture_name, {}).get(benchmark)
+            ratio = "" if base == None else "  ({:+.1f}% vs baseline)".format((seconds / base - 1) * 100)
+            print("  {:<16} {:>10.4f}s{}".format(benchmark, seconds, ratio))
+
+# baseline に対して tolerance 以上遅くなった処理を返す
+def get_regressions(results, baseline, tolerance):
+    regressions = []
+    for fixture_name, result in results.items():
+        for benchmark, seconds in result.items():
+            base = baseline.get(fixture_name, {}).get(benchmark)
+            if base != None and seconds > base * (1 + tolerance):
+                regressions.append( (fixture_name, benchmark, base, seconds) )
+    return regressions
+
+def load_baseline(BASELINE):
+    if not os.path.exists(BASELINE):
+        return {}
+    with open(BASELINE, "rb") as read_file:
+        return orjson.loads(read_file.read())
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the font build pipeline")
+    parser.add_argument('-f', '--fixture', choices=mf.FIXTURES, action='append', default=None)
+    parser.add_argument('-b', '--benchmark', choices=list(BENCHMARKS.keys()), action='append', default=None)
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE_JSON)
+    parser.add_argument('--save-baseline', action='store_true', help="Save the results as the baseline")
+    parser.add_argument('--check', action='store_true', help="Fail if a benchmark is slower than the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('-o', '--output', default=None, help="Write the results as json")
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(args)
+    fixtures   = options.fixture   if options.fixture   != None else mf.FIXTURES
+    benchmarks = options.benchmark if options.benchmark != None else list(BENCHMARKS.keys())
+
+    results  = run(fixtures, benchmarks, options.repeat)
+    baseline = load_baseline(options.baseline)
+    print_results(results, baseline)
+
+    if options.output != None:
+        mf.save_json(results, options.output)
+    if options.save_baseline:
+        utility.deepupdate(baseline, results)
+        mf.save_json(baseline, options.baseline)
+        print("saved baseline: {}".format(options.baseline))
+    if options.check:
+        regressions = get_regressions(results, baseline, options.tolerance)
+        for (fixture_name, benchmark, base, seconds) in regressions:
+            print("regression: {} {} {:.4f}s -> {:.4f}s".format(fixture_name, benchmark, base, seconds))
+        if len(regressions) > 0:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 tools/benchmark/make_fixtures.py
+# python3 tools/benchmark/make_fixtures.py --fixture synthetic --hanzi 2000
+
+"""
+ベンチマーク用のフォントの json (fixture) を作成する. ネットワークは使わない.
+
+synthetic : マッピングテーブルの漢字から、四角形の輪郭だけの漢字グリフとピンイン用のグリフを生成する
+sawarabi  : res/fonts/SawarabiMincho-Regular.ttf と res/fonts/han-serif/mplus-1m-medium.ttf を otfccdump する (otfcc が必要)
+
+fixture はそれぞれ tmp/benchmark/<fixture>/ に出力する
+    template_main.json, template_glyf.json, alphabet4pinyin.json,
+    duoyinzi_pattern_one.txt, duoyinzi_pattern_two.json, duoyinzi_exceptional_pattern.json
+多音字のパターンは、fixture の cmap に含まれる漢字だけで構成されるものに絞る
+"""
+
+import os
+import sys
+import argparse
+import orjson
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), "../../src")))
+import shell
+import path as p
+import utility
+import pinyin_getter as pg
+import retrieve_latin_alphabet
+import glyph_store
+
+DIR_FIXTURE = os.path.normpath(os.path.join(p.DIR, "../tmp/benchmark"))
+
+FIXTURES = ["synthetic", "sawarabi"]
+
+SAWARABI_MAIN   = os.path.normpath(os.path.join(p.DIR, "../res/fonts/SawarabiMincho-Regular.ttf"))
+SAWARABI_PINYIN = os.path.normpath(os.path.join(p.DIR_FONT_FOR_HAN_SERIF, "mplus-1m-medium.ttf"))
+
+PATTERN_ONE_TXT        = "duoyinzi_pattern_one.txt"
+PATTERN_TWO_JSON       = "duoyinzi_pattern_two.json"
+EXCEPTION_PATTERN_JSON = "duoyinzi_exceptional_pattern.json"
+
+def get_fixture_dir(fixture):
+    return os.path.join(DIR_FIXTURE, fixture)
+
+def save_json(obj, file_path):
+    with open(file_path, "wb") as f:
+        f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+
+def load_json(file_path):
+    with open(file_path, "rb") as f:
+        return orjson.loads(f.read())
+
+# 四角形の輪郭. 重複したグリフにならないように、漢字ごとに一点だけ座標を変える
+def make_square_contours(seed, size):
+    return [[
+        {"x": 100,                          "y": 100,                                "on": True},
+        {"x": 100,                          "y": size - 100,                         "on": True},
+        {"x": size - 100,                   "y": size - 100,                         "on": True},
+        {"x": 200 + seed % (size - 400),    "y": 200 + seed // (size - 400) % (size - 400), "on": True}
+    ]]
+
+def make_synthetic_fixture(fixture_dir, num_of_hanzi):
+    # パターンの文脈の漢字も含めるため、マッピングテーブルの漢字を全て使う. num_of_hanzi が指定されていれば先頭から絞る
+    hanzes = list(pg.get_pinyin_table_with_mapping_table().keys())
+    if "一" in hanzes:
+        hanzes.remove("一")
+    hanzes = ["一"] + hanzes
+    if num_of_hanzi != None:
+        hanzes = hanzes[:num_of_hanzi]
+
+    cmap = {}
+    main_glyf = {}
+    substance_glyf = {}
+    glyph_order = [".notdef"]
+    main_glyf.update( {".notdef": {"advanceWidth": 1000, "advanceHeight": 1000, "verticalOrigin": 880, "contours": []}} )
+    substance_glyf.update( {".notdef": {"advanceWidth": 1000, "advanceHeight": 1000, "verticalOrigin": 880}} )
+    for hanzi in hanzes:
+        glyf_name = "uni{:04X}".format(ord(hanzi))
+        cmap.update( {str(ord(hanzi)): glyf_name} )
+        glyph_order.append(glyf_name)
+        main_glyf.update( {glyf_name: {"advanceWidth": 1000, "advanceHeight": 1000, "verticalOrigin": 880, "contours": []}} )
+        substance_glyf.update( {glyf_name: {"advanceWidth": 1000, "advanceHeight": 1000, "verticalOrigin": 880,
+                                            "contours": make_square_contours(ord(hanzi), 1000)}} )
+
+    template_main = {
+        "head": {"unitsPerEm": 1000, "yMax": 880, "fontRevision": 1},
+        "hhea": {"ascender": 880, "descender": -120},
+        "OS_2": {"usWinAscent": 880, "usWinDescent": 120},
+        "name": [],
+        "cmap": cmap,
+        "glyf": main_glyf,
+        "glyph_order": glyph_order,
+        "GSUB": {}
+    }
+    alphabet = {}
+    for simpled_alphabet in set(utility.SIMPLED_ALPHABET.values()):
+        alphabet.update( {"py_alphablet_{}".format(simpled_alphabet): {
+            "advanceWidth": 500, "advanceHeight": 1000, "verticalOrigin": 860,
+            "contours": make_square_contours(ord(simpled_alphabet[0]), 500)}} )
+
+    save_json(template_main,  os.path.join(fixture_dir, "template_main.json"))
+    glyph_store.save_glyf_table(substance_glyf, os.path.join(fixture_dir, "template_glyf.json"))
+    save_json(alphabet,       os.path.join(fixture_dir, "alphabet4pinyin.json"))
+
+def make_sawarabi_fixture(fixture_dir):
+    dump_json = os.path.join(fixture_dir, "dump.json")
+    shell.process("otfccdump -o {} {}".format(dump_json, SAWARABI_MAIN))
+    font = load_json(dump_json)
+    substance_glyf = font["glyf"]
+    font["glyf"] = { glyf_name: {k: v for k, v in glyf_data.items() if k != "contours"} for glyf_name, glyf_data in substance_glyf.items() }
+    save_json(font,           os.path.join(fixture_dir, "template_main.json"))
+    glyph_store.save_glyf_table(substance_glyf, os.path.join(fixture_dir, "template_glyf.json"))
+
+    shell.process("otfccdump -o {} {}".format(dump_json, SAWARABI_PINYIN))
+    font = load_json(dump_json)
+    alphabet = {}
+    for ucode in retrieve_latin_alphabet.UNICODE_ALPHABET:
+        cid = font["cmap"][str(ucode)]
+        alphabet.update( {"py_alphablet_" + utility.SIMPLED_ALPHABET[chr(ucode)]: font["glyf"][cid]} )
+    save_json(alphabet, os.path.join(fixture_dir, "alphabet4pinyin.json"))
+    os.remove(dump_json)
+
+# fixture の cmap にある漢字だけでパターンを作り直す
+def make_pattern_tables(fixture_dir):
+    cmap = load_json(os.path.join(fixture_dir, "template_main.json"))["cmap"]
+    is_in_font = lambda phrase: all( str(ord(c)) in cmap for c in phrase.replace("~", "") )
+
+    with open(os.path.join(p.DIR_OUTPUT, PATTERN_ONE_TXT), mode='r', encoding='utf-8') as read_file, \
+         open(os.path.join(fixture_dir, PATTERN_ONE_TXT), mode='w', encoding='utf-8') as write_file:
+        for line in read_file:
+            [order, hanzi, pinyin, str_patterns] = line.rstrip('\n').split(', ')
+            patterns = [pattern for pattern in str_patterns.strip("[]").split('|') if is_in_font(pattern)]
+            if is_in_font(hanzi) and len(patterns) > 0:
+                write_file.write("{0}, {1}, {2}, [{3}]\n".format(order, hanzi, pinyin, "|".join(patterns)))
+
+    for file_name in [PATTERN_TWO_JSON, EXCEPTION_PATTERN_JSON]:
+        pattern_table = load_json(os.path.join(p.DIR_OUTPUT, file_name))
+        pattern_table["patterns"] = { phrase: setting for phrase, setting in pattern_table["patterns"].items() if is_in_font(phrase) }
+        save_json(pattern_table, os.path.join(fixture_dir, file_name))
+
+def make_fixture(fixture, num_of_hanzi=None):
+    fixture_dir = get_fixture_dir(fixture)
+    if not os.path.exists(fixture_dir):
+        os.makedirs(fixture_dir)
+    if fixture == "synthetic":
+        make_synthetic_fixture(fixture_dir, num_of_hanzi)
+    elif fixture == "sawarabi":
+        make_sawarabi_fixture(fixture_dir)
+    make_pattern_tables(fixture_dir)
+    print("made fixture: {}".format(fixture_dir))
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(
+        description="Make font json fixtures for the benchmark")
+    parser.add_argument('-f', '--fixture', choices=FIXTURES, action='append', default=None)
+    parser.add_argument('--hanzi', type=int, default=None, help="Number of hanzi in the synthetic fixture (default: all of the mapping table)")
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(args)
+    fixtures = options.fixture if options.fixture != None else FIXTURES
+    for fixture in fixtures:
+        make_fixture(fixture, options.hanzi)
+
+if __name__ == "__main__":
+    sys.exit(main())
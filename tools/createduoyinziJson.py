@@ -10,29 +10,19 @@ from pypinyin import pinyin, lazy_pinyin, Style
 
 import os
 import sys
+import asyncio
 import argparse
-import requests
-from bs4 import BeautifulSoup
-# Webページを取得して解析する
-
-BAIDU_URL  = "https://hanyu.baidu.com/s?wd={}&from=zici"
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), "../src")))
+import pinyin_scraper as ps
+# Webページを取得して解析する (接続の使い回し、ページのキャッシュは pinyin_scraper.py)
 
 def get_pinyin(hanzi):
-    html = requests.get(BAIDU_URL.format(hanzi))
-    soup = BeautifulSoup(html.content, "html.parser")
-    elem = soup.find("div", id="pinyin")
-    try:
-        raw_text = elem.find("b")
-        # [ chóng xiāo ] こんな感じの文字列
-        text = raw_text.get_text()
-        text = text.replace("[ ", "")
-        text = text.replace(" ]", "")
-        pinyins = text.split(" ")
-        # print(pinyins)
-        return pinyins
-    except:
-        # print("not found pinyin")
-        return None
+    return ps.get_pinyins("baidu", hanzi)
+
+# 単語 -> 百度汉语のピンイン. まとめて取得する
+async def get_pinyins(phrases):
+    async with ps.PinyinScraper() as scraper:
+        return await scraper.get_pinyins_batch("baidu", phrases)
 
 
 def main(args=None):
@@ -50,13 +40,16 @@ def main(args=None):
     hanzi = arg.hanzi
     input_pinyin  = arg.pinyin
     duoyinzi_list = arg.texts.split(",")
+    pinyins_of_baidu = asyncio.run(get_pinyins(duoyinzi_list))
     for duoyinzi in duoyinzi_list:
         # 二通りで検証する
         pinyins1 = pinyin(duoyinzi, heteronym=True)
         # [['tán'], ['cí']] こういう感じなので ['tán', 'cí'] こうする
         pinyins1 = [e[0] for e in pinyins1]
         # print("{}, {}".format(duoyinzi, pinyins1))
-        pinyins2 = get_pinyin(duoyinzi)
+        pinyins2 = pinyins_of_baidu[duoyinzi]
+        if isinstance(pinyins2, Exception):
+            raise pinyins2
         # print("{}, {}".format(duoyinzi, pinyins2))
 
         # python すげえな。これで配列の比較できる
@@ -1,43 +1,64 @@
-import json
-
-def load_glyphs(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        data = json.load(file)
-    return data.get('glyf', {})
-
-def detect_circular_references(glyphs):
-    def visit(glyph, path):
-        if glyph in path:
-            return path[path.index(glyph):]  # Circular reference detected
-        if glyph not in glyphs or 'references' not in glyphs[glyph]:
-            return None
-        path.append(glyph)
-        for reference in glyphs[glyph]['references']:
-            result = visit(reference['glyph'], path)
-            if result:
-                return result
-        path.pop()
-        return None
-
-    circular_references = []
-    for glyph in glyphs:
-        path = []
-        result = visit(glyph, path)
-        if result:
-            circular_references.append(result)
-    return circular_references
-
-# Load glyphs from JSON file
-file_path = '../tmp/json/template.json'  # ファイルパスを適宜変更してください
-glyphs = load_glyphs(file_path)
-
-# Detect circular references
-circular_references = detect_circular_references(glyphs)
-
-# Output the results
-if circular_references:
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+# python3 tools/find_circular_reference_gid.py tmp/json/template.json
+# python3 tools/find_circular_reference_gid.py tmp/json/template_glyf.json
+
+"""
+json の合成グリフの循環参照を調べる
+
+otfccbuild の警告 (Circular glyph reference found in gid 11663 to gid 11664) の gid のグリフ名も分かる。
+フォント全体の json (glyf と glyph_order を持つ) と、glyf table だけの json (template_glyf.json) のどちらも読み込める。
+循環参照があれば終了コードは 1 になる。
+"""
+
+import os
+import sys
+import time
+import argparse
+import orjson
+
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), "../src")))
+import reference_graph
+
+def load_glyf_table(file_path):
+    with open(file_path, "rb") as read_file:
+        data = orjson.loads(read_file.read())
+    if "glyf" in data and isinstance(data["glyf"], dict):
+        return (data["glyf"], data.get("glyph_order", []))
+    return (data, [])
+
+def find_circular_reference(file_path, is_verbose=False):
+    (glyf_table, glyph_order) = load_glyf_table(file_path)
+    start = time.perf_counter()
+    graph = reference_graph.ReferenceGraph(glyf_table)
+    elapsed = time.perf_counter() - start
+    print("{} : {} glyf, {:.3f} s".format(file_path, len(glyf_table), elapsed))
+    if is_verbose:
+        reference_graph.print_depth_stats(graph.get_depth_stats())
+        for (glyf_name, child) in graph.missing:
+            print("  ==> missing reference : {} -> {}".format(glyf_name, child))
+    if len(graph.cycles) == 0:
+        print("No circular references detected.")
+        return False
+    gids = reference_graph.get_glyf_gids(glyph_order)
     print("Circular references detected:")
-    for cycle in circular_references:
-        print(" -> ".join(cycle))
-else:
-    print("No circular references detected.")
\ No newline at end of file
+    for cycle in graph.cycles:
+        print(reference_graph.format_cycle(cycle, gids))
+    return True
+
+def get_args():
+    parser = argparse.ArgumentParser(description="Find circular glyph references in otfcc json")
+    parser.add_argument("json", nargs="+", help="template.json (whole font) or template_glyf.json (glyf table only)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Also print the reference depth and missing references")
+    return parser.parse_args()
+
+def main():
+    args = get_args()
+    has_cycle = False
+    for file_path in args.json:
+        has_cycle |= find_circular_reference(file_path, args.verbose)
+    sys.exit(1 if has_cycle else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+# 辞書サイト (百度汉语, 汉典) の代わりにページを返すローカルのサーバー
+# src/pinyin_scraper.py, src/phrase_verifier.py をサイトに問い合わせずに試すため
+#
+# python3 tools/pinyin_stub_server.py --pages ./tmp/recorded_pages
+# python3 tools/pinyin_stub_server.py --pypinyin --delay 0.05 --fail-rate 0.1
+# python3 src/pinyin_scraper.py 重版 --url baidu=http://127.0.0.1:8000/baidu/{} --url zdic=http://127.0.0.1:8000/zdic/{} --no-cache
+#
+# GET /<サイト>/<単語> :
+#   --pages DIR の DIR/<サイト>/<単語>.html (記録したページ) があれば返す
+#   無ければ、--pypinyin のときは pypinyin のピンインをそのサイトの形式のページにして返す
+#   どちらも無ければ 404
+# --fail-rate の割合で --fail-status (503) を返す (やり直しの確認. 403 などは例外になることの確認)
+
+import os
+import sys
+import time
+import random
+import argparse
+import urllib.parse
+import http.server
+
+SOURCES = ["baidu", "zdic"]
+
+# pinyin_scraper.parse_baidu, parse_zdic が読む部分だけのページ
+PAGE_TEMPLATES = {
+    "baidu": '<html><head><meta charset="utf-8"></head><body><div id="pinyin"><span><b>[ {} ]</b></span></div></body></html>',
+    "zdic":  '<html><head><meta charset="utf-8"></head><body><span class="dicpy">{}</span></body></html>'
+}
+
+def make_page(source, phrase):
+    from pypinyin import pinyin
+    pinyins = [e[0] for e in pinyin(phrase)]
+    return PAGE_TEMPLATES[source].format(" ".join(pinyins)).encode("utf-8")
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        options = self.server.options
+        if options.delay > 0:
+            time.sleep(options.delay)
+        if random.random() < options.fail_rate:
+            self.send_page(options.fail_status, b"")
+            return
+        (_, source, phrase) = (urllib.parse.unquote(urllib.parse.urlsplit(self.path).path).split("/", 2) + ["", ""])[:3]
+        if not (source in SOURCES) or phrase == "":
+            self.send_page(404, b"")
+            return
+        PAGE = os.path.join(options.pages, source, phrase + ".html") if options.pages != None else None
+        if PAGE != None and os.path.exists(PAGE):
+            with open(PAGE, "rb") as read_file:
+                self.send_page(200, read_file.read())
+        elif options.pypinyin:
+            self.send_page(200, make_page(source, phrase))
+        else:
+            self.send_page(404, b"")
+
+    def send_page(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.options.verbose:
+            super().log_message(format, *args)
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Serve recorded dictionary pages in place of baidu and zdic")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--pages', default=None, help="Directory of recorded pages (<source>/<phrase>.html)")
+    parser.add_argument('--pypinyin', action='store_true', help="Make a page from pypinyin when no recorded page exists")
+    parser.add_argument('--delay', type=float, default=0, help="Seconds to wait before each response")
+    parser.add_argument('--fail-rate', type=float, default=0, help="Fraction of requests answered with --fail-status")
+    parser.add_argument('--fail-status', type=int, default=503, help="Status code of the failed requests")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    return parser.parse_args(args)
+
+def main(args=None):
+    options = parse_args(args)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", options.port), StubHandler)
+    server.options = options
+    print("  ==> " + " ".join("--url {0}=http://127.0.0.1:{1}/{0}/{{}}".format(source, server.server_address[1]) for source in SOURCES))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    sys.exit(main())